@@ -29,6 +29,7 @@ class CentralControl(object):
         parser.epilog = f'example usage: centralcontrol --mqtthost="{default_mqtt_server_host}"'
         parser.add_argument("--mqtthost", default=default_mqtt_server_host, help="host[:port] of the MQTT message broker")
         parser.add_argument("--mem-db-url", help="Memory database connection string")
+        parser.add_argument("--station", action="append", help="name of a measurement station to drive (repeat for several). its topics live under station/<name>/")
 
         self.run_params = vars(parser.parse_args())
 
@@ -47,7 +48,7 @@ class CentralControl(object):
 
     def mqtt_run(self) -> int:
         """run the server in mqtt mode"""
-        f = Fabric(mem_db_url=self.mem_db_url)
+        f = Fabric(mem_db_url=self.mem_db_url, stations=self.run_params["station"])
         # set the connection parameters
         f.mqtt_host = self.run_params["mqtthost"]
         f.mqtt_port = self.run_params["mqttport"]
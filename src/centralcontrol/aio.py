@@ -0,0 +1,170 @@
+"""
+asyncio access to the smus, so that one event loop can drive many of them
+the long waits (for sweeps and dwells to come back) happen on the event loop, watching the comms' file descriptor
+instead of tying up a thread per smu blocked in a read. the smu drivers stay as they are, the sync API is the same code
+with the reads done blocking (see k2xxx.numbers_reader()), for drivers or transports that can't be watched, calls go to a worker thread
+"""
+
+import asyncio
+import time
+import typing
+
+import serial
+
+from centralcontrol.logstuff import get_logger
+from centralcontrol.tcp import TcpTransport
+
+
+class AsyncReader(object):
+    """reads an smu's comms (a TcpTransport, pyserial socket:// or posix serial port) from the event loop"""
+
+    chunk_size = 65536  # most bytes to take at a time
+
+    def __init__(self, ser):
+        self.ser = ser
+        self.buf = bytearray()  # what's come in but hasn't been asked for yet
+        if isinstance(ser, TcpTransport):
+            self.buf += ser.read_nowait()  # it might have some already
+
+    @staticmethod
+    def fileno(ser) -> int | None:
+        """the file descriptor the event loop can watch for ser, None if there isn't one"""
+        if isinstance(ser, TcpTransport):
+            return ser.fileno()
+        sock = getattr(ser, "_socket", None)  # pyserial's socket:// handler
+        if sock is not None:
+            return sock.fileno()
+        fd = getattr(ser, "fd", None)  # pyserial's posix serial port
+        if isinstance(fd, int):
+            return fd
+        return None
+
+    def grab(self) -> bytes:
+        """whatever is waiting to be read right now, without blocking"""
+        if isinstance(self.ser, TcpTransport):
+            return self.ser.read_nowait()
+        sock = getattr(self.ser, "_socket", None)
+        if sock is not None:
+            try:
+                chunk = sock.recv(self.chunk_size)  # pyserial keeps its socket non-blocking and doesn't buffer
+            except BlockingIOError:
+                return b""
+            if not chunk:
+                raise serial.SerialException("socket disconnected")
+            return chunk
+        return self.ser.read(self.ser.in_waiting)
+
+    async def more(self, timeout: float | None):
+        """waits (for up to timeout [s]) for something to come in and adds it to buf"""
+        loop = asyncio.get_running_loop()
+        fd = self.fileno(self.ser)
+        assert fd is not None, "no file descriptor to watch"
+        ready = loop.create_future()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await asyncio.wait_for(ready, timeout)
+        except asyncio.TimeoutError:
+            pass  # like a serial read timeout, the reader gets short data
+        finally:
+            loop.remove_reader(fd)
+        self.buf += self.grab()
+
+    async def drive(self, reader: typing.Generator[int | bytes, bytes, typing.Any]) -> typing.Any:
+        """runs a reader (like k2xxx.numbers_reader()) with reads that wait on the event loop, returns what it returns"""
+        timeout = self.ser.timeout
+        try:
+            want = next(reader)
+            while True:
+                deadline = None if timeout is None else time.monotonic() + timeout  # per read, like pyserial's
+                while True:
+                    if isinstance(want, bytes):
+                        end = self.buf.find(want)
+                        n = None if end < 0 else end + len(want)
+                    else:
+                        n = want if len(self.buf) >= want else None
+                    if n is not None:
+                        break
+                    left = None if deadline is None else deadline - time.monotonic()
+                    if (left is not None) and (left <= 0):
+                        n = len(self.buf)  # timed out, hand over what there is
+                        break
+                    await self.more(left)
+                got = bytes(self.buf[:n])
+                del self.buf[:n]
+                want = reader.send(got)
+        except StopIteration as stop:
+            return stop.value
+
+
+class AsyncSMU(object):
+    """
+    async versions of an smu's setupDC, setupSweep, measure and measure_until
+    calls for the same smu are done one at a time, calls for different smus overlap
+    """
+
+    def __init__(self, sm):
+        self.lg = get_logger(".".join([__name__, type(self).__name__]))
+        self.sm = sm
+        self._lock: asyncio.Lock | None = None
+        self._lock_loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """keeps calls for the smu one at a time (a new one for each event loop, since a lock belongs to the loop it's used in)"""
+        loop = asyncio.get_running_loop()
+        if (self._lock is None) or (self._lock_loop is not loop):
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    @property
+    def awaitable(self) -> bool:
+        """whether measurements can be waited for on the event loop rather than in a worker thread"""
+        ser = getattr(self.sm, "ser", None)
+        if (ser is None) or not hasattr(self.sm, "measure_start"):
+            return False
+        if getattr(self.sm, "shared", False):
+            return False  # channels sharing comms take turns in measure() (see channels.py)
+        if AsyncReader.fileno(ser) is None:
+            return False
+        loop = asyncio.get_running_loop()
+        return hasattr(loop, "add_reader") and not isinstance(loop, getattr(asyncio, "ProactorEventLoop", ()))
+
+    async def setupDC(self, **kwargs):
+        """setupDC, in a worker thread since it's a short batch of commands"""
+        async with self.lock:
+            return await asyncio.to_thread(self.sm.setupDC, **kwargs)
+
+    async def setupSweep(self, **kwargs):
+        """setupSweep, in a worker thread since it's a short batch of commands"""
+        async with self.lock:
+            return await asyncio.to_thread(self.sm.setupSweep, **kwargs)
+
+    async def measure(self, nPoints: int = 1) -> list[tuple[float, float, float, int]] | list[tuple[float, float, float, float, int]]:
+        """measure, waiting for the readings on the event loop"""
+        async with self.lock:
+            if not self.awaitable:
+                return await asyncio.to_thread(self.sm.measure, nPoints)
+            n_numbers, fields, r = self.sm.measure_start(nPoints)
+            nums = await AsyncReader(self.sm.ser).drive(self.sm.numbers_reader(n_numbers))
+            return self.sm.measure_finish(nums, nPoints, fields, r)
+
+    async def measure_until(self, t_dwell: float = float("Infinity"), n_measurements=float("Infinity"), cb=lambda x: None, interval: float | None = None) -> list[tuple[float, float, float, int]] | list[tuple[float, float, float, float, int]]:
+        """measure_until, with each measurement waited for on the event loop (the instrument paced kind runs in a worker thread)"""
+        if interval is None:
+            interval = getattr(self.sm, "stream_interval", None)
+        if (interval is not None) or not self.awaitable:  # the driver streams
+            kwargs = {} if interval is None else {"interval": interval}
+            async with self.lock:
+                return await asyncio.to_thread(self.sm.measure_until, t_dwell, n_measurements, cb, **kwargs)  # positional, the drivers name the count differently
+        i = 0
+        t_end = time.time() + t_dwell
+        q = []
+        while (i < n_measurements) and (time.time() < t_end) and (not self.sm.killer.is_set()):
+            i = i + 1
+            measurement = await self.measure()
+            q.append(measurement[0])
+            cb(measurement)
+        if self.sm.killer.is_set():
+            self.lg.debug("Killed by killer")
+        return q
@@ -1,6 +1,6 @@
-from collections import OrderedDict
+import contextlib
 import errno
-import inspect
+import functools
 import time
 import serial
 from threading import Event as tEvent
@@ -40,6 +40,14 @@ except ImportError:
         return lg
 
 
+try:
+    from centralcontrol import readings
+    from centralcontrol.shadow import Shadow
+except ImportError:
+    # standalone, with readings.py and shadow.py alongside this file
+    import readings
+    from shadow import Shadow
+
 # LOG_LEVEL = logging.INFO
 LOG_LEVEL = logging.DEBUG
 
@@ -55,6 +63,34 @@ RW_TIMEOUT = 3  # read and write timeout
 RESET_TIMEOUT = 0.5
 
 
+def deferring(func):
+    """decorator for AmSmu methods that checks the errors from all their writes at once, when they're done"""
+
+    @functools.wraps(func)
+    def wrapper(self: "AmSmu", *args, **kwargs):
+        with self.deferred():
+            return func(self, *args, **kwargs)
+
+    return wrapper
+
+
+class journaled(property):
+    """
+    a property of the smu's state, whatever its setter is given last gets recorded
+    in the smu's journal (a list with one slot per property, in the order of
+    AmSmu.journal_order) so it can be set again after a watchdog reset
+    """
+
+    slot: int
+
+    def __set_name__(self, owner: type, name: str):
+        self.slot = owner.journal_order.index(name)
+
+    def __set__(self, obj: "AmSmu", value):
+        super().__set__(obj, value)
+        obj._journal[self.slot] = value
+
+
 class AmSmu(object):
     """
     Interface for Ark Metrica sourcemeter
@@ -66,11 +102,56 @@ class AmSmu(object):
     status = 0
     nplc_user_set = 1.0
     last_sweep_time: float = 0.0
+    last_readings = None  # the latest measure()'s readings as a structured array
     readyForAction = False
     four88point1 = False
     print_sweep_deets = (
         False  # false uses debug logging level, true logs sweep stats at info level
     )
+    # configuration we remember writing so we don't send it (and check it for errors)
+    # again when it wouldn't change anything (see shadow.py)
+    shadowed = frozenset(
+        {
+            "sour:func",
+            "sens:curr:nplc",
+            "sour:del",
+            "sour:del:auto",
+            "sens:volt:prot",
+            "sens:curr:prot",
+            "sour:volt:star",
+            "sour:curr:star",
+            "sour:volt:stop",
+            "sour:curr:stop",
+            "sour:swe:poin",
+            "sour:swe:spac",
+            "sour:volt:mode",
+            "sour:curr:mode",
+            "syst:rsen",
+            "syst:lfr",
+        }
+    )
+    shadow_invalidators = frozenset({"*rst", "syst:pres"})
+    # the journaled state properties in the order they get restored in
+    journal_order = (
+        "remote_sense",
+        "nplc",
+        "settling_delay",
+        "auto_settling_delay",
+        "compliance_voltage",
+        "compliance_current",
+        "source_function",
+        "source_voltage",
+        "source_current",
+        "source_voltage_mode",
+        "source_current_mode",
+        "sweep_start_voltage",
+        "sweep_stop_voltage",
+        "sweep_start_current",
+        "sweep_stop_current",
+        "sweep_spacing",
+        "sweep_points",
+        "output_enabled",
+    )
     _write_term_str = TX_TERMCHAR
     _read_term_str = RX_TERMCHAR
     ser: serial.Serial | None = None
@@ -93,9 +174,12 @@ class AmSmu(object):
         killer: tEvent | mEvent = tEvent(),
         print_sweep_deets: bool = False,
         cc_mode: str = "none",
+        lazy_errors: bool = False,
         **kwargs,
     ):
-        """just set class variables here"""
+        """just set class variables here
+        lazy_errors = True leaves every write's error check until the next query or measurement
+        """
 
         # setup logging
         self.lg = get_logger(".".join([__name__, type(self).__name__]), LOG_LEVEL)
@@ -129,9 +213,17 @@ class AmSmu(object):
         # hold latest error message
         self._err = ""
 
-        # container for state of all smu parameters
-        # DANGER! DO NOT EDIT MANUALLY!
-        self.__state = OrderedDict()
+        # error checking for writes can be put off and done for many at once, see
+        # deferred()
+        self.lazy_errors = lazy_errors
+        self._deferring = False
+        self._unchecked: list[str] = []  # writes whose errors we haven't checked yet
+
+        # what we believe the smu's settings are
+        self.shadow = Shadow(self.shadowed, self.shadow_invalidators)
+
+        # the last value given to each journaled property, None for never set
+        self._journal: list = [None] * len(self.journal_order)
 
         self.lg.debug("AmSmu initialized.")
 
@@ -145,68 +237,17 @@ class AmSmu(object):
         self.disconnect()
         return False
 
-    def __update_state(self):
-        """Add a method and its arguments to the _state dictionary for recall later.
-
-        This method should be called at the end of every property setter method that
-        relates to the SMU state, e.g. set voltage, source function etc. It stores the
-        property name and the property's arguments as a key, value pair in the _state
-        dictionary. The dictionary can later be called to replay the setter calls and
-        recover the last known state if needed.
-
-        This method should never be called outside of the class. The double underscore
-        invokes name mangling to make this difficult.
-        """
-        # Get the calling frame
-        frame = inspect.currentframe()
-        caller_frame = frame.f_back
-
-        # Get the method object and its signature
-        method_name = caller_frame.f_code.co_name
-
-        # Attempt to retrieve the attribute
-        attr = getattr(self.__class__, method_name, None)
-
-        # Check if the attribute is a property or a method
-        if isinstance(attr, property):
-            # It's a property; use the setter for the signature
-            method = attr.fset  # fset is the setter method of the property
-        elif callable(attr):
-            # It's a regular method
-            method = attr
-        else:
-            raise TypeError(f"{method_name!r} is neither a property nor a method.")
-
-        sig = inspect.signature(method)
-
-        # Get local variables
-        local_vars = dict(caller_frame.f_locals)
-
-        # Bind the arguments to the method's signature, excluding local variables not
-        # in the method's signature
-        bound_args = sig.bind_partial(**local_vars)
-
-        # If the method is already in the ordered state dictionary, remove it reinsert
-        # so it can be reinserted at the end
-        if method in self.__state:
-            del self.__state[method]
-
-        # Store the callable in the _state dictionary as the method and its bound
-        # arguments
-        self.__state[method] = bound_args
-
     def _restore_state(self):
-        """Restore the SMU state using the _state dictionary.
+        """Restore the SMU state from the journal.
 
         This should only be called to restore state in the unlikely event of an SMU
         watchdog timeout.
         """
-        # iterate over a copy to avoid issues caused by mutating self.__state when
-        # methods get called that modify self.__state
-        state_items = list(self.__state.items())
-        for method, bound_args in state_items:
-            method(*bound_args.args, **bound_args.kwargs)
-            self.lg.debug(f"Restored: {method}, {bound_args.args}, {bound_args.kwargs}")
+        with self.deferred():
+            for name, value in zip(self.journal_order, self._journal):
+                if value is not None:
+                    setattr(self, name, value)
+                    self.lg.debug(f"Restored: {name} = {value!r}")
 
     @property
     def address(self) -> str:
@@ -281,7 +322,7 @@ class AmSmu(object):
         return int(self.query("*STB?"))
 
     # --- smu state ---
-    @property
+    @journaled
     def source_function(self) -> str:
         return self.query("sour:func?")
 
@@ -293,9 +334,7 @@ class AmSmu(object):
             )
         self.write(f"sour:func {function}")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def output_enabled(self) -> bool:
         return bool(int(self.query("outp?")))
 
@@ -306,9 +345,7 @@ class AmSmu(object):
         else:
             self.write("outp 0")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def nplc(self) -> float:
         return float(self.query("sens:curr:nplc?"))
 
@@ -319,9 +356,7 @@ class AmSmu(object):
         # for compatibility with central control
         self.nplc_user_set = nplc
 
-        self.__update_state()
-
-    @property
+    @journaled
     def settling_delay(self) -> float:
         """Settling delay in s."""
         return float(self.query("sour:del?"))
@@ -331,9 +366,7 @@ class AmSmu(object):
         """Settling delay in s."""
         self.write(f"sour:del {delay:0.6f}")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def auto_settling_delay(self) -> bool:
         return bool(int(self.query("sour:del:auto?")))
 
@@ -344,9 +377,7 @@ class AmSmu(object):
         else:
             self.write("sour:del:auto 0")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def source_voltage(self) -> float:
         return float(self.query("sour:volt?"))
 
@@ -354,9 +385,7 @@ class AmSmu(object):
     def source_voltage(self, voltage: float):
         self.write(f"sour:volt {voltage:0.8f}")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def source_current(self) -> float:
         return float(self.query("sour:curr?"))
 
@@ -364,9 +393,7 @@ class AmSmu(object):
     def source_current(self, current: float):
         self.write(f"sour:curr {current:0.8f}")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def compliance_voltage(self) -> float:
         return float(self.query("sens:volt:prot?"))
 
@@ -374,9 +401,7 @@ class AmSmu(object):
     def compliance_voltage(self, voltage: float):
         self.write(f"sens:volt:prot {voltage:0.8f}")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def compliance_current(self) -> float:
         return float(self.query("sens:curr:prot?"))
 
@@ -384,9 +409,7 @@ class AmSmu(object):
     def compliance_current(self, current: float):
         self.write(f"sens:curr:prot {current:0.8f}")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def sweep_start_voltage(self) -> float:
         return float(self.query("sour:volt:start?"))
 
@@ -394,9 +417,7 @@ class AmSmu(object):
     def sweep_start_voltage(self, voltage: float):
         self.write(f"sour:volt:start {voltage:0.8f}")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def sweep_start_current(self) -> float:
         return float(self.query("sour:curr:start?"))
 
@@ -404,9 +425,7 @@ class AmSmu(object):
     def sweep_start_current(self, current: float):
         self.write(f"sour:curr:start {current:0.8f}")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def sweep_stop_voltage(self) -> float:
         return float(self.query("sour:volt:stop?"))
 
@@ -414,9 +433,7 @@ class AmSmu(object):
     def sweep_stop_voltage(self, voltage: float):
         self.write(f"sour:volt:stop {voltage:0.8f}")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def sweep_stop_current(self) -> float:
         return float(self.query("sour:curr:stop?"))
 
@@ -424,9 +441,7 @@ class AmSmu(object):
     def sweep_stop_current(self, current: float):
         self.write(f"sour:curr:stop {current:0.8f}")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def sweep_points(self) -> int:
         return int(self.query("sour:swe:poin?"))
 
@@ -434,9 +449,7 @@ class AmSmu(object):
     def sweep_points(self, points: int):
         self.write(f"sour:swe:poin {points}")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def sweep_spacing(self) -> str:
         return self.query("sour:swe:spac?")
 
@@ -448,9 +461,7 @@ class AmSmu(object):
             )
         self.write(f"sour:swe:spac {spacing}")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def source_voltage_mode(self) -> str:
         return self.query("sour:volt:mode?")
 
@@ -462,9 +473,7 @@ class AmSmu(object):
             )
         self.write(f"sour:volt:mode {mode}")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def source_current_mode(self) -> str:
         return self.query("sour:curr:mode?")
 
@@ -476,9 +485,7 @@ class AmSmu(object):
             )
         self.write(f"sour:curr:mode {mode}")
 
-        self.__update_state()
-
-    @property
+    @journaled
     def remote_sense(self) -> bool:
         if self.connected:
             return bool(int(self.query("syst:rsen?")))
@@ -496,8 +503,6 @@ class AmSmu(object):
         # for compatibility with central control
         self._two_wire = not remote_sense
 
-        self.__update_state()
-
     # --- alias's for compatibility with central control ---
     @property
     def src(self) -> str:
@@ -529,6 +534,7 @@ class AmSmu(object):
 
         if wdt_bit_set:
             self.lg.warning("WDT bit set")
+            self.shadow.invalidate()  # the smu has been reset
             self._clear_wdt_bit()
 
             if restore_state:
@@ -658,6 +664,7 @@ class AmSmu(object):
 
         self.lg.debug("AmSmu connected.")
 
+    @deferring
     def setup(self, front=True, two_wire=False):
         """does baseline configuration in prep for data collection"""
         # ask the device to identify its self
@@ -682,10 +689,24 @@ class AmSmu(object):
     def opc(self) -> bool:
         return True
 
-    def write(self, cmd: str):
+    def write(self, cmd: str, force: bool = False):
         if not self.ser:
             raise ValueError("SMU communications not initialised")
 
+        if not self.shadow.needed(cmd, force=force):
+            return  # it's already set like that
+
+        self._send(cmd)
+
+        if not cmd.endswith("?"):
+            # write wasn't a query so check for write errors, now or later
+            if self._deferring or self.lazy_errors:
+                self._unchecked.append(cmd)
+            else:
+                self._query_error()
+
+    def _send(self, cmd: str):
+        """write a command, reconnecting and retrying if that fails"""
         cmd_bytes = len(cmd)
 
         write_retries = 3
@@ -707,21 +728,104 @@ class AmSmu(object):
                         self.lg.error(f"Unknown Socket error occurred on read: {e}.")
             except ValueError:
                 # re-raise commands bytes error
+                self.shadow.invalidate()
                 raise
             except Exception as e:
                 self.lg.error("Error occurred on write: %s.", str(e))
 
             # any error that gets this far should be resolved by reconnecting and
             # retrying
+            self.shadow.invalidate()
             self._low_level_connect()
 
             write_retries -= 1
         else:
             raise IOError("Write operation exceeded maximum retries.")
 
-        if not cmd.endswith("?"):
-            # write wasn't a query so check for write errors
-            self._query_error()
+    @contextlib.contextmanager
+    def deferred(self):
+        """
+        a context in which writes don't get their own error checks
+        the error queue is checked once on the way out (or before any query made in the context)
+        unless lazy_errors is set, then that's left until the next query or measurement
+        """
+        was_deferring = self._deferring
+        self._deferring = True
+        try:
+            yield
+        except BaseException:
+            self._unchecked.clear()
+            self.shadow.invalidate()
+            raise
+        finally:
+            self._deferring = was_deferring
+        if not (was_deferring or self.lazy_errors):
+            self.check_errors()
+
+    def check_errors(self):
+        """
+        check the error queue once for all the writes that haven't been checked yet
+        raises ValueError naming the first of them the smu objected to
+        """
+        unchecked = self._unchecked
+        self._unchecked = []
+        if unchecked:
+            self._query_error(ignore=True)
+            if self._err != NO_ERR_MSG:
+                culprit, err = self._bisect(unchecked, self._err)
+                raise ValueError(f"{err} (from '{culprit}')")
+
+    def _bisect(self, cmds: list[str], err: str) -> tuple[str, str]:
+        """
+        find the first of cmds (which have all been sent) that caused err by sending
+        them again in halves and checking the error queue after each
+        returns that command and the error message it's blamed for, or all of cmds
+        (joined) if the error doesn't happen again outside the state it happened in
+        commands with side effects (resets, output switching) don't get sent again
+        """
+        replayable = [cmd for cmd in cmds if self._replayable(cmd)]
+        whole = ("; ".join(cmds), err)
+        found = self._replay(replayable)
+        if found == NO_ERR_MSG:
+            self.lg.warning(f"Couldn't reproduce '{err}' by sending the batch again, blaming all of it")
+            return whole
+        err = found
+        lo = 0
+        hi = len(replayable)
+        while (hi - lo) > 1:  # replayable[lo:hi] holds the culprit
+            mid = (lo + hi) // 2
+            found = self._replay(replayable[lo:mid])
+            if found == NO_ERR_MSG:
+                found = self._replay(replayable[mid:hi])
+                if found == NO_ERR_MSG:  # it takes commands from both halves
+                    self._replay(replayable)  # back to how the batch left things
+                    self.lg.warning(f"'{err}' needs several of the batch's commands, blaming all of it")
+                    return whole
+                lo = mid
+            else:
+                hi = mid
+            err = found
+
+        # what came after the culprit was set before we started going back over
+        # things, so put it back
+        found = self._replay(replayable[lo + 1 :])
+        if found != NO_ERR_MSG:
+            self.lg.warning(f"More errors after '{replayable[lo]}': {found}")
+        return (replayable[lo], err)
+
+    def _replayable(self, cmd: str) -> bool:
+        """whether cmd can be sent again while bisecting, without side effects beyond the setting it makes"""
+        header, arg = self.shadow.split(cmd)
+        return (header not in self.shadow_invalidators) and (not header.startswith("outp"))
+
+    def _replay(self, cmds: list[str]) -> str:
+        """send cmds again and return what the error queue says about them"""
+        if not cmds:
+            return NO_ERR_MSG
+        for cmd in cmds:
+            self._send(cmd)
+        self._query_error(ignore=True)
+        return self._err
 
     def query(self, question: str) -> str:
         """Write a question and read the response.
@@ -736,6 +840,10 @@ class AmSmu(object):
         response : str
             Response to the question.
         """
+        if self._unchecked and (question != ERR_QUERY):
+            # errors in the queue from earlier writes would get mixed up with this
+            self.check_errors()
+
         query_retries = 3
         while query_retries > 0:
             self.write(question)
@@ -830,6 +938,9 @@ class AmSmu(object):
         """
         self._err = self.query(ERR_QUERY)
 
+        if self._err != NO_ERR_MSG:
+            self.shadow.invalidate()  # no telling which setting didn't take
+
         if self._err != NO_ERR_MSG and not ignore and ERR_REGEX.match(self._err):
             # valid error message, not ignoring it, but showing an error
             raise ValueError(self._err)
@@ -839,6 +950,7 @@ class AmSmu(object):
 
     def hardware_reset(self):
         """attempt to stop everything and put the hardware into a known baseline state"""
+        self._unchecked.clear()
         self._query_error(ignore=True)  # clear controller error buffer
         self.reset(hard=False)
 
@@ -905,6 +1017,7 @@ class AmSmu(object):
     def setNPLC(self, nplc: float):
         self.nplc = nplc
 
+    @deferring
     def setupDC(
         self,
         sourceVoltage: bool = True,
@@ -954,6 +1067,7 @@ class AmSmu(object):
         else:
             self.output_enabled = True
 
+    @deferring
     def setupSweep(
         self,
         sourceVoltage: bool = True,
@@ -972,7 +1086,7 @@ class AmSmu(object):
         nplc = self.getNPLC()
         ln_freq = 50  # assume 50Hz line freq just because that's safer for timing
         n_types = 1  # both V and I are measured simulataneously
-        adc_conversion_time = (ln_freq * nplc) * n_types
+        adc_conversion_time = nplc / ln_freq * n_types
         adc_conversion_time_ms = adc_conversion_time * 1000
         # worst case overhead in SDM cycle (see 2400 manual A-7, page 513)
         t_overhead_ms = 3
@@ -1061,6 +1175,9 @@ class AmSmu(object):
         for a prior DC setup, the list will be 1 long.
         for a prior sweep setup, the list returned will be n sweep points long
         """
+        # settle up any error checks that have been put off
+        self.check_errors()
+
         # if wdt has occured since last check, restore state
         self._check_wdt_reset_bit(restore_state=True)
 
@@ -1069,57 +1186,22 @@ class AmSmu(object):
             pps = 4
         else:
             pps = 5
-        vals = []
-
         red = self.query("read?")
-        red_nums = red.split(",")
-        for i in range(0, len(red_nums), 4):
-            if pps == 5:
-                line = (
-                    float(red_nums[i]),
-                    float(red_nums[i + 1]),
-                    float(red_nums[i]) / float(red_nums[i + 1]),
-                    float(red_nums[i + 2]) / 1000,  # convert t from ms to s
-                    int(red_nums[i + 3]),
-                )
-            else:
-                line = (
-                    float(red_nums[i]),
-                    float(red_nums[i + 1]),
-                    float(red_nums[i + 2]) / 1000,  # convert t from ms to s
-                    int(red_nums[i + 3]),
-                )
-            vals.append(line)
+        rec = readings.decode(red, r=(pps == 5), fields=4, t_div=1000)  # t comes in ms
+        self.last_readings = rec
 
         # if this was a sweep, compute how long it took
         if nPoints > 1:
-            first_element = vals[0]
-            last_element = vals[-1]
-            if pps == 4:
-                t_start = first_element[2]
-                t_end = last_element[2]
-            elif pps == 5:
-                t_start = first_element[3]
-                t_end = last_element[3]
-            else:
-                t_start = 0
-                t_end = 0
-            v_start = first_element[0]
-            v_end = last_element[0]
-            self.last_sweep_time = t_end - t_start
-            n_vals = len(vals)
-            stats_string = f"sweep duration={self.last_sweep_time:0.2f}s|mean voltage step={(v_start-v_end)/n_vals*1000:+0.2f}mV|mean sample period={self.last_sweep_time/n_vals*1000:0.0f}ms|mean sweep rate={(v_start-v_end)/self.last_sweep_time:+0.3f}V/s"
-            if self.print_sweep_deets:
-                self.lg.log(29, stats_string)
-            else:
-                self.lg.debug(stats_string)
+            self.last_sweep_time = readings.log_sweep(
+                self.lg, rec, loud=self.print_sweep_deets
+            )
             # reset comms timeout to default value after sweep
             if self.ser:
                 self.ser.timeout = self.timeout
 
         # update the status byte
-        self.status = vals[-1][-1]
-        return vals
+        self.status = int(rec["status"][-1])
+        return rec.tolist()
 
     def measure_until(
         self,
@@ -0,0 +1,262 @@
+"""
+recording the traffic between a driver and an instrument, and playing it back
+a Recorder sits between the two as a TCP proxy and writes every byte each way, with when it went, to a capture file
+a ReplayEmulator then stands in for the instrument, answering the driver with the recorded bytes (at full speed or with the
+recorded timing) and noting where the driver's side differs from the recording
+so real sessions can be rerun without hardware, to regression test the drivers or time their parsing and logic on their own
+"""
+
+import json
+import socket
+import socketserver
+import struct
+import threading
+import time
+import typing
+import urllib.parse
+
+from centralcontrol.emulator import Emulator
+from centralcontrol.logstuff import get_logger
+
+MAGIC = b"CCAP\x01"  # capture file signature and format version
+HEADER = struct.Struct("<I")  # length of the JSON metadata that follows the magic
+RECORD = struct.Struct("<dHBI")  # time [s] since the capture began, connection number, kind, payload length
+
+# event kinds
+TX = 0  # bytes from the driver to the instrument
+RX = 1  # bytes from the instrument to the driver
+OPEN = 2  # the driver connected
+CLOSE = 3  # the driver hung up
+HANGUP = 4  # the instrument hung up
+
+
+class Event(typing.NamedTuple):
+    t: float  # [s] since the capture began
+    conn: int  # which connection (numbered in the order they were made)
+    kind: int
+    data: bytes = b""
+
+
+def load(path: str) -> tuple[dict, list[Event]]:
+    """a capture file's metadata and events"""
+    with open(path, "rb") as fh:
+        raw = fh.read()
+    if not raw.startswith(MAGIC):
+        raise ValueError(f"{path} isn't a capture file")
+    pos = len(MAGIC)
+    (n_meta,) = HEADER.unpack_from(raw, pos)
+    pos += HEADER.size
+    meta = json.loads(raw[pos : pos + n_meta])
+    pos += n_meta
+    events = []
+    while pos < len(raw):
+        t, conn, kind, n = RECORD.unpack_from(raw, pos)
+        pos += RECORD.size
+        events.append(Event(t, conn, kind, raw[pos : pos + n]))
+        pos += n
+    return (meta, events)
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    """(host, port) from socket://host:port or host:port"""
+    if "://" not in address:
+        address = f"socket://{address}"
+    url = urllib.parse.urlsplit(address)
+    if (url.hostname is None) or (url.port is None):
+        raise ValueError(f"Expected [socket://]host:port, not {address}")
+    return (url.hostname, url.port)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    recorder: "Recorder"
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: _Server
+
+    def handle(self):
+        self.server.recorder.relay(self.request)
+
+
+class Recorder(object):
+    """
+    a TCP proxy that records everything that goes through it
+    point the driver at the recorder's address instead of at the instrument (target)
+    """
+
+    host: str = "127.0.0.1"
+    chunk: int = 65536  # bytes per socket recv
+
+    def __init__(self, target: str, path: str, host: str = host, port: int = 0, connect_timeout: float = 5.0):
+        self.lg = get_logger(".".join([__name__, type(self).__name__]))
+        self.target = parse_address(target)
+        self.path = path
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.lock = threading.Lock()  # one writer at a time
+        self.fh: typing.BinaryIO | None = None
+        self.server: _Server | None = None
+        self.n_conns = 0
+        self.t0 = 0.0
+
+    def __enter__(self) -> "Recorder":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.stop()
+        return False
+
+    @property
+    def address(self) -> str:
+        """where the driver should connect"""
+        return f"socket://{self.host}:{self.port}"
+
+    def start(self):
+        self.fh = open(self.path, "wb")
+        meta = json.dumps({"target": f"{self.target[0]}:{self.target[1]}", "started": time.time()}).encode()
+        self.fh.write(MAGIC + HEADER.pack(len(meta)) + meta)
+        self.t0 = time.perf_counter()
+        self.server = _Server((self.host, self.port), _Handler)
+        self.server.recorder = self
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True, name=type(self).__name__).start()
+        self.lg.debug(f"Recording {self.target} from {self.address} to {self.path}")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        with self.lock:
+            if self.fh is not None:
+                self.fh.close()
+                self.fh = None
+
+    def record(self, conn: int, kind: int, data: bytes = b""):
+        with self.lock:
+            if self.fh is not None:
+                self.fh.write(RECORD.pack(time.perf_counter() - self.t0, conn, kind, len(data)) + data)
+
+    def relay(self, client: socket.socket):
+        """passes one connection's traffic through to the instrument and back, recording it"""
+        with self.lock:
+            conn = self.n_conns
+            self.n_conns += 1
+        try:
+            upstream = socket.create_connection(self.target, timeout=self.connect_timeout)
+        except OSError as e:
+            self.lg.debug(f"Couldn't reach {self.target}: {e}")
+            return  # the client sees it hang up, like it would have seen the instrument not answer
+        upstream.settimeout(None)
+        upstream.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.record(conn, OPEN)
+        back = threading.Thread(target=self.pump, args=(upstream, client, conn, RX, HANGUP), daemon=True)
+        back.start()
+        self.pump(client, upstream, conn, TX, CLOSE)
+        back.join()
+        upstream.close()
+
+    def pump(self, src: socket.socket, dst: socket.socket, conn: int, kind: int, end: int):
+        """copies src to dst till src stops, then passes that on"""
+        while True:
+            try:
+                data = src.recv(self.chunk)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            self.record(conn, kind, data)
+            try:
+                dst.sendall(data)
+            except OSError:
+                break
+        self.record(conn, end)
+        try:
+            dst.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+
+class ReplayEmulator(Emulator):
+    """
+    plays a capture back to a driver, the nth connection made to it gets the capture's nth connection's replies
+    what the driver sends is checked against the recording, differences go in mismatches (and with strict, end the connection)
+    """
+
+    def __init__(self, path: str, realtime: bool = False, strict: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        self.meta, events = load(path)
+        self.realtime = realtime  # keep the recorded pauses before replies, otherwise reply as fast as possible
+        self.strict = strict
+        self.scripts: dict[int, list[Event]] = {}  # connection --> its events, with runs of the same kind joined up
+        for event in events:
+            script = self.scripts.setdefault(event.conn, [])
+            if script and (event.kind in (TX, RX)) and (script[-1].kind == event.kind):
+                script[-1] = script[-1]._replace(data=script[-1].data + event.data)
+            else:
+                script.append(event)
+        self.order = sorted(self.scripts)
+        self.n_conns = 0  # connections served so far
+        self.mismatches: list[tuple[int, bytes, bytes]] = []  # (connection, recorded, got)
+
+    def recv_exactly(self, conn: socket.socket, n: int) -> bytes:
+        """n bytes from the driver, or fewer if it hangs up first"""
+        got = bytearray()
+        while len(got) < n:
+            try:
+                data = conn.recv(n - len(got))
+            except OSError:
+                break
+            if not data:
+                break
+            got += data
+        self.n_rx += len(got)
+        return bytes(got)
+
+    def serve(self, conn: socket.socket, channel: str = "main"):
+        """replays one recorded connection"""
+        with self.lock:
+            index = self.n_conns
+            self.n_conns += 1
+        self.conns.add(conn)
+        try:
+            if index >= len(self.order):
+                self.lg.debug(f"Connection {index} wasn't in the capture")
+                return
+            number = self.order[index]
+            script = self.scripts[number]
+            t_open = script[0].t
+            t_start = time.perf_counter()
+            for event in script:
+                if event.kind == TX:
+                    got = self.recv_exactly(conn, len(event.data))
+                    if got != event.data:
+                        self.mismatches.append((number, event.data, got))
+                        self.lg.debug(f"Connection {number} sent {got!r}, the recording has {event.data!r}")
+                        if self.strict or (len(got) < len(event.data)):
+                            return
+                    self.n_commands += 1
+                elif event.kind == RX:
+                    if self.realtime:
+                        time.sleep(max(event.t - t_open - (time.perf_counter() - t_start), 0))
+                    try:
+                        self.send(conn, event.data)
+                    except OSError:
+                        return
+                elif event.kind == HANGUP:
+                    return
+                elif event.kind == CLOSE:
+                    break
+            while self.recv_exactly(conn, self.chunk):  # let the driver hang up when it's ready
+                pass
+        finally:
+            self.conns.discard(conn)
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,117 @@
+"""
+sharing a dual channel 2600's comms between drivers for its channels
+each channel (smua, smub) gets its own k2xxx, the first to connect opens the comms and does the full connect, the others join in.
+commands from the channels take turns on the comms, and measurements both channels want at about the same time get made
+together: one run of the dual script (see tsp.py) with both channels' readings coming back in one printbuffer transfer
+"""
+
+import threading
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    from centralcontrol.k2xxx import k2xxx
+
+
+class SharedComms(object):
+    """one instrument's comms and the channel drivers using them"""
+
+    links: dict[str, "SharedComms"] = {}  # address --> the comms open to it
+    claims: dict[str, threading.RLock] = {}  # address --> held while a channel connects or disconnects
+    registry_lock = threading.Lock()
+    window = 0.05  # [s] longest a sweep waits for the other channel's to start with it
+
+    def __init__(self, owner: "k2xxx"):
+        self.address = owner.address
+        self.ser = owner.ser
+        self.lock = owner.comms_lock  # one channel's commands at a time
+        self.users: dict[str, "k2xxx"] = {owner.channel: owner}  # channel --> its driver
+        self.cond = threading.Condition()  # for what follows
+        self.requests: dict[str, int] = {}  # channel --> the points of the measure() it's waiting on
+        self.results: dict[str, list | BaseException] = {}  # channel --> its measure()'s readings, made by the other channel
+        self.armed: dict[str, tuple] = {}  # channel --> the shape of the sweep its setupSweep readied
+
+    @classmethod
+    def claim(cls, address: str) -> threading.RLock:
+        """the lock a channel holds on an address while it connects or disconnects"""
+        with cls.registry_lock:
+            return cls.claims.setdefault(address, threading.RLock())
+
+    @classmethod
+    def find(cls, address: str) -> "SharedComms | None":
+        """the comms another channel has open to address, if there are any"""
+        with cls.registry_lock:
+            return cls.links.get(address)
+
+    @classmethod
+    def open(cls, owner: "k2xxx") -> "SharedComms":
+        """makes the comms owner just opened available to the instrument's other channels"""
+        link = cls(owner)
+        with cls.registry_lock:
+            cls.links[owner.address] = link
+        return link
+
+    def join(self, sm: "k2xxx"):
+        with self.cond:
+            self.users[sm.channel] = sm
+
+    def leave(self, sm: "k2xxx") -> bool:
+        """sm stops using the comms, returns whether other channels still are"""
+        with self.cond:
+            self.users.pop(sm.channel, None)
+            self.armed.pop(sm.channel, None)
+            remaining = bool(self.users)
+        if not remaining:
+            with self.registry_lock:
+                if self.links.get(self.address) is self:
+                    del self.links[self.address]
+        return remaining
+
+    def arm(self, channel: str, shape: tuple | None):
+        """notes the sweep a channel has ready (None for none), so the other channel's can wait a moment to go with it"""
+        with self.cond:
+            if shape is None:
+                self.armed.pop(channel, None)
+            else:
+                self.armed[channel] = shape
+            self.cond.notify_all()
+
+    def measure(self, sm: "k2xxx", nPoints: int = 1) -> list:
+        """sm.measure(), made together with the other channel's if it wants one of the same shape"""
+        shape = sm.measure_shape(nPoints)
+        with self.cond:
+            self.requests[sm.channel] = nPoints
+            self.cond.notify_all()
+        with self.lock:
+            with self.cond:
+                if sm.channel in self.results:  # the other channel made ours with its own
+                    batch = None
+                else:
+                    if shape[0] == "sweep":  # give an armed sweep a moment to be asked for
+                        deadline = time.monotonic() + self.window
+                        while True:
+                            late = [channel for channel, armed in self.armed.items() if (channel not in self.requests) and (armed == shape)]
+                            left = deadline - time.monotonic()
+                            if (not late) or (left <= 0):
+                                break
+                            self.cond.wait(left)
+                    batch = {channel: n for channel, n in self.requests.items() if (channel in self.users) and (self.users[channel].measure_shape(n) == shape)}
+                    batch[sm.channel] = nPoints
+                    for channel in batch:
+                        self.requests.pop(channel, None)
+                        self.armed.pop(channel, None)
+            if batch is not None:
+                try:
+                    if len(batch) > 1:
+                        results = sm.measure_together({channel: self.users[channel] for channel in batch}, batch)
+                    else:
+                        results = {sm.channel: sm.measure_alone(nPoints)}
+                except BaseException as e:
+                    results = {channel: e for channel in batch}
+                with self.cond:
+                    self.results.update(results)
+        with self.cond:
+            ret = self.results.pop(sm.channel)
+        if isinstance(ret, BaseException):
+            raise ret
+        return ret
@@ -0,0 +1,90 @@
+"""
+time source for the measurement logic and the virtual instruments
+swap in a VirtualClock to run simulated (all virtual hardware) measurements faster than real time
+"""
+
+import contextlib
+import time as _time
+from multiprocessing.synchronize import Event as mEvent
+from threading import Event as tEvent
+from typing import Generator
+
+
+class Clock(object):
+    """the wall clock"""
+
+    speed: float = 1.0
+
+    def time(self) -> float:
+        return _time.time()
+
+    def sleep(self, secs: float) -> None:
+        _time.sleep(secs)
+
+    def wait(self, event: tEvent | mEvent, timeout: float | None = None) -> bool:
+        """like event.wait(timeout) with the timeout given in this clock's seconds"""
+        return event.wait(timeout)
+
+
+class VirtualClock(Clock):
+    """
+    a clock that runs speed times faster than the wall clock
+    it starts at the current wall time, so timestamps from a virtual run predict when a real run would get there
+    """
+
+    def __init__(self, speed: float = 100.0, start: float | None = None):
+        if not speed > 0:
+            raise ValueError(f"Invalid virtual clock speed: {speed}")
+        self.speed = speed
+        self._mono0 = _time.monotonic()
+        if start is None:
+            self._t0 = _time.time()
+        else:
+            self._t0 = start
+
+    def time(self) -> float:
+        return self._t0 + (_time.monotonic() - self._mono0) * self.speed
+
+    def sleep(self, secs: float) -> None:
+        if secs > 0:
+            _time.sleep(secs / self.speed)
+
+    def wait(self, event: tEvent | mEvent, timeout: float | None = None) -> bool:
+        if timeout is not None:
+            timeout = max(timeout, 0) / self.speed
+        return event.wait(timeout)
+
+
+_clock: Clock = Clock()  # the clock in use by this process
+
+
+def time() -> float:
+    """the current time in seconds since the epoch according to the clock in use"""
+    return _clock.time()
+
+
+def sleep(secs: float) -> None:
+    """sleep for secs seconds according to the clock in use"""
+    _clock.sleep(secs)
+
+
+def wait(event: tEvent | mEvent, timeout: float | None = None) -> bool:
+    """wait for an event for at most timeout seconds according to the clock in use"""
+    return _clock.wait(event, timeout)
+
+
+def get() -> Clock:
+    """the clock in use"""
+    return _clock
+
+
+@contextlib.contextmanager
+def using(clock: Clock) -> Generator[Clock, None, None]:
+    """context in which this process uses the given clock"""
+    global _clock
+    previous = _clock
+    _clock = clock
+    try:
+        yield clock
+    finally:
+        _clock = previous
@@ -0,0 +1,1194 @@
+"""
+local TCP stand-ins for instruments so that the real drivers can be exercised, benchmarked and regression tested without hardware
+point a driver at an emulator's address (socket://127.0.0.1:port) instead of at the instrument
+"""
+
+import ast
+import concurrent.futures
+import random
+import re
+import socket
+import socketserver
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+import numpy
+
+from centralcontrol import clock
+from centralcontrol.logstuff import get_logger
+from centralcontrol.shadow import canonical
+from centralcontrol.virt import FakeMC
+from centralcontrol.virt import FakeSMU
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    emulator: "Emulator"
+    channel: str
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: _Server
+
+    def handle(self):
+        self.server.emulator.serve(self.request, self.server.channel)
+
+
+class Emulator(object):
+    """
+    TCP instrument emulator with configurable link latency, bandwidth and faults
+    an instrument listens on one port per channel. subclasses implement handle(), which gets one received frame (by default a line) and returns the reply (or None for no reply)
+    faults (lost commands and injected errors) only hit the first channel
+    """
+
+    channels: tuple[str, ...] = ("main",)
+    host: str = "127.0.0.1"
+    port: int = 0  # for the first channel, 0 picks a free port
+    latency: float = 0.0  # [s] turnaround time before every reply
+    bandwidth: float | None = None  # [bytes/s] link throughput in each direction, None for as fast as possible
+    p_drop: float = 0.0  # probability that a command gets lost on its way to the instrument
+    p_error: float = 0.0  # probability that a command's reply gets replaced with an error (see inject())
+    write_term: str = "\n"  # reply terminator
+    encoding = "latin-1"  # replies are str with one character per byte, so binary payloads can pass through
+    chunk: int = 4096  # bytes per socket recv
+
+    def __init__(self, host: str = host, port: int = port, latency: float = latency, bandwidth: float | None = bandwidth, p_drop: float = p_drop, p_error: float = p_error, seed: int = 0):
+        self.lg = get_logger(".".join([__name__, type(self).__name__]))
+        self.host = host
+        self.ports = {channel: 0 for channel in self.channels}
+        self.ports[self.channels[0]] = port
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.p_drop = p_drop
+        self.p_error = p_error
+        self.rng = random.Random(seed)
+        self.lock = threading.RLock()  # the instrument deals with one command at a time, no matter how many connections there are
+        self.conns: set[socket.socket] = set()
+        self.servers: dict[str, _Server] = {}
+        self.n_rx = 0  # bytes received
+        self.n_tx = 0  # bytes sent
+        self.n_commands = 0  # frames handled
+        self.n_dropped = 0  # commands lost
+        self.n_errors = 0  # errors injected
+
+    def __enter__(self) -> "Emulator":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.stop()
+        return False
+
+    @property
+    def port(self) -> int:
+        return self.ports[self.channels[0]]
+
+    @property
+    def address(self) -> str:
+        """where the drivers should connect"""
+        return f"socket://{self.host}:{self.port}"
+
+    def start(self):
+        for channel in self.channels:
+            server = _Server((self.host, self.ports[channel]), _Handler)
+            server.emulator = self
+            server.channel = channel
+            self.ports[channel] = server.server_address[1]
+            self.servers[channel] = server
+            threading.Thread(target=server.serve_forever, daemon=True, name=f"{type(self).__name__}-{channel}").start()
+        self.lg.debug(f"Listening at {self.host} on {self.ports}")
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+        self.servers.clear()
+        self.hangup()
+        self.lg.debug("Stopped")
+
+    def hangup(self):
+        """drops every client connection"""
+        for conn in list(self.conns):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def throttle(self, n_bytes: int):
+        """takes as long as the link would to move this many bytes"""
+        if self.bandwidth:
+            time.sleep(n_bytes / self.bandwidth)
+
+    def send(self, conn: socket.socket, reply: bytes):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if self.bandwidth:
+            step = max(1, int(self.bandwidth / 100))  # trickle it out in ~10ms pieces
+            for i in range(0, len(reply), step):
+                piece = reply[i : i + step]
+                conn.sendall(piece)
+                self.throttle(len(piece))
+        else:
+            conn.sendall(reply)
+        self.n_tx += len(reply)
+
+    def frames(self, data: bytes, channel: str) -> tuple[list[str], bytes]:
+        """splits received data into complete frames and the incomplete remainder. by default frames are CR, LF or CRLF terminated lines"""
+        pieces = re.split(rb"[\r\n]", data)
+        lines = []
+        for piece in pieces[:-1]:
+            line = bytes(c for c in piece if c >= 0x20).decode(errors="replace").strip()  # drop control characters (XON, interrupts...)
+            if line:
+                lines.append(line)
+        return (lines, pieces[-1])
+
+    def welcome(self, channel: str) -> str | None:
+        """what a new connection gets told before it says anything"""
+        return None
+
+    def serve(self, conn: socket.socket, channel: str = "main"):
+        """talks to one client until it goes away"""
+        self.conns.add(conn)
+        pending = b""
+        try:
+            greeting = self.welcome(channel)
+            if greeting is not None:
+                self.send(conn, greeting.encode(self.encoding))
+            while True:
+                try:
+                    data = conn.recv(self.chunk)
+                except OSError:
+                    break
+                if not data:
+                    break
+                self.n_rx += len(data)
+                self.throttle(len(data))
+                frames, pending = self.frames(pending + data, channel)
+                for frame in frames:
+                    with self.lock:
+                        faulty = channel == self.channels[0]
+                        if faulty and (self.p_drop > 0) and (self.rng.random() < self.p_drop):
+                            self.n_dropped += 1
+                            self.dropped(frame, channel)
+                            continue
+                        self.n_commands += 1
+                        reply = self.handle(frame, channel)
+                        if faulty and (self.p_error > 0) and (self.rng.random() < self.p_error):
+                            self.n_errors += 1
+                            reply = self.inject(frame, channel, reply)
+                    if reply is not None:
+                        try:
+                            self.send(conn, (reply + self.write_term).encode(self.encoding))
+                        except OSError:
+                            break
+        finally:
+            self.conns.discard(conn)
+
+    def handle(self, frame: str, channel: str = "main") -> str | None:
+        raise NotImplementedError
+
+    def dropped(self, frame: str, channel: str):
+        """a command got lost"""
+        pass
+
+    def inject(self, frame: str, channel: str, reply: str | None) -> str | None:
+        """the reply to a command that should fail"""
+        return reply
+
+
+class SmuEmulator(Emulator):
+    """
+    sourcemeter emulator driven by the virtual device model
+    dialect picks the command language: "2400" or "2450" (SCPI, the 2450 running its SCPI2400 language set), "2600" (TSP) or "am" (Ark Metrica)
+    relative_timestamps has 2600 buffer timestamps count from each buffer's first reading, like the real thing does, instead of from timer.reset()
+    """
+
+    IDNS = {}
+    IDNS["2400"] = "KEITHLEY INSTRUMENTS INC.,MODEL 2400,1234567,C34 Sep 21 2016 15:30:00/A02  /S/K"
+    IDNS["2450"] = IDNS["2400"]  # running its SCPI2400 language set, a 2450 claims to be a 2400
+    IDNS["2600"] = "Keithley Instruments Inc., Model 2636, 1234567, 1.4.2"
+    IDNS["am"] = "Ark Metrica,SMU,00000001,1.0.0"
+
+    TSP_CONSTANTS = {"OUTPUT_DCAMPS": 0, "OUTPUT_DCVOLTS": 1, "OUTPUT_OFF": 0, "OUTPUT_ON": 1, "OUTPUT_HIGH_Z": 2, "AUTOZERO_OFF": 0, "AUTOZERO_ONCE": 1, "AUTOZERO_AUTO": 2, "AUTORANGE_OFF": 0, "AUTORANGE_ON": 1, "SENSE_LOCAL": 0, "SENSE_REMOTE": 1, "DELAY_AUTO": -1, "FILTER_OFF": 0, "FILTER_ON": 1, "FILTER_MOVING_AVG": 0, "FILTER_REPEAT_AVG": 1, "FILTER_MEDIAN": 2}
+
+    compliance_bit_number: int = 3  # where FakeSMU flags compliance in its status word
+    # what each of a 2600's channels has its own of, the commands act on the channel they name (see use())
+    CHANNEL_STATE = ("src", "level", "mode", "sweep_start", "sweep_stop", "source_list", "prot", "points", "count", "delay", "interval", "output", "nplc", "filter_count", "filter_on")
+
+    def __init__(self, dialect: str = "2400", smu: FakeSMU | None = None, point_time: float = 0.01, relative_timestamps: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        if dialect not in self.IDNS:
+            raise ValueError(f"Unknown SMU dialect: {dialect}")
+        self.dialect = dialect
+        self.relative_timestamps = relative_timestamps
+        if dialect == "am":
+            self.write_term = "\r"
+        if smu is None:
+            smu = FakeSMU()
+        self.smu = smu
+        self.smu.measurementTime = point_time
+        self.smus = {"a": smu}  # channel --> the device connected to it
+        if dialect == "2600":  # a 2636, it has two
+            self.smus["b"] = FakeSMU()
+            self.smus["b"].measurementTime = point_time
+        self.channel = "a"  # the channel the state below is
+        self.parked: dict[str, dict] = {}  # the other channels' state
+        self.loading: list[str] | None = None  # the lines of the TSP script being loaded, None when we're not loading one
+        self.tsp_scripts: dict[str, str] = {}  # loaded TSP scripts (these survive resets)
+        self.tsp_functions: dict[str, str] = {}  # functions the scripts defined when they were run --> which of ours they are
+        self.tsp_channels: dict[str, str] = {}  # those functions --> the channel they drive
+        self.reset()
+
+    @staticmethod
+    def channel_defaults() -> dict:
+        """a channel's power on/*RST state"""
+        ret = {}
+        ret["src"] = "volt"
+        ret["level"] = {"volt": 0.0, "curr": 0.0}
+        ret["mode"] = {"volt": "fix", "curr": "fix"}
+        ret["sweep_start"] = {"volt": 0.0, "curr": 0.0}
+        ret["sweep_stop"] = {"volt": 0.0, "curr": 0.0}
+        ret["source_list"] = {"volt": [0.0], "curr": [0.0]}
+        ret["prot"] = {"volt": 21.0, "curr": 1.05e-4}
+        ret["points"] = 2500
+        ret["count"] = 1
+        ret["delay"] = 0.0  # 24xx trigger delay [s], before every reading
+        ret["interval"] = 0.0  # 2600 measure interval [s], from the start of one reading to the next
+        ret["output"] = False
+        ret["nplc"] = 1.0
+        ret["filter_count"] = 10  # readings the (repeat) filter averages
+        ret["filter_on"] = False
+        return ret
+
+    def use(self, channel: str):
+        """switches the state the commands act on to a channel's"""
+        if channel == self.channel:
+            return
+        self.parked[self.channel] = {name: getattr(self, name) for name in self.CHANNEL_STATE}
+        for name, value in self.parked.pop(channel, self.channel_defaults()).items():
+            setattr(self, name, value)
+        self.smu = self.smus[channel]
+        self.channel = channel
+
+    def on_channel(self, name: str) -> str:
+        """a TSP name on either channel as its smua one, having switched to the channel it's on"""
+        m = re.fullmatch(r"smu([ab])\.(source|measure|reset)(.*)", name)
+        if m is None:
+            return name
+        self.use(m.group(1))
+        return "smua." + m.group(2) + m.group(3)
+
+    def reset(self):
+        """power on/*RST state"""
+        for name, value in self.channel_defaults().items():
+            setattr(self, name, value)
+        for state in self.parked.values():
+            state.update(self.channel_defaults())
+        self.elements = ["volt", "curr", "res", "time", "stat"]
+        self.data_format = "asc"  # or "real" (32 bit floats)
+        self.byte_order = "norm"  # or "swap"
+        self.errors: list[tuple[int, str]] = []
+        self.settings: dict[str, str] = {"syst:tlin": "0", "syst:lfr": "50", "syst:rsen": "0", "sour2:ttl": "15"}
+        self.buffers: dict[str, list[dict]] = {"smua.nvbuffer1": [], "smua.nvbuffer2": [], "smub.nvbuffer1": [], "smub.nvbuffer2": []}
+
+    def handle(self, frame: str, channel: str = "main") -> str | None:
+        if (self.dialect == "2600") and ((self.loading is not None) or frame.startswith("loadscript ")):
+            ret = self.load_script(frame)
+        elif self.dialect == "2600":
+            statements = re.split(r";(?![^(]*\))", frame)  # ; separates statements, but not inside a call's arguments
+            replies = [reply for reply in (self.tsp(statement.strip()) for statement in statements if statement.strip()) if reply is not None]
+            if replies:
+                ret = self.write_term.join(replies)  # every print() makes its own line
+            else:
+                ret = None
+        else:
+            replies = [reply for reply in (self.scpi(cmd) for cmd in frame.split(";")) if reply is not None]
+            if replies:
+                ret = ";".join(replies)
+            else:
+                ret = None
+        return ret
+
+    def inject(self, frame: str, channel: str, reply: str | None) -> str | None:
+        """the command went through, but it left an error in the queue"""
+        self.error(-200, "Execution error")
+        return reply
+
+    def error(self, code: int, msg: str):
+        self.lg.debug(f"Instrument error {code}: {msg}")
+        self.errors.append((code, msg))
+
+    def pop_errors(self, everything: bool = False) -> str:
+        """the error queue as a reply"""
+        if self.dialect == "am":
+            if self.errors:
+                ret = ";".join(f"{code:+04d}, {msg}" for code, msg in self.errors)
+                self.errors.clear()
+            else:
+                ret = "+000, No Error"
+        else:
+            if self.errors:
+                code, msg = self.errors.pop(0)
+                ret = f'{code},"{msg}"'
+            else:
+                ret = '0,"No error"'
+        return ret
+
+    @staticmethod
+    def canonical(header: str) -> str:
+        """SCPI header in short form, so that e.g. :SOURce:VOLTage:STARt and sour:volt:star match"""
+        return canonical(header)
+
+    @staticmethod
+    def func(arg: str) -> str:
+        """source/sense function name from an argument"""
+        arg = arg.strip().strip("'\"").lower()
+        if arg.startswith("curr"):
+            ret = "curr"
+        elif arg.startswith("res"):
+            ret = "res"
+        else:
+            ret = "volt"
+        return ret
+
+    def fmt(self, value: float) -> str:
+        return f"{value:+.6E}"
+
+    def scpi(self, cmd: str) -> str | None:
+        """runs one SCPI command, returns the reply for queries"""
+        try:
+            return self.run_scpi(cmd)
+        except ValueError:  # an argument that doesn't parse
+            self.error(-104, "Data type error")
+            return None
+
+    def run_scpi(self, cmd: str) -> str | None:
+        cmd = cmd.strip()
+        if not cmd:
+            return None
+        header, _, arg = cmd.partition(" ")
+        arg = arg.strip()
+        query = header.endswith("?")
+        h = self.canonical(header.removesuffix("?"))
+        keithley = self.dialect != "am"
+        ret = None
+
+        if h == "*idn":
+            ret = self.IDNS[self.dialect]
+        elif h in ("*rst", "syst:pres"):
+            self.reset()
+        elif h in ("*cls", "stat:que:cle", "stat:pres", "trac:cle", "syst:wdt:cle", "*trg"):
+            if h != "*trg":
+                self.errors.clear()
+        elif h == "*opc":
+            ret = "1" if query else None
+        elif h == "*tst":
+            ret = "0"
+        elif h == "*opt":
+            ret = "0"
+        elif h == "*lang":
+            ret = "SCPI2400"
+        elif h == "*stb":
+            ret = str((int(self.output) << 2) | (int(self.src == "curr") << 3))
+        elif h in ("syst:err", "syst:err:all", "syst:err:next"):
+            ret = self.pop_errors()
+        elif h == "disp:wind:data":
+            if self.dialect == "2400":
+                ret = '"2400 virtual"'
+            else:
+                ret = ""  # a 2450 pretending to be a 2400 has nothing to say here
+        elif h in ("sour:func", "sour:func:mode"):
+            if query:
+                ret = self.src.upper() if keithley else self.src
+            else:
+                self.src = self.func(arg)
+        elif h in ("sour:volt", "sour:curr", "sour:volt:lev", "sour:curr:lev", "sour:volt:lev:imm:ampl", "sour:curr:lev:imm:ampl"):
+            f = h.split(":")[1]
+            if query:
+                ret = self.fmt(self.level[f])
+            else:
+                self.level[f] = float(arg)
+        elif h in ("sour:volt:mode", "sour:curr:mode"):
+            f = h.split(":")[1]
+            if query:
+                ret = self.mode[f].upper() if keithley else self.mode[f]
+            else:
+                self.mode[f] = arg.lower()[:3]
+        elif h in ("sour:volt:star", "sour:curr:star"):
+            f = h.split(":")[1]
+            if query:
+                ret = self.fmt(self.sweep_start[f])
+            else:
+                self.sweep_start[f] = float(arg)
+        elif h in ("sour:volt:stop", "sour:curr:stop"):
+            f = h.split(":")[1]
+            if query:
+                ret = self.fmt(self.sweep_stop[f])
+            else:
+                self.sweep_stop[f] = float(arg)
+        elif h in ("sour:volt:step", "sour:curr:step"):
+            f = h.split(":")[1]
+            ret = self.fmt((self.sweep_stop[f] - self.sweep_start[f]) / max(self.points - 1, 1))
+        elif h in ("sour:list:volt", "sour:list:curr"):
+            f = h.split(":")[2]
+            if query:
+                ret = ",".join(self.fmt(level) for level in self.source_list[f])
+            else:
+                self.source_list[f] = [float(level) for level in arg.split(",")]
+        elif h == "sour:swe:poin":
+            if query:
+                ret = str(self.points)
+            else:
+                self.points = int(float(arg))
+        elif h == "trig:coun":
+            if query:
+                ret = str(self.count)
+            else:
+                self.count = int(float(arg))
+        elif h == "trig:del":
+            if query:
+                ret = self.fmt(self.delay)
+            else:
+                self.delay = float(arg)
+        elif h in ("sens:curr:prot", "sens:volt:prot", "sens:curr:prot:lev", "sens:volt:prot:lev"):
+            f = h.split(":")[1]
+            if query:
+                ret = self.fmt(self.prot[f])
+            else:
+                self.prot[f] = float(arg)
+        elif h == "sens:aver:coun":
+            if query:
+                ret = str(self.filter_count)
+            else:
+                self.filter_count = int(float(arg))
+        elif h == "sens:aver":
+            if query:
+                ret = str(int(self.filter_on))
+            else:
+                self.filter_on = arg.lower() in ("on", "1")
+        elif h in ("sens:curr:nplc", "sens:volt:nplc", "sens:res:nplc"):
+            if query:
+                ret = self.fmt(self.nplc)
+            else:
+                self.nplc = float(arg)
+        elif h == "outp":
+            if query:
+                ret = str(int(self.output))
+            else:
+                self.output = arg.lower() in ("1", "on")
+        elif h == "form:elem":
+            if query:
+                ret = ",".join(e.upper() for e in self.elements)
+            else:
+                asked = [self.func(e) if not e.strip().lower().startswith(("time", "stat")) else e.strip().lower()[:4] for e in arg.split(",")]
+                self.elements = [e for e in ["volt", "curr", "res", "time", "stat"] if e in asked]
+        elif h in ("form", "form:data"):
+            if query:
+                ret = "REAL,32" if self.data_format == "real" else "ASC"
+            elif arg.lower().startswith(("real", "sre")):
+                self.data_format = "real"
+            else:
+                self.data_format = "asc"
+        elif h == "form:bord":
+            if query:
+                ret = self.byte_order.upper()
+            else:
+                self.byte_order = arg.lower()[:4]
+        elif h == "syst:time:res":
+            self.smu.t0 = clock.time()
+        elif h == "sour2:ttl:act":
+            ret = self.settings["sour2:ttl"]
+        elif h in ("read", "meas"):
+            ret = self.scpi_readings(self.acquire())
+        elif query:
+            if h in self.settings:
+                ret = self.settings[h]
+            else:
+                self.error(-113, "Undefined header")
+        else:
+            self.settings[h] = arg  # a setting we don't simulate
+        return ret
+
+    def acquire(self) -> list[tuple[float, float, float, int]]:
+        """makes the measurements the instrument is set up for, as (voltage, current, time, status) tuples"""
+        sm = self.smu
+        if self.output and (self.mode[self.src] == "swe"):
+            if self.src == "volt":
+                sm.setupSweep(sourceVoltage=True, compliance=self.prot["curr"], nPoints=self.points, start=self.sweep_start["volt"], end=self.sweep_stop["volt"], senseRange="a")
+                data = sm.measure(self.points)
+            else:
+                data = []
+                for setpoint in numpy.linspace(self.sweep_start["curr"], self.sweep_stop["curr"], self.points):
+                    sm.setupDC(sourceVoltage=False, compliance=self.prot["volt"], setPoint=float(setpoint), senseRange="a")
+                    data += sm.measure()
+        elif self.output and (self.mode[self.src] == "lis"):  # trigger count points, stepping through the list (round again if it's short)
+            levels = [self.source_list[self.src][k % len(self.source_list[self.src])] for k in range(self.count)]
+            if self.src == "volt":
+                sm.setupSweep(sourceVoltage=True, compliance=self.prot["curr"], senseRange="a", levels=levels)
+                data = sm.measure(len(levels))
+            else:
+                data = []
+                for setpoint in levels:
+                    sm.setupDC(sourceVoltage=False, compliance=self.prot["volt"], setPoint=setpoint, senseRange="a")
+                    data += sm.measure()
+        else:
+            self.hold()
+            data = self.repeat()
+        return [self.reading(m) for m in data]
+
+    @staticmethod
+    def reading(m: tuple) -> tuple[float, float, float, int]:
+        """a FakeSMU measurement as (voltage, current, time, status)"""
+        return (float(m[0]), float(m[1]), float(m[-2]), int(m[-1]))
+
+    def hold(self) -> FakeSMU:
+        """sets the device up to be measured at the present source level (open circuit with the output off)"""
+        sm = self.smu
+        if not self.output:
+            sm.setupDC(sourceVoltage=False, compliance=self.prot["volt"], setPoint=0.0, senseRange="a")
+        elif self.src == "volt":
+            sm.setupDC(sourceVoltage=True, compliance=self.prot["curr"], setPoint=self.level["volt"], senseRange="a")
+        else:
+            sm.setupDC(sourceVoltage=False, compliance=self.prot["volt"], setPoint=self.level["curr"], senseRange="a")
+        return sm
+
+    def repeat(self) -> list[tuple]:
+        """count readings at a fixed level, paced by the trigger delay (24xx) or the measure interval (2600)"""
+        data = []
+        for k in range(self.count):
+            pause = self.delay
+            if k:
+                pause += max(self.interval - self.smu.measurementTime * self.n_filter, 0)
+            if pause > 0:
+                clock.sleep(pause)
+            data.append(self.filtered(self.smu, self.n_filter))
+        return data
+
+    @property
+    def n_filter(self) -> int:
+        """how many readings go into each one, with the filter on"""
+        return self.filter_count if self.filter_on else 1
+
+    @staticmethod
+    def filtered(sm: FakeSMU, n: int) -> tuple:
+        """a reading averaged over n (the repeat filter)"""
+        rows = [sm.measure()[0] for _ in range(n)]
+        if n == 1:
+            return rows[0]
+        return (sum(row[0] for row in rows) / n, sum(row[1] for row in rows) / n, *rows[-1][2:])
+
+    def compliance(self, status: int) -> bool:
+        return bool(status & (1 << self.compliance_bit_number))
+
+    def scpi_readings(self, data: list[tuple[float, float, float, int]]) -> str:
+        """formats readings like the instrument sends them"""
+        fields = []
+        if self.dialect == "am":
+            for v, i, t, status in data:
+                am_status = (int(self.compliance(status)) << 1) | (int(self.output) << 2) | (int(self.src == "curr") << 3)
+                fields += [f"{v:.8e}", f"{i:.8e}", f"{t * 1000:.3f}", str(am_status)]
+        else:
+            numbers = []
+            for v, i, t, status in data:
+                if i != 0:
+                    r = v / i
+                else:
+                    r = 9.91e37  # SCPI not-a-number
+                values = {"volt": v, "curr": i, "res": r, "time": t, "stat": float(status)}
+                numbers += [values[e] for e in self.elements]
+            if self.data_format == "real":
+                payload = self.pack(numbers, "f4", self.byte_order == "swap")
+                return f"#{len(str(len(payload)))}{len(payload)}{payload}"  # IEEE 488.2 definite length block
+            fields = [self.fmt(number) for number in numbers]
+        return ",".join(fields)
+
+    def pack(self, numbers: list[float], kind: str, little: bool) -> str:
+        """numbers as binary, in a str"""
+        dtype = numpy.dtype(kind).newbyteorder("<" if little else ">")
+        return numpy.array(numbers, dtype=dtype).tobytes().decode(self.encoding)
+
+    def tsp_numbers(self, numbers: list[float]) -> str:
+        """numbers in the format printbuffer() and printnumber() use"""
+        fmt = self.settings.get("format.data", "format.ASCII")
+        little = self.settings.get("format.byteorder", "format.NORMAL") in ("format.LITTLEENDIAN", "format.SWAPPED")
+        if fmt in ("format.REAL", "format.REAL64"):
+            ret = "#0" + self.pack(numbers, "f8", little)
+        elif fmt in ("format.SREAL", "format.REAL32"):
+            ret = "#0" + self.pack(numbers, "f4", little)
+        else:
+            ret = ", ".join(f"{number:.8e}" for number in numbers)
+        return ret
+
+    def tsp_value(self, expr: str) -> float | str:
+        """evaluates the simple expressions the drivers send"""
+        expr = expr.strip()
+        m = re.fullmatch(r"(smu[ab]\.nvbuffer[12])\.n", expr)
+        if m:
+            return len(self.buffers[m.group(1)])
+        m = re.fullmatch(r"smu[ab]\.([A-Z_]+)", expr)
+        if m:
+            return self.TSP_CONSTANTS.get(m.group(1), 0)
+        if expr == "errorqueue.count":
+            return len(self.errors)
+        m = re.fullmatch(r"type\((\w+)\)", expr)
+        if m:
+            return "function" if m.group(1) in self.tsp_functions else "nil"
+        if expr in ("true", "false"):
+            return int(expr == "true")
+        m = re.fullmatch(r"smu([ab])\.source\.(func|output)", expr)
+        if m:
+            self.use(m.group(1))
+            return int(self.src == "volt") if m.group(2) == "func" else int(self.output)
+        if expr in self.settings:
+            return self.settings[expr]
+        try:
+            return float(expr)
+        except ValueError:
+            return expr.strip("'\"")
+
+    def tsp_print(self, value: float | str) -> str:
+        if isinstance(value, str):
+            ret = value
+        else:
+            ret = f"{value:.5e}"
+        return ret
+
+    def tsp_iv(self, ibuf: str, vbuf: str) -> list[tuple[float, float, float, int]]:
+        """makes the measurements the instrument is set up for into a pair of nvbuffers"""
+        for buf in (ibuf, vbuf):
+            if self.settings.get(f"{buf}.appendmode", 0) != 1:
+                self.buffers[buf].clear()
+        data = self.acquire()
+        self.store(ibuf, vbuf, data)
+        return data
+
+    def store(self, ibuf: str, vbuf: str, data: list[tuple[float, float, float, int]]):
+        """puts readings in a pair of nvbuffers"""
+        for v, i, t, status in data:
+            tsp_status = int(self.compliance(status)) << 6
+            for buf, value in ((ibuf, i), (vbuf, v)):
+                base = self.buffers[buf][0]["base"] if self.buffers[buf] else t  # when the buffer's first reading was taken
+                timestamp = t - base if self.relative_timestamps else t
+                self.buffers[buf].append({"readings": value, "timestamps": timestamp, "statuses": tsp_status, "sourcevalues": self.level[self.src], "base": base})
+
+    def tsp_ivs(self, channels: list[str], pool: concurrent.futures.Executor) -> None:
+        """smuX.measure.overlappediv() on each of channels then waitcomplete(): one reading per channel, all taken at the same time"""
+        devices = {}
+        for channel in channels:
+            self.use(channel)
+            devices[channel] = (self.hold(), self.n_filter)
+        measured = dict(zip(channels, pool.map(lambda channel: self.filtered(*devices[channel]), channels)))
+        for channel in channels:
+            self.use(channel)
+            self.store(f"smu{channel}.nvbuffer1", f"smu{channel}.nvbuffer2", [self.reading(measured[channel])])
+
+    def load_script(self, line: str) -> None:
+        """collects the lines of a script between loadscript and endscript"""
+        if self.loading is None:
+            self.loading = [line]
+        elif line.strip() == "endscript":
+            name = self.loading[0].split()[1]
+            self.tsp_scripts[name] = "\n".join(self.loading[1:])
+            self.loading = None
+        else:
+            self.loading.append(line)
+        return None
+
+    def run_script(self, kind: str, args: list, channel: str = "a") -> str:
+        """
+        does what the scripts in centralcontrol.tsp do, natively (we don't run Lua)
+        returns what the script prints
+        """
+        if kind == "dual":
+            return self.run_dual(args)
+        ibuf, vbuf = f"smu{channel}.nvbuffer1", f"smu{channel}.nvbuffer2"
+        self.use(channel)
+
+        def point(src_v, level, dly) -> tuple[float, float]:
+            self.level["volt" if src_v == 1 else "curr"] = level
+            if dly > 0:
+                clock.sleep(dly)
+            v, i, t, status = self.tsp_iv(ibuf, vbuf)[-1]
+            return (v, i)
+
+        self.buffers[ibuf].clear()
+        self.buffers[vbuf].clear()
+        extra = []
+        if kind == "sweep":
+            src_v, start, stop, points, dly = args
+            for level in numpy.linspace(start, stop, int(points)):
+                point(src_v, float(level), dly)
+        elif kind == "list":
+            src_v, levels, dly = args
+            for level in levels:
+                point(src_v, level, dly)
+        elif kind == "dwell":
+            n, interval, t_next = args
+            wait = t_next - (clock.time() - self.smu.t0)
+            if wait > 0:
+                clock.sleep(wait)
+            self.count = int(n)
+            self.interval = interval
+            t_first = clock.time() - self.smu.t0
+            self.tsp_iv(ibuf, vbuf)
+            self.count = 1
+            self.interval = 0.0
+            extra.append(self.tsp_numbers([t_first - self.buffers[ibuf][0]["timestamps"]]))
+        elif kind == "mppt":
+            v, dv, p_last, n, dly, v_min, v_max = args
+            for k in range(int(n)):
+                vm, i = point(1, v, dly)
+                p = -(i * vm)
+                if p < p_last:
+                    dv = -dv
+                p_last = p
+                v += dv
+                if not (v_min <= v <= v_max):
+                    v = min(max(v, v_min), v_max)
+                    dv = -dv
+            extra.append(self.tsp_numbers([v, dv, p_last]))
+        replies = [self.tsp(f"printbuffer(1, {ibuf}.n, {vbuf}.readings, {ibuf}.readings, {ibuf}.timestamps, {ibuf}.statuses)"), *extra]
+        return self.write_term.join(replies)
+
+    def run_dual(self, args: list) -> str:
+        """the dual script: both channels stepping through their levels together, measured at the same time at each step"""
+        n, src_a, levels_a, src_b, levels_b, dly = args
+        lanes = {"a": (src_a, levels_a), "b": (src_b, levels_b)}
+        for buf in ("smua.nvbuffer1", "smua.nvbuffer2", "smub.nvbuffer1", "smub.nvbuffer2"):
+            self.buffers[buf].clear()
+        with concurrent.futures.ThreadPoolExecutor(len(lanes)) as pool:
+            for k in range(int(n)):
+                for channel, (src_v, levels) in lanes.items():
+                    if k < len(levels):
+                        self.use(channel)
+                        self.level["volt" if src_v == 1 else "curr"] = levels[k]
+                if dly > 0:
+                    clock.sleep(dly)
+                self.tsp_ivs(list(lanes), pool)
+        columns = [f"smu{channel}.{column}" for channel in lanes for column in ("nvbuffer2.readings", "nvbuffer1.readings", "nvbuffer1.timestamps", "nvbuffer1.statuses")]
+        return self.tsp(f"printbuffer(1, {int(n)}, {', '.join(columns)})")
+
+    def tsp(self, line: str) -> str | None:
+        """runs one line of TSP (or a common command), returns what it prints"""
+        ret = None
+        if line.startswith("*"):
+            return self.scpi(line)
+
+        m = re.fullmatch(r"print\((.*)\)", line)
+        if m and (m.group(1).strip() == "errorqueue.next()"):  # error code, message, severity, node
+            code, msg = self.errors.pop(0) if self.errors else (0, "Queue Is Empty")
+            return "\t".join([self.tsp_print(code), msg, self.tsp_print(2 if code else 0), self.tsp_print(0)])
+        if m:
+            return self.tsp_print(self.tsp_value(m.group(1)))
+
+        m = re.fullmatch(r"printbuffer\((.*)\)", line)
+        if m:
+            args = [arg.strip() for arg in m.group(1).split(",")]
+            first = int(float(self.tsp_value(args[0])))
+            last = int(float(self.tsp_value(args[1])))
+            columns = []
+            for arg in args[2:]:
+                bm = re.fullmatch(r"(smu[ab]\.nvbuffer[12])\.(\w+)", arg)
+                if bm is None:
+                    self.error(-285, f"Program syntax: {arg}")
+                    return None
+                entries = self.buffers[bm.group(1)][first - 1 : last]
+                columns.append([entry[bm.group(2)] for entry in entries])
+            values = [value for row in zip(*columns) for value in row]
+            return self.tsp_numbers(values)
+
+        m = re.fullmatch(r"printnumber\((.*)\)", line)
+        if m:
+            return self.tsp_numbers([float(self.tsp_value(arg)) for arg in m.group(1).split(",")])
+
+        m = re.fullmatch(r"([\w.]+)\s*=\s*(.+)", line)
+        if m:
+            full, value = m.groups()
+            value = self.tsp_value(value)
+            name = self.on_channel(full)
+            if name == "smua.source.func":
+                self.src = "volt" if value == 1 else "curr"
+            elif name in ("smua.source.levelv", "smua.source.leveli"):
+                self.level["volt" if name.endswith("v") else "curr"] = float(value)
+            elif name in ("smua.source.limiti", "smua.source.limitv"):
+                self.prot["curr" if name.endswith("i") else "volt"] = float(value)
+            elif name == "smua.source.output":
+                self.output = value == 1
+            elif name == "smua.measure.count":
+                self.count = int(value)
+            elif name == "smua.measure.interval":
+                self.interval = float(value)
+            elif name == "smua.measure.nplc":
+                self.nplc = float(value)
+            elif name == "smua.measure.filter.count":
+                self.filter_count = int(value)
+            elif name == "smua.measure.filter.enable":
+                self.filter_on = value == 1
+            else:
+                self.settings[full] = value  # a setting we don't simulate
+            return None
+
+        m = re.fullmatch(r"([\w.]+)\((.*)\)", line)
+        if m:
+            name, args = m.groups()
+            name = self.on_channel(name)
+            bm = re.fullmatch(r"(smu[ab]\.nvbuffer[12])\.clear", name)
+            if bm:
+                self.buffers[bm.group(1)].clear()
+            elif name in ("smua.measure.overlappediv", "smua.measure.iv"):
+                ibuf, vbuf = [arg.strip() for arg in args.split(",")]
+                self.tsp_iv(ibuf, vbuf)
+            elif name == "timer.reset":
+                for smu in self.smus.values():
+                    smu.t0 = clock.time()
+            elif name == "reset":
+                self.reset()
+            elif name == "smua.reset":  # just the channel
+                for key, value in self.channel_defaults().items():
+                    setattr(self, key, value)
+            elif name in ("waitcomplete", "errorqueue.clear"):
+                if name == "errorqueue.clear":
+                    self.errors.clear()
+            elif name.removesuffix(".run") in self.tsp_scripts:
+                body = self.tsp_scripts[name.removesuffix(".run")]
+                for function in re.findall(r"^function (\w+)\(", body, flags=re.MULTILINE):
+                    self.tsp_functions[function] = re.sub(r"^cc_(\w+)_[0-9a-f]{8}$", r"\1", function)
+                    self.tsp_channels[function] = "a" if "smua." in body else "b"
+            elif name in self.tsp_functions:
+                ret = self.run_script(self.tsp_functions[name], ast.literal_eval(f"[{args}]".replace("{", "[").replace("}", "]").replace("math.huge", "1e999")), self.tsp_channels[name])
+            else:
+                self.error(-285, f"Program syntax: {line}")
+            return ret
+
+        self.error(-285, f"Program syntax: {line}")
+        return ret
+
+
+class McEmulator(Emulator):
+    """
+    control box (MC) firmware emulator, the telnet command prompt in front of the virtual MC
+    mux selection and stage motion get simulated by FakeMC
+    """
+
+    write_term = "\r\n>>> "  # every reply ends with a fresh prompt
+    error_reply = "ERROR 1"  # what a failed command answers
+
+    def __init__(self, mc: FakeMC | None = None, muxes: list[str] | None = None, lengths: dict[str, float] | None = None, spm: int = 6400, **kwargs):
+        super().__init__(**kwargs)
+        if mc is None:
+            mc = FakeMC(expected_muxes=["A"] if muxes is None else list(muxes))
+            mc.prepare_virt_motion(spm=spm, el={"1": 125.0} if lengths is None else dict(lengths))
+        self.mc = mc
+        self.selected: list[str] = []  # pixel selection commands since the last deselect
+
+    def welcome(self, channel: str) -> str | None:
+        return f"Welcome to the virtual MC{self.write_term}"
+
+    @staticmethod
+    def bits(names: list[str], first: str) -> str:
+        """presence bit field, bit 0 for the first name"""
+        return str(sum(1 << (ord(name) - ord(first)) for name in names))
+
+    def handle(self, frame: str, channel: str = "main") -> str | None:
+        if frame == "v":
+            ret = self.mc.firmware_version
+        elif frame == "c":
+            ret = self.bits(self.mc.detected_muxes, "A")
+        elif frame == "e":
+            ret = self.bits(self.mc.detected_axes, "1")
+        elif frame in ("exit", "reset"):
+            self.selected.clear()
+            ret = None  # the firmware hangs up
+        else:
+            if frame == "s":
+                self.selected.clear()
+            elif frame.startswith("s"):
+                self.selected.append(frame[1:])
+            ret = self.mc.query(frame)
+            if ret is None:
+                ret = ""
+        return ret
+
+    def inject(self, frame: str, channel: str, reply: str | None) -> str | None:
+        return self.error_reply
+
+
+class WavelabsEmulator(Emulator):
+    """
+    Wavelabs LED solar simulator software emulator, WLRC XML over TCP
+    listens like the relay does. for the direct connection case (where the driver listens) use dial()
+    """
+
+    write_term = ""
+    recipes: dict[str, dict[str, str]]  # recipe name --> parameter values
+    error_codes = {"recipe": 2, "command": 1, "injected": 42}  # error codes we answer with
+
+    def __init__(self, recipes: list[str] | None = None, **kwargs):
+        super().__init__(**kwargs)
+        if recipes is None:
+            recipes = ["AM1.5G"]
+        self.recipes = {name: {"Intensity": "100", "Duration": "1000"} for name in recipes}
+        self.active = ""
+        self.run_id = 0
+        self.run_end = 0.0  # when the current run finishes
+        self.led_temps = (25.0, 25.0)  # (vis, ir) [degC]
+
+    def dial(self, host: str, port: int, timeout: float = 10):
+        """connects out to a driver that's listening for the Wavelabs software, in the background"""
+
+        def dialer():
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                try:
+                    conn = socket.create_connection((host, port), timeout=timeout)
+                except OSError:
+                    time.sleep(0.05)
+                else:
+                    conn.settimeout(None)
+                    self.serve(conn, self.channels[0])
+                    break
+            else:
+                self.lg.debug(f"Could not reach {host}:{port}")
+
+        threading.Thread(target=dialer, daemon=True, name=f"{type(self).__name__}-dialer").start()
+
+    def frames(self, data: bytes, channel: str) -> tuple[list[str], bytes]:
+        """every message is one WLRC document, no terminator"""
+        frames = []
+        end = b"</WLRC>"
+        while end in data:
+            frame, _, data = data.partition(end)
+            frames.append((frame + end).decode().strip())
+        return (frames, data)
+
+    @property
+    def running(self) -> bool:
+        return clock.time() < self.run_end
+
+    def spectrum(self) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """a sun-ish (5778K black body) spectrum on a 1nm grid, scaled to the active intensity"""
+        wl = numpy.arange(300.0, 1201.0)  # [nm]
+        h, c, k = (6.62607015e-34, 299792458.0, 1.380649e-23)
+        lam = wl * 1e-9
+        bb = 1 / (lam**5 * (numpy.exp(h * c / (lam * k * 5778)) - 1))
+        irradiance = bb / numpy.sum(bb) * 1000 * float(self.recipes[self.active]["Intensity"]) / 100  # [W/m^2/nm]
+        return (wl, irradiance)
+
+    def reply(self, tag: str, attrib: dict, error: int = 0, message: str = "", children: list[ET.Element] | None = None) -> str:
+        root = ET.Element("WLRC")
+        el = ET.SubElement(root, tag, iSeq=attrib.get("iSeq", "0"), iEC=str(error))
+        if error:
+            el.set("sError", message)
+        for child in children or []:
+            el.append(child)
+        return ET.tostring(root, encoding="unicode")
+
+    def handle(self, frame: str, channel: str = "main") -> str | None:
+        try:
+            [cmd] = list(ET.fromstring(frame))
+        except (ET.ParseError, ValueError):
+            return self.reply("Error", {}, self.error_codes["command"], "Unable to parse message")
+        tag = cmd.tag
+        a = cmd.attrib
+        recipe = a.get("sRecipe", self.active)
+        ret = None
+        if tag == "ActivateRecipe":
+            if recipe in self.recipes:
+                self.active = recipe
+                ret = self.reply(tag, a)
+            else:
+                ret = self.reply(tag, a, self.error_codes["recipe"], f"Recipe {recipe} not found")
+        elif tag in ("GetRecipeParam", "SetRecipeParam"):
+            if recipe not in self.recipes:
+                ret = self.reply(tag, a, self.error_codes["recipe"], f"Recipe {recipe} not found")
+            elif tag == "SetRecipeParam":
+                self.recipes[recipe][a["sParam"]] = a["sVal"]
+                ret = self.reply(tag, a)
+            else:
+                root = ET.fromstring(self.reply(tag, a))
+                root[0].set("sVal", self.recipes[recipe].get(a["sParam"], ""))
+                ret = ET.tostring(root, encoding="unicode")
+        elif tag == "StartRecipe":
+            if self.active == "":
+                ret = self.reply(tag, a, self.error_codes["recipe"], "No recipe activated")
+            else:
+                self.run_id += 1
+                self.run_end = clock.time() + float(self.recipes[self.active]["Duration"]) / 1000
+                root = ET.fromstring(self.reply(tag, a))
+                root[0].set("sRunID", str(self.run_id))
+                ret = ET.tostring(root, encoding="unicode")
+        elif tag in ("CancelRecipe", "StartFreeFloat", "ExitProgram"):
+            self.run_end = 0.0
+            ret = self.reply(tag, a)
+        elif tag == "GetRunStatus":
+            root = ET.fromstring(self.reply(tag, a))
+            root[0].set("sStatus", "Running" if self.running else "Ready")
+            ret = ET.tostring(root, encoding="unicode")
+        elif tag in ("WaitForRunFinished", "WaitForResultAvailable"):
+            wait = min(self.run_end - clock.time(), float(a.get("fTimeout", "10000")) / 1000)
+            if wait > 0:
+                clock.sleep(wait)
+            ret = self.reply(tag, a)
+        elif tag == "GetResult":
+            results = {"Temperature_LedBox_Vis": self.led_temps[0], "Temperature_LedBox_IR": self.led_temps[1]}
+            if self.active:
+                results["totalirradiance_300_1200"] = 10 * float(self.recipes[self.active]["Intensity"])
+            if a.get("sParam") in results:
+                root = ET.fromstring(self.reply(tag, a))
+                root[0].set("sVal", f"{results[a['sParam']]:.3f}")
+                ret = ET.tostring(root, encoding="unicode")
+            else:
+                ret = self.reply(tag, a, self.error_codes["command"], f"Unknown result {a.get('sParam')}")
+        elif tag == "GetDataSeries":
+            if self.active == "":
+                ret = self.reply(tag, a, self.error_codes["recipe"], "No recipe activated")
+            else:
+                children = []
+                for name, unit, values in zip(["Wavelenght", "Irradiance"], ["nm", "W/m^2/nm"], self.spectrum()):  # sic, that's how the software spells it
+                    series = ET.Element("DataSeries", sName=name, sUnit=unit, sType="double")
+                    series.text = ";".join(f"{v:.6g}" for v in values)
+                    children.append(series)
+                ret = self.reply(tag, a, children=children)
+        else:
+            ret = self.reply(tag, a, self.error_codes["command"], f"Unknown command {tag}")
+        return ret
+
+    def inject(self, frame: str, channel: str, reply: str | None) -> str | None:
+        try:
+            [cmd] = list(ET.fromstring(frame))
+        except (ET.ParseError, ValueError):
+            return reply
+        return self.reply(cmd.tag, cmd.attrib, self.error_codes["injected"], "Injected error")
+
+
+class MuxBoard(object):
+    """one Ark Metrica MUX-481-CAN board on the CAN bus"""
+
+    def __init__(self, address: int, serial: int = 0x12345678):
+        self.address = address
+        self.serial = serial
+        self.pins = 0  # bit field of closed relays
+        self.n_switched = 0  # relay set operations
+
+    def handle(self, data: list[int]) -> list[int]:
+        """a CAN data frame's reply"""
+        if not data:
+            return [ord("e"), 1]
+        cmd = chr(data[0])
+        if cmd == "i":
+            ret = list(self.serial.to_bytes(4, "big"))
+        elif cmd == "v":
+            ret = [ord(c) for c in "1.0.0"]
+        elif cmd == "m":
+            ret = [ord(c) for c in "Ark"]
+        elif cmd == "d":
+            ret = [ord(c) for c in "MUX481"]
+        elif cmd in ("n", "f"):
+            if (len(data) != 2) or (data[1] > 31):
+                ret = [ord("e"), 2]
+            else:
+                if cmd == "n":
+                    self.pins |= 1 << data[1]
+                else:
+                    self.pins &= ~(1 << data[1])
+                self.n_switched += 1
+                ret = data
+        elif cmd == "s":
+            if len(data) != 5:
+                ret = [ord("e"), 3]
+            else:
+                self.pins = int.from_bytes(bytes(data[1:]), "big")
+                self.n_switched += 1
+                ret = data
+        elif cmd == "g":
+            ret = list(self.pins.to_bytes(4, "big"))
+        else:
+            ret = [ord("e"), 1]
+        return ret
+
+
+class I7540dEmulator(Emulator):
+    """
+    I-7540D CAN bus-ethernet gateway emulator with MUX-481-CAN boards on its bus
+    frames go in and come back in the gateway's ASCII format on the "can" port, the gateway's own settings live on the "device" port
+    a lost frame doesn't get acknowledged on the bus, so it counts as a transmit error. injected errors count as receive errors
+    a reboot clears the error counters but (unlike the real thing) leaves connections up, clients cycle theirs anyway
+    """
+
+    channels = ("can", "device")
+    write_term = "\r"
+    status_fmt = "!{baud:X}{reg:02X}{tx:02X}{rx:02X}{fifo:X}"
+
+    def __init__(self, muxes: list[str] | None = None, **kwargs):
+        super().__init__(**kwargs)
+        if muxes is None:
+            muxes = ["A"]
+        self.boards = {ord(slot) - ord("A") + 1: MuxBoard(ord(slot) - ord("A") + 1) for slot in muxes}
+        self.baud = 4  # 125k
+        self.config = "14" + "04" + "00000000" + "FFFFFFFF" + "0" + "0"  # spec, baud, acceptance code and mask, error and timestamp responses
+        self.tx_errors = 0
+        self.rx_errors = 0
+        self.n_reboots = 0
+
+    def frames(self, data: bytes, channel: str) -> tuple[list[str], bytes]:
+        if channel == "device":  # these commands come unterminated, one per packet
+            frames = [data.decode(errors="replace").strip()]
+            rest = b""
+        else:
+            frames, rest = super().frames(data, channel)
+        return (frames, rest)
+
+    def handle(self, frame: str, channel: str = "main") -> str | None:
+        if channel == "device":
+            ret = self.device(frame)
+        else:
+            ret = self.can(frame)
+        return ret
+
+    def device(self, cmd: str) -> str | None:
+        ret = None
+        if not cmd.startswith("99"):
+            return None
+        cmd = cmd[2:]
+        if cmd == "S":
+            ret = self.status_fmt.format(baud=self.baud, reg=0, tx=min(self.tx_errors, 255), rx=min(self.rx_errors, 255), fifo=0)
+        elif cmd in ("C", "CRA"):
+            self.tx_errors = 0
+            self.rx_errors = 0
+        elif cmd == "RA":
+            self.n_reboots += 1
+            self.tx_errors = 0
+            self.rx_errors = 0
+        elif cmd == "#P1":
+            ret = self.config
+        elif cmd.startswith("$P1"):
+            self.config = cmd[3:]
+            self.baud = int(self.config[3], 16)
+            ret = "OK"
+        return ret
+
+    def can(self, frame: str) -> str | None:
+        if not frame.startswith("t"):
+            return "?1"
+        try:
+            identifier = int(frame[1:4], 16)
+            dlc = int(frame[4], 16)
+        except (ValueError, IndexError):
+            return "?3"
+        if (dlc > 8) or (len(frame) != 5 + 2 * dlc):
+            return "?2"
+        data = [int(frame[5 + 2 * i : 7 + 2 * i], 16) for i in range(dlc)]
+        if identifier not in self.boards:
+            self.tx_errors += 1  # nobody acknowledged it
+            return None
+        reply = self.boards[identifier].handle(data)
+        return f"t{identifier:03x}{len(reply)}" + "".join(f"{b:02x}" for b in reply)
+
+    def dropped(self, frame: str, channel: str):
+        self.tx_errors += 1
+
+    def inject(self, frame: str, channel: str, reply: str | None) -> str | None:
+        self.rx_errors += 1
+        return reply
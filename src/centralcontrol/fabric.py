@@ -20,6 +20,7 @@ from typing import cast
 from contextlib import contextmanager
 from logging import Logger
 from multiprocessing.queues import SimpleQueue as mQueue
+from multiprocessing.synchronize import Event as mEvent
 from queue import SimpleQueue as Queue
 
 import humanize
@@ -34,6 +35,7 @@ import redis
 
 from centralcontrol.mux481can import Mux481can
 from centralcontrol import virt
+from centralcontrol import clock
 from centralcontrol.illumination import LightAPI
 from centralcontrol.illumination import factory as ill_fac
 from centralcontrol.logstuff import get_logger
@@ -44,6 +46,8 @@ from centralcontrol.mqtt import MQTTClient
 from centralcontrol.sourcemeter import SourcemeterAPI
 from centralcontrol.sourcemeter import factory as smu_fac
 from centralcontrol.dblink import DBLink
+from centralcontrol.station import Station
+from centralcontrol.station import StationQueue
 from centralcontrol import __version__ as backend_ver
 from centralcontrol.datalogger import DataLogger
 
@@ -95,14 +99,15 @@ class Fabric(object):
     mem_db_url: str = "redis://"
 
     # process killer signal
-    pkiller = multiprocessing.Event()  # this is a mutable class attribute. it's global.
+    # this is a mutable class attribute. it's global (per process). a station's worker process swaps in its own, see attach_station()
+    pkiller = multiprocessing.Event()
 
     # bad connections ask blocker
-    bc_response = multiprocessing.Event()  # this is a mutable class attribute. it's global.
+    bc_response = multiprocessing.Event()  # this is a mutable class attribute. it's global (per process).
 
     # special message output queue so that messages can be sent from other processes
     # poutq = multiprocessing.SimpleQueue()
-    outq: mQueue = multiprocessing.SimpleQueue()  # this is a mutable class attribute. it's global.
+    outq: mQueue | StationQueue = multiprocessing.SimpleQueue()  # this is a mutable class attribute. it's global (per process).
 
     # mqtt connection details
     mqtt_host:None|str = None
@@ -114,15 +119,41 @@ class Fabric(object):
 
     exitcode: int = 0
 
-    def __init__(self, mem_db_url: str | None = None):
+    # the measurement setups this backend drives, by name
+    stations: dict[str, Station]
+
+    svoc_step_threshold = 2  # must request at least this many suns-Voc steps before the measurement turns on
+    t_light_change = 2.0  # [s] about how long a light change takes, for estimates before the light has timed one of its own
+
+    def __init__(self, mem_db_url: str | None = None, stations: list[str] | None = None):
         self.workers = []
         if mem_db_url:
             self.mem_db_url = mem_db_url
 
         self.lg = get_logger(".".join([__name__, type(self).__name__]))  # setup logging
 
+        # with no named stations we're a single, unnamed (legacy topic namespace) station
+        if not stations:
+            stations = [""]
+        self.stations = {name: Station(name) for name in stations}
+
         self.lg.debug("Initialized.")
 
+    def __getstate__(self) -> dict:
+        """the station bookkeeping stays behind in the main process when we get sent to a worker"""
+        state = self.__dict__.copy()
+        state.pop("stations", None)
+        return state
+
+    @staticmethod
+    def attach_station(pkiller: mEvent, bc_response: mEvent, prefix: str):
+        """worker process initializer. makes the process-global signals and output topics belong to one station"""
+        Fabric.pkiller = pkiller
+        Fabric.bc_response = bc_response
+        if prefix:
+            Fabric.outq = StationQueue(Fabric.outq, prefix)
+            MQTTClient.log_topic = f"{prefix}{MQTTClient.log_topic}"
+
     def do_cleanup_stuff(self, inq: Queue, dbl: DBLink, signal: signal.Signals):
         if self.lg:
             self.lg.debug(f"We caught a {signal.name}. Handling...")
@@ -147,11 +178,13 @@ class Fabric(object):
             comms_args["port"] = self.mqtt_port
             comms_args["parent_outq"] = self.outq
             comms_args["parent_inq"] = inq
+            comms_args["status_topics"] = [station.topic("measurement/status") for station in self.stations.values()]
         assert commcls is not None, f"{commcls=}"
         assert comms_args is not None, f"{comms_args=}"
         with commcls(**comms_args):  # for mqtt comms
             with redis.Redis.from_url(self.mem_db_url) as r:
                 with DBLink(r, inq, self.lg) as dbl:  # manager for the mem-db inq listener
+                    dbl.listen_streams = [station.runs_stream for station in self.stations.values()]
                     # handle SIGTERM and SIGINT gracefully by asking the runners to clean themselves up
                     signal.signal(signal.SIGTERM, lambda _, __: self.do_cleanup_stuff(inq, dbl, signal.SIGTERM))
                     signal.signal(signal.SIGINT, lambda _, __: self.do_cleanup_stuff(inq, dbl, signal.SIGINT))
@@ -169,25 +202,28 @@ class Fabric(object):
         self.lg.debug("Graceful exit achieved")
         return self.exitcode
 
-    def on_future_done(self, future: concurrent.futures.Future):
+    def on_future_done(self, future: concurrent.futures.Future, station: Station):
         """callback for when the future's execution has concluded"""
-        self.pkiller.clear()  # unset the process killer signal since it just ended
-        self.bc_response.clear()  # make sure this is reset too
+        station.pkiller.clear()  # unset the process killer signal since it just ended
+        station.bc_response.clear()  # make sure this is reset too
         future_exception = future.exception()  # check if the process died because of an exception
         if future_exception:
             self.lg.error(f"Process failed: {repr(future_exception)}")
             # log the exception's whole call stack for debugging
             tb = traceback.TracebackException.from_exception(future_exception)
             self.lg.debug("".join(tb.format()))
-        self.outq.put({"topic": "measurement/status", "payload": json.dumps("Ready"), "qos": 2, "retain": True})
+        self.outq.put({"topic": station.topic("measurement/status"), "payload": json.dumps("Ready"), "qos": 2, "retain": True})
 
     def msg_handler(self, inq: Queue[list | str | MQTTMessage]):
         """handle new messages as they come in from comms, the main program loop lives here"""
-        future = None  # represents a long-running task
         # decode_topics = ["measurement/run", "util"]  # messages posted to these channels need their payloads decoded
-        with concurrent.futures.ProcessPoolExecutor(max_workers=1) as exicuter:
+        with contextlib.ExitStack() as stack:
+            # every station gets its own worker process so that their failures are isolated
+            for station in self.stations.values():
+                station.executor = stack.enter_context(concurrent.futures.ProcessPoolExecutor(max_workers=1, initializer=Fabric.attach_station, initargs=(station.pkiller, station.bc_response, station.prefix)))
             try:  # this try/except block is for catching keyboard interrupts and then asking the main loop to break
                 while True:  # main program loop
+                    station = None  # the station the current message is for
                     try:  # this high level try/except block lets the main loop keep running through programming errors
                         msg = inq.get()  # mostly execution sits right here waiting to be told what to do
                         if isinstance(msg, str):
@@ -199,8 +235,19 @@ class Fabric(object):
                                 channel = topic.split("/")
                                 rootchan = channel.pop(0)
 
+                                # find out which station this is for
+                                if (rootchan == "station") and (len(channel) > 1):
+                                    station_name = channel.pop(0)
+                                    rootchan = channel.pop(0)
+                                else:
+                                    station_name = ""
+                                station = self.stations.get(station_name)
+                                if station is None:
+                                    self.lg.debug(f"Ignoring message for unknown station: {topic}")
+                                    continue
+
                                 # unpack json payloads
-                                if (topic == "measurement/run") or (rootchan == "cmd"):
+                                if ((rootchan == "measurement") and (channel == ["run"])) or (rootchan == "cmd"):
                                     request = json.loads(msg.payload.decode())
                                 else:
                                     request = None
@@ -211,10 +258,10 @@ class Fabric(object):
                                         self.lg.debug("Ending because of quit message")
                                         break
                                     elif channel == ["stop"]:
-                                        self.stop_process(future)
+                                        self.stop_process(station)
                                     elif channel == ["run"]:
                                         pass  # handled by memdb
-                                        # future = self.submit_for_execution(exicuter, future, self.do_run, request)
+                                        # self.submit_for_execution(station, self.do_run, request)
                                 elif rootchan == "cmd":
                                     if channel == ["util"]:  # previously utility handler territory
                                         assert request is not None, f"{request is not None=}"
@@ -222,16 +269,18 @@ class Fabric(object):
                                             if request["cmd"] == "estop":
                                                 self.estop(request)  # this gets done now instead of being done in a new process
                                             else:
-                                                future = self.submit_for_execution(exicuter, future, self.utility_handler, request)
+                                                self.submit_for_execution(station, self.utility_handler, request)
                                         elif request == "unblock":
-                                            self.bc_response.set()  # unblock waiting for a response from the frontend
+                                            station.bc_response.set()  # unblock waiting for a response from the frontend
                         elif isinstance(msg, tuple) and len(msg) == 3:  # from memdb
                             channel, stream_id, payload = msg
-                            if channel == b"runs":
+                            stations = [x for x in self.stations.values() if x.runs_stream.encode() == channel]
+                            if stations:
+                                station = stations[0]
                                 rid = stream_id
                                 self.lg.debug(f"Got new run start with id: {rid.decode()}")
-                                if (future == None) or future.done():  # TODO: figure out why we can get two runs at once
-                                    future = self.submit_for_execution(exicuter, future, self.do_run, {"runid": rid} | json.loads(payload[b"json"]))
+                                if not station.busy:  # TODO: figure out why we can get two runs at once
+                                    self.submit_for_execution(station, self.do_run, {"runid": rid} | json.loads(payload[b"json"]))
                                 else:
                                     self.lg.debug(f"Run start ignored.")
 
@@ -245,14 +294,16 @@ class Fabric(object):
                         self.lg.debug("".join(tb.format()))
 
                         # tell the front end we're ready again after the crash
-                        self.outq.put({"topic": "measurement/status", "payload": json.dumps("Ready"), "qos": 2, "retain": True})
+                        if station is not None:
+                            self.outq.put({"topic": station.topic("measurement/status"), "payload": json.dumps("Ready"), "qos": 2, "retain": True})
             except KeyboardInterrupt:
                 self.lg.debug("Ending gracefully because of SIGINT-like signal")
                 inq.put("die")  # ask the main loop to break
 
             # the main program loop as exited, clean things up
             self.outq.put("die")  # end the output queuq handler
-            self.stop_process(future)
+            for station in self.stations.values():
+                self.stop_process(station)
         self.lg.debug("Message handler stopped")
 
     def utility_handler(self, task: dict):
@@ -688,17 +739,16 @@ class Fabric(object):
         pos = mo.get_position()
         self.outq.put({"topic": "status", "payload": json.dumps({"pos": pos}), "qos": 2})
 
-    def submit_for_execution(self, exicuter: concurrent.futures.Executor, future_past: None | concurrent.futures.Future, callabale: typing.Callable, /, *args, **kwargs) -> concurrent.futures.Future:
-        """submits a task for execution by an executor, sets up a callback for when it's done and updates status for front end"""
-        if future_past and future_past.running():
+    def submit_for_execution(self, station: Station, callabale: typing.Callable, /, *args, **kwargs) -> concurrent.futures.Future | None:
+        """submits a task for execution by a station's worker, sets up a callback for when it's done and updates status for front end"""
+        if station.busy:
             self.lg.warning("Request denied. The backend is currently busy.")
-            ret = future_past
         else:
-            future = exicuter.submit(self.future_wrapper, callabale, *args, **kwargs)
-            future.add_done_callback(self.on_future_done)
-            self.outq.put({"topic": "measurement/status", "payload": json.dumps("Busy"), "qos": 2, "retain": True})
-            ret = future
-        return ret
+            assert station.executor is not None, "The station has no worker"
+            station.future = station.executor.submit(self.future_wrapper, callabale, *args, **kwargs)
+            station.future.add_done_callback(lambda future: self.on_future_done(future, station))
+            self.outq.put({"topic": station.topic("measurement/status"), "payload": json.dumps("Busy"), "qos": 2, "retain": True})
+        return station.future
 
     def future_wrapper(self, callable: typing.Callable, /, *args, **kwargs) -> typing.Any:
         """wraps a function call that will be scheduled for execution"""
@@ -708,14 +758,15 @@ class Fabric(object):
         signal.signal(signal.SIGINT, lambda _, __: self.pkiller.set())
         return callable(*args, **kwargs)
 
-    def stop_process(self, future: concurrent.futures.Future | None):
-        """Abort the running process with increasing meanness until success"""
+    def stop_process(self, station: Station):
+        """Abort a station's running process with increasing meanness until success"""
         self.lg.debug("Stopping process")
 
+        future = station.future
         if isinstance(future, concurrent.futures.Future) and future.running():
             self.lg.debug("Setting process killer")
-            self.bc_response.set()  # unblock if we're waiting for a bad connection response
-            self.pkiller.set()  # ask extremely nicely for the process to come to conclusion
+            station.bc_response.set()  # unblock if we're waiting for a bad connection response
+            station.pkiller.set()  # ask extremely nicely for the process to come to conclusion
             concurrent.futures.wait([future], timeout=10)
             if not future.running():
                 self.lg.log(29, "Request to stop completed!")
@@ -950,6 +1001,18 @@ class Fabric(object):
                 # user registration TODO: consider moving this kind of thing to the frontend
                 uid = db.xadd("users", fields={"str": args["user_name"]}, maxlen=100, approximate=True).decode()
 
+                # run the clock faster than real time when there's no real hardware to wait for
+                if ("simulation" in config) and ("speed" in config["simulation"]) and (config["simulation"]["speed"] != 1):
+                    all_virtual = fake_mc and fake_mux and fake_mo
+                    all_virtual = all_virtual and all([("virtual" not in smucfg) or (smucfg["virtual"] == True) for smucfg in smucfgs])
+                    all_virtual = all_virtual and ("virtual" in sscfg) and (sscfg["virtual"] == True)
+                    if all_virtual:
+                        speed = float(config["simulation"]["speed"])
+                        stack.enter_context(clock.using(clock.VirtualClock(speed)))
+                        self.lg.log(29, f"Simulating with the clock running at {speed}x real time")
+                    else:
+                        self.lg.warning("Simulation speed setting ignored because not all of the hardware is virtual")
+
                 mux = stack.enter_context(ThisMux(**mux_args))  # init and connect mux
                 mux.enabled = mux_enabled
                 if mux.enabled:
@@ -1114,10 +1177,43 @@ class Fabric(object):
 
                     remaining = p_total  # number of steps in the routine that still need to be done
                     n_done = 0  # number of steps in the routine that we've completed so far
-                    t0 = time.time()  # run start time snapshot
+                    t0 = clock.time()  # run start time snapshot
+                    t_step = max([Fabric.estimate_step_time(args, sweeps, sm) for sm in smus], default=0.0)  # what a step should take, till we've timed some
+
+                    # per-smu queue scheduling lets each smu move on to its next device as soon as it's free
+                    work_stealing = ("work_stealing" in args) and (args["work_stealing"] == True)
+                    if ("turbo_mode" in args) and (args["turbo_mode"] == False):
+                        work_stealing = False  # the user wants one device at a time
+                    if work_stealing and (not Fabric.independent_slots(run_queue)):
+                        self.lg.debug("Slots are shared between SMUs so they can't be selected independently. Using lockstep scheduling.")
+                        work_stealing = False
+
+                    # reorder the phases of each step's devices so the light gets switched as few times as possible
+                    minimize_light_changes = ("minimize_light_changes" in args) and (args["minimize_light_changes"] == True)
+                    plans: dict[tuple, list[tuple[str, dict | None]]] = {}  # mux_sel --> the phase plan for that device in the step being measured (the default order for ones not in here)
+                    n_planned_total = 0  # light changes the phase plans need
+                    n_default_total = 0  # light changes the default order would have needed
+
+                    def device_job(device_dict: dict) -> list:
+                        """measures one (already selected) device with the smu that owns it"""
+                        this_smu = smus[device_dict["smui"]]
+                        this_mppt = mppts[device_dict["smui"]]
+
+                        # setup data handler for this device
+                        dh = DataHandler(pixel=device_dict, outq=self.outq)
+
+                        # set virtual smu scaling (just so it knows how much current to produce)
+                        if isinstance(this_smu, virt.FakeSMU):
+                            this_smu.area = device_dict["area"]
+                            this_smu.dark_area = device_dict["dark_area"]
+                            this_smu.pixel = f'{device_dict["slot"]}{device_dict["pad"]}'  # picks the device from the population (if simulating one)
+
+                        return self.device_routine(rid, ss, this_smu, this_mppt, dh, args, config, sweeps, device_dict, suid, plans.get(tuple(device_dict["mux_sel"])))
 
                     if run_queue:
                         n_parallel = len(run_queue[0])
+                        if work_stealing:
+                            n_parallel = max(n_parallel, len(set(dd["smui"] for group in run_queue for dd in group)))
 
                         if dler is not None:
                             # add one thread for the datalogger
@@ -1137,11 +1233,22 @@ class Fabric(object):
                             # main run device measurement loop
                             while (remaining > 0) and (not self.pkiller.is_set()):
                                 group = run_queue.pop(0)  # pop off the queue item that we'll be working on in this loop
-
-                                dt = time.time() - t0  # seconds since run start
-                                if (n_done > 0) and (args["cycles"] != 0):
-                                    tpp = dt / n_done  # average time per step
-                                    finishtime = time.time() + tpp * remaining
+                                n_groups = 1  # how many run queue items this step covers
+
+                                if work_stealing:
+                                    # pull in the following groups that can be measured without moving the stage
+                                    center = lambda g: np.array([device_dict["pos"] for device_dict in g], dtype=float).mean(0)
+                                    while run_queue and ((not mo.enabled) or np.array_equal(center(run_queue[0]), center(group), equal_nan=True)):
+                                        group = group + run_queue.pop(0)
+                                        n_groups += 1
+
+                                dt = clock.time() - t0  # seconds since run start
+                                if ((n_done > 0) or (t_step > 0)) and (args["cycles"] != 0):
+                                    if n_done > 0:
+                                        tpp = dt / n_done  # average time per step
+                                    else:
+                                        tpp = t_step  # nothing's been timed yet, go by the routine
+                                    finishtime = clock.time() + tpp * remaining
                                     finish_str = datetime.datetime.fromtimestamp(finishtime).strftime("%I:%M%p")
                                     human_str = humanize.naturaltime(datetime.datetime.fromtimestamp(finishtime))
                                     fraction = n_done / p_total
@@ -1175,47 +1282,28 @@ class Fabric(object):
                                             ss.apply_intensity(0)
                                     mo.goto(there)  # command the stage
 
-                                # select pixel(s)
-                                pix_selections = [device_dict["mux_sel"] for device_dict in group]
-                                pix_deselections = [(slot, 0) for slot, pad in pix_selections]
-                                Fabric.select_pixel(mc, mux_sels=pix_selections)
-
-                                # reset futures list for new round of parallel measurements
-                                futures: list[concurrent.futures.Future] = []
-
-                                for device_dict in group:
-                                    this_smu = smus[device_dict["smui"]]
-                                    this_mppt = mppts[device_dict["smui"]]
-
-                                    # setup data handler for this device
-                                    dh = DataHandler(pixel=device_dict, outq=self.outq)
-
-                                    # set virtual smu scaling (just so it knows how much current to produce)
-                                    if isinstance(this_smu, virt.FakeSMU):
-                                        this_smu.area = device_dict["area"]
-                                        this_smu.dark_area = device_dict["dark_area"]
-
-                                    # submit device routines for processing
-                                    futures.append(executor.submit(self.device_routine, rid, ss, this_smu, this_mppt, dh, args, config, sweeps, device_dict, suid))
-                                    futures[-1].add_done_callback(self.on_routine_done)
-
-                                # wait for the device routine futures to come back
-                                max_future_time = None  # TODO: try to calculate an upper limit for this
-                                (done, not_done) = concurrent.futures.wait(futures, timeout=max_future_time)  # here is where we wait for one step in the run to complete
-
-                                for futrue in not_done:
-                                    self.lg.warning(f"{repr(futrue)} didn't finish in time!")
-                                    if not futrue.cancel():
-                                        self.lg.warning("and we couldn't cancel it.")
-
-                                # deselect what we had just selected
-                                Fabric.select_pixel(mc, mux_sels=pix_deselections)
-
-                                # turn off the SMUs
-                                for sm in smus:
-                                    sm.outOn(False)
+                                if minimize_light_changes:
+                                    # each smu goes through its devices in the group one after the other (just the one when in lockstep)
+                                    # and they share the light, so the nth device of every smu gets the nth plan of a sequence
+                                    places = {}  # mux_sel --> where the device comes in its smu's run through the group
+                                    n_seen = collections.Counter()
+                                    for device_dict in group:
+                                        places[tuple(device_dict["mux_sel"])] = n_seen[device_dict["smui"]]
+                                        n_seen[device_dict["smui"]] += 1
+                                    sequence = Fabric.plan_sequence(args, sweeps, max(n_seen.values()), lit=ss.lit)
+                                    plans = {mux_sel: sequence[place] for mux_sel, place in places.items()}
+                                    n_planned = Fabric.count_sequence_changes(sequence, args, ss.lit)
+                                    n_default = Fabric.count_sequence_changes([Fabric.plan_phases(args, sweeps)] * len(sequence), args, ss.lit)
+                                    n_planned_total += n_planned
+                                    n_default_total += n_default
+                                    self.lg.debug(f"Phase plans for this step: {[[phase for phase, sweep in plan] for plan in sequence]} need {n_planned} light change(s) (vs. {n_default} by default)")
+
+                                if work_stealing:
+                                    self.per_smu_step(executor, group, smus, mc, ss, device_job)
+                                else:
+                                    self.lockstep_step(executor, group, smus, mc, device_job)
 
-                                n_done += 1
+                                n_done += n_groups
                                 remaining = len(run_queue)
 
                                 if (remaining == 0) and (args["cycles"] == 0):
@@ -1223,15 +1311,110 @@ class Fabric(object):
                                     run_queue = start_q.copy()
                                     remaining = len(run_queue)
 
+                            if minimize_light_changes:
+                                n_saved = n_default_total - n_planned_total
+                                t_change = ss.change_time / ss.n_changes if ss.n_changes else Fabric.t_light_change  # per light change, as timed by the light when it can
+                                self.lg.log(29, f"Phase planning needed {n_planned_total} light change(s) instead of {n_default_total}, saving about {n_saved * t_change:.1f} s")
+
                             # use pkiller to ask the datalogger to stop if we're datalogging
                             if isinstance(dl_future, concurrent.futures.Future):
                                 self.pkiller.set()
                                 concurrent.futures.wait((dl_future,), timeout=10)
 
+    def lockstep_step(self, executor: concurrent.futures.Executor, group: list[dict], smus: list[SourcemeterAPI], mc: MC | virt.FakeMC, job: typing.Callable[[dict], list]) -> None:
+        """measures a group by selecting all its devices at once then waiting for every one of them to finish"""
+        # select pixel(s)
+        pix_selections = [device_dict["mux_sel"] for device_dict in group]
+        pix_deselections = [(slot, 0) for slot, pad in pix_selections]
+        Fabric.select_pixel(mc, mux_sels=pix_selections)
+
+        # reset futures list for new round of parallel measurements
+        futures: list[concurrent.futures.Future] = []
+
+        for device_dict in group:
+            # submit device routines for processing
+            futures.append(executor.submit(job, device_dict))
+            futures[-1].add_done_callback(self.on_routine_done)
+
+        # wait for the device routine futures to come back
+        max_future_time = None  # TODO: try to calculate an upper limit for this
+        (done, not_done) = concurrent.futures.wait(futures, timeout=max_future_time)  # here is where we wait for one step in the run to complete
+
+        for futrue in not_done:
+            self.lg.warning(f"{repr(futrue)} didn't finish in time!")
+            if not futrue.cancel():
+                self.lg.warning("and we couldn't cancel it.")
+
+        # deselect what we had just selected
+        Fabric.select_pixel(mc, mux_sels=pix_deselections)
+
+        # turn off the SMUs
+        for sm in smus:
+            sm.outOn(False)
+
+    def per_smu_step(self, executor: concurrent.futures.Executor, group: list[dict], smus: list[SourcemeterAPI], mc: MC | virt.FakeMC, ss: LightAPI, job: typing.Callable[[dict], list]) -> None:
+        """
+        measures a group by giving each smu its own queue of devices to work through.
+        an smu moves on to its next device as soon as it's free instead of waiting for the slowest smu in the group.
+        the light (via its sync barrier) is the only thing the smus coordinate on. requires that no mux slot is shared between smus.
+        """
+        queues: dict[int, collections.deque[dict]] = {}
+        for device_dict in group:
+            queues.setdefault(device_dict["smui"], collections.deque()).append(device_dict)
+
+        mux_lock = threading.Lock()  # the mux comms are not thread safe
+
+        def smu_worker(queue: collections.deque[dict]) -> list:
+            """works through one smu's device queue"""
+            data = []
+            try:
+                while queue and (not self.pkiller.is_set()):
+                    device_dict = queue.popleft()
+                    slot = device_dict["mux_sel"][0]
+                    with mux_lock:
+                        Fabric.select_pixel(mc, mux_sels=[device_dict["mux_sel"]])
+                    try:
+                        data += job(device_dict)
+                    except Exception:
+                        self.lg.exception(f"Measuring the device at {device_dict['mux_sel']} failed, moving on to the next one")  # like the lockstep path, only lose the device that failed
+                        continue
+                    finally:
+                        with mux_lock:
+                            Fabric.select_pixel(mc, mux_sels=[(slot, 0)])
+            finally:
+                ss.leave_sync()  # don't hold up the light for the smus that still have work to do
+            return data
+
+        # an smu might legitimately wait out another's entire mppt for a light change here
+        ss.barrier_timeout = None
+        ss.n_sync = len(queues)
+        try:
+            futures = [executor.submit(smu_worker, queue) for queue in queues.values()]
+            for future in futures:
+                future.add_done_callback(self.on_routine_done)
+            concurrent.futures.wait(futures)
+        finally:
+            ss.barrier_timeout = LightAPI.barrier_timeout
+
+        # turn off the SMUs
+        for sm in smus:
+            sm.outOn(False)
+
+    @staticmethod
+    def independent_slots(run_queue: list[list[dict]]) -> bool:
+        """checks that no mux slot is shared between smus so that each smu can (de)select its devices without disturbing the others"""
+        owners = {}
+        for group in run_queue:
+            for device_dict in group:
+                slot = device_dict["mux_sel"][0]
+                if owners.setdefault(slot, device_dict["smui"]) != device_dict["smui"]:
+                    return False
+        return True
+
     def datalogger_routine(self, dler:DataLogger, dh:DataHandler):
         """runs the data logging tasks"""
         self.lg.debug("Starting the Datalogger routine")
-        s = sched.scheduler(time.time, time.sleep)
+        s = sched.scheduler(clock.time, clock.sleep)
 
         class Rescheduler(typing.TypedDict):
             sc: sched.scheduler
@@ -1240,7 +1423,7 @@ class Fabric(object):
 
         def dlrunner(dler:DataLogger, ai:DataLogger.AnalogInput, t0:float, dh:DataHandler, rs:None|Rescheduler=None):
             """runs a data logging event then reschedules it"""
-            dt = time.time() - t0
+            dt = clock.time() - t0
             val = dler.read_chan(ai)  # make reading
             self.lg.debug(f"CH{ai['num']} ({ai['name']}): {val} {ai['unit']} @ {dt=}s")
             if val is not None:
@@ -1250,7 +1433,7 @@ class Fabric(object):
                 # reschedule this
                 rs["sc"].enter(rs["delay"], 1, rs["action"], argument=(dler, ai, t0, dh, rs))
 
-        t0 = time.time()
+        t0 = clock.time()
 
         for ai_chan in dler.analog_inputs:
             if ai_chan["enabled"]:
@@ -1264,7 +1447,7 @@ class Fabric(object):
         finished = self.pkiller.is_set()
         while not finished:
             deadline = s.run(blocking=False)
-            finished = self.pkiller.wait(deadline)
+            finished = clock.wait(self.pkiller, deadline)
 
         self.lg.debug("Datalogger routine has finished")
 
@@ -1277,7 +1460,7 @@ class Fabric(object):
             tb = traceback.TracebackException.from_exception(future_exception)
             self.lg.debug("".join(tb.format()))
 
-    def device_routine(self, rid: int, ss: LightAPI, sm: SourcemeterAPI, mppt: MPPT, dh: DataHandler, args: dict, config: dict, sweeps: list, pix: dict, suid: int):
+    def device_routine(self, rid: int, ss: LightAPI, sm: SourcemeterAPI, mppt: MPPT, dh: DataHandler, args: dict, config: dict, sweeps: list, pix: dict, suid: int, plan: list[tuple[str, dict | None]] | None = None):
         """
         parallelizable. this contains the logic for what a single device experiences during the measurement routine.
         several of these can get scheduled to run concurrently if there are enough SMUs for that.
@@ -1288,313 +1471,418 @@ class Fabric(object):
         with redis.Redis.from_url(self.mem_db_url) as db:
             dbl = DBLink(db)
             ecs = dbl.counter_sequence()  # experiment counter sequence generator to keep track of the order in which things were done here
-            # "Voc" if
-            if (args["i_dwell"] > 0) and args["i_dwell_check"]:
-                if self.pkiller.is_set():
-                    self.lg.debug("Killed by killer.")
-                    return []
-
-                ss_args = {}
-                ss_args["sourceVoltage"] = False
-                ss_args["compliance"] = sm.voltage_limit
-                ss_args["setPoint"] = args["i_dwell_value"]
-                # NOTE: "a" (auto range) can possibly cause unknown delays between points
-                # but that's okay here because timing between points isn't
-                # super important with steady state measurements
-                ss_args["senseRange"] = "a"
-                sm.setupDC(**ss_args)  # type: ignore # initialize the SMU hardware for a steady state measurement
-
-                svoc_steps = int(abs(args["suns_voc"]))  # number of suns-Voc steps we might take
-                svoc_step_threshold = 2  # must request at least this many steps before the measurement turns on
-                if svoc_steps > svoc_step_threshold:  # suns-Voc is enabled (either up or down)
-                    int_min = 10  # minimum settable intensity
-                    int_max = args["light_recipe_int"]  # the highest intensity we'll go to
-                    int_rng = int_max - int_min  # the magnitude of the range we'll sweep over
-                    int_step_size = int_rng / (svoc_steps - 2)  # how big the intensity steps will be
-                    intensities = [0, 10]  # values for the first two intensity steps
-                    intensities += [round(int_min + (x + 1) * int_step_size) for x in range(svoc_steps - 2)]  # values for the rest of the intensity steps
-                else:
-                    intensities = []
-
-                if args["suns_voc"] < -svoc_step_threshold:  # suns-voc is up
-                    self.lg.debug(f"Doing upwards suns-Voc for {args['i_dwell']} seconds.")
+            if plan is None:
+                plan = Fabric.plan_phases(args, sweeps)  # the default phase order
+            ssvoc = None  # steady state Voc estimate
+            for phase, sweep in plan:
+                # "Voc"
+                if phase == "voc":
+                    if self.pkiller.is_set():
+                        self.lg.debug("Killed by killer.")
+                        return data
+
+                    ss_args = {}
+                    ss_args["sourceVoltage"] = False
+                    ss_args["compliance"] = sm.voltage_limit
+                    ss_args["setPoint"] = args["i_dwell_value"]
+                    # NOTE: "a" (auto range) can possibly cause unknown delays between points
+                    # but that's okay here because timing between points isn't
+                    # super important with steady state measurements
+                    ss_args["senseRange"] = "a"
+                    sm.setupDC(**ss_args)  # type: ignore # initialize the SMU hardware for a steady state measurement
+
+                    svoc_steps = int(abs(args["suns_voc"]))  # number of suns-Voc steps we might take
+                    svoc_step_threshold = self.svoc_step_threshold
+                    if svoc_steps > svoc_step_threshold:  # suns-Voc is enabled (either up or down)
+                        int_min = 10  # minimum settable intensity
+                        int_max = args["light_recipe_int"]  # the highest intensity we'll go to
+                        int_rng = int_max - int_min  # the magnitude of the range we'll sweep over
+                        int_step_size = int_rng / (svoc_steps - 2)  # how big the intensity steps will be
+                        intensities = [0, 10]  # values for the first two intensity steps
+                        intensities += [round(int_min + (x + 1) * int_step_size) for x in range(svoc_steps - 2)]  # values for the rest of the intensity steps
+                    else:
+                        intensities = []
+
+                    if args["suns_voc"] < -svoc_step_threshold:  # suns-voc is up
+                        self.lg.debug(f"Doing upwards suns-Voc for {args['i_dwell']} seconds.")
+                        dh.kind = "vt_measurement"
+                        self.clear_plot("vt_measurement")
+
+                        # db prep
+                        isweep_event = {}
+                        isweep_event["run_id"] = rid
+                        isweep_event["ecs"] = next(ecs)
+                        isweep_event["device_id"] = pix["did"]
+                        isweep_event["fixed"] = en.Fixed.CURRENT
+                        isweep_event["setpoint"] = args["i_dwell_value"]
+                        isweep_event["isetpoints"] = intensities
+                        isweep_event["effective_area"] = pix["area"]
+                        isweepeid = db.xadd("tbl_event:isweep", fields={"json": json.dumps(isweep_event)}, maxlen=1000, approximate=True).decode()
+                        # data collection prep
+                        datcb = lambda x: (dbl.putsmdat(x, cast(int, isweepeid), en.Event.LIGHT_SWEEP, rid), dh.handle_data(x, False))
+                        # do the experiment
+                        svtb = self.suns_voc(args["i_dwell"], ss, sm, intensities, datcb)
+                        # mark it as done
+                        db.xadd("tbl_event:isweeps_done", fields={"id": isweepeid}, maxlen=1000, approximate=True).decode()
+                        # keep the data
+                        data += svtb
+
+                    ss.lit = True  # Voc needs light
+                    if isinstance(sm, virt.FakeSMU):
+                        # tell the simulated device how much light it's getting (a dark sweep might have come first)
+                        sm.intensity = ss.intensity / 100
+                    self.lg.debug(f"Measuring voltage at constant current for {args['i_dwell']} seconds.")
                     dh.kind = "vt_measurement"
                     self.clear_plot("vt_measurement")
 
                     # db prep
-                    isweep_event = {}
-                    isweep_event["run_id"] = rid
-                    isweep_event["ecs"] = next(ecs)
-                    isweep_event["device_id"] = pix["did"]
-                    isweep_event["fixed"] = en.Fixed.CURRENT
-                    isweep_event["setpoint"] = args["i_dwell_value"]
-                    isweep_event["isetpoints"] = intensities
-                    isweep_event["effective_area"] = pix["area"]
-                    isweepeid = db.xadd("tbl_event:isweep", fields={"json": json.dumps(isweep_event)}, maxlen=1000, approximate=True).decode()
+                    ss_event = {}
+                    ss_event["run_id"] = rid
+                    ss_event["ecs"] = next(ecs)
+                    ss_event["device_id"] = pix["did"]
+                    ss_event["fixed"] = en.Fixed.CURRENT
+                    ss_event["setpoint"] = args["i_dwell_value"]
+                    ss_event["effective_area"] = pix["area"]
+                    sseid = db.xadd("tbl_event:ss", fields={"json": json.dumps(ss_event)}, maxlen=1000, approximate=True).decode()
                     # data collection prep
-                    datcb = lambda x: (dbl.putsmdat(x, cast(int, isweepeid), en.Event.LIGHT_SWEEP, rid), dh.handle_data(x, False))
+                    datcb = lambda x: (dbl.putsmdat(x, cast(int, sseid), en.Event.SS, rid), dh.handle_data(x, dodb=False))
                     # do the experiment
-                    svtb = self.suns_voc(args["i_dwell"], ss, sm, intensities, datcb)
+                    vt = sm.measure_until(t_dwell=args["i_dwell"], cb=datcb, shaped=True)
                     # mark it as done
-                    db.xadd("tbl_event:isweeps_done", fields={"id": isweepeid}, maxlen=1000, approximate=True).decode()
+                    db.xadd("tbl_event:ss_done", fields={"id": sseid}, maxlen=1000, approximate=True).decode()
                     # keep the data
-                    data += svtb
-
-                ss.lit = True  # Voc needs light
-                self.lg.debug(f"Measuring voltage at constant current for {args['i_dwell']} seconds.")
-                dh.kind = "vt_measurement"
-                self.clear_plot("vt_measurement")
-
-                # db prep
-                ss_event = {}
-                ss_event["run_id"] = rid
-                ss_event["ecs"] = next(ecs)
-                ss_event["device_id"] = pix["did"]
-                ss_event["fixed"] = en.Fixed.CURRENT
-                ss_event["setpoint"] = args["i_dwell_value"]
-                ss_event["effective_area"] = pix["area"]
-                sseid = db.xadd("tbl_event:ss", fields={"json": json.dumps(ss_event)}, maxlen=1000, approximate=True).decode()
-                # data collection prep
-                datcb = lambda x: (dbl.putsmdat(x, cast(int, sseid), en.Event.SS, rid), dh.handle_data(x, dodb=False))
-                # do the experiment
-                vt = sm.measure_until(t_dwell=args["i_dwell"], cb=datcb)
-                # mark it as done
-                db.xadd("tbl_event:ss_done", fields={"id": sseid}, maxlen=1000, approximate=True).decode()
-                # keep the data
-                data += vt
-
-                # if this was at Voc, use the last measurement as estimate of Voc
-                if (args["i_dwell_value"] == 0) and (len(vt) > 1):
-                    ssvoc = vt[-1][0]
-                else:
-                    ssvoc = None
+                    data += vt
 
-                if args["suns_voc"] > svoc_step_threshold:  # suns-voc is up
-                    self.lg.debug(f"Doing downwards suns-Voc for {args['i_dwell']} seconds.")
-                    dh.kind = "vt_measurement"
-                    self.clear_plot("vt_measurement")
-                    intensities_reversed = intensities[::-1]
+                    # if this was at Voc, use the last measurement as estimate of Voc
+                    if (args["i_dwell_value"] == 0) and (len(vt) > 1):
+                        ssvoc = vt[-1][0]
+                    else:
+                        ssvoc = None
+
+                    if args["suns_voc"] > svoc_step_threshold:  # suns-voc is up
+                        self.lg.debug(f"Doing downwards suns-Voc for {args['i_dwell']} seconds.")
+                        dh.kind = "vt_measurement"
+                        self.clear_plot("vt_measurement")
+                        intensities_reversed = intensities[::-1]
+
+                        # db prep
+                        isweep_event = {}
+                        isweep_event["run_id"] = rid
+                        isweep_event["ecs"] = next(ecs)
+                        isweep_event["device_id"] = pix["did"]
+                        isweep_event["fixed"] = en.Fixed.CURRENT
+                        isweep_event["setpoint"] = args["i_dwell_value"]
+                        isweep_event["isetpoints"] = intensities_reversed
+                        isweep_event["effective_area"] = pix["area"]
+                        isweepeid = db.xadd("tbl_event:isweep", fields={"json": json.dumps(isweep_event)}, maxlen=1000, approximate=True).decode()
+                        # data collection prep
+                        datcb = lambda x: (dbl.putsmdat(x, cast(int, isweepeid), en.Event.LIGHT_SWEEP, rid), dh.handle_data(x, dodb=False))
+                        # do the experiment
+                        svtb = self.suns_voc(args["i_dwell"], ss, sm, intensities_reversed, datcb)
+                        # mark it as done
+                        db.xadd("tbl_event:isweeps_done", fields={"id": isweepeid}, maxlen=1000, approximate=True).decode()
+                        # keep the data
+                        data += svtb
+
+                # sweep
+                elif phase == "sweep":
+                    if sweep["first_direction"]:
+                        start_setpoint = args["sweep_start"]
+                        end_setpoint = args["sweep_end"]
+                        sweep_index = 1
+                    else:
+                        start_setpoint = args["sweep_end"]
+                        end_setpoint = args["sweep_start"]
+                        sweep_index = 2
+
+                    if self.pkiller.is_set():
+                        self.lg.debug("Killed by killer.")
+                        return data
+                    self.lg.debug(f"Performing {sweep} sweep (from {start_setpoint}V to {end_setpoint}V)")
+                    # sweeps may or may not need light
+                    if sweep["light_on"]:
+                        ss.lit = True
+                        if sweep["first_direction"]:
+                            self.clear_plot("iv_measurement")
+                        if isinstance(sm, virt.FakeSMU):
+                            sm.intensity = ss.intensity / 100  # tell the simulated device how much light it's getting
+                        compliance_area = pix["area"]
+                    else:
+                        ss.lit = False
+                        if sweep["first_direction"]:
+                            self.clear_plot("iv_measurement")
+                        if isinstance(sm, virt.FakeSMU):
+                            sm.intensity = 0  # tell the simulated device how much light it's getting
+                        compliance_area = pix["dark_area"]
+
+                    dh.kind = f"iv_measurement/{sweep_index}"  # TODO: check if this /1 is still needed
+                    dh.illuminated_sweep = sweep["light_on"]
+
+                    sweep_args = {}
+                    sweep_args["sourceVoltage"] = True
+                    sweep_args["senseRange"] = "f"
+                    sweep_args["compliance"] = min((sm.current_limit, Fabric.find_i_limit(area=compliance_area, jmax=args["jmax"], imax=args["imax"])))
+                    sweep_args["nPoints"] = int(args["iv_steps"])
+                    sweep_args["stepDelay"] = args["source_delay"] / 1000
+                    sweep_args["start"] = start_setpoint
+                    sweep_args["end"] = end_setpoint
+                    if args.get("adaptive_sweep", False) and getattr(sm, "list_sweeps", False):
+                        # put the points where the last light curve bent rather than spacing them evenly
+                        levels = mppt.plan_sweep(start_setpoint, end_setpoint, min(sweep_args["nPoints"], sm.list_max_points))
+                        if levels is not None:
+                            sweep_args["levels"] = levels
+                            sweep_args["nPoints"] = len(levels)
+                    sm.setupSweep(**sweep_args)
 
                     # db prep
-                    isweep_event = {}
-                    isweep_event["run_id"] = rid
-                    isweep_event["ecs"] = next(ecs)
-                    isweep_event["device_id"] = pix["did"]
-                    isweep_event["fixed"] = en.Fixed.CURRENT
-                    isweep_event["setpoint"] = args["i_dwell_value"]
-                    isweep_event["isetpoints"] = intensities_reversed
-                    isweep_event["effective_area"] = pix["area"]
-                    isweepeid = db.xadd("tbl_event:isweep", fields={"json": json.dumps(isweep_event)}, maxlen=1000, approximate=True).decode()
-                    # data collection prep
-                    datcb = lambda x: (dbl.putsmdat(x, cast(int, isweepeid), en.Event.LIGHT_SWEEP, rid), dh.handle_data(x, dodb=False))
+                    sweep_event = {}
+                    sweep_event["run_id"] = rid
+                    sweep_event["ecs"] = next(ecs)
+                    sweep_event["device_id"] = pix["did"]
+                    sweep_event["fixed"] = en.Fixed.VOLTAGE
+                    sweep_event["linear"] = "levels" not in sweep_args
+                    sweep_event["n_points"] = sweep_args["nPoints"]
+                    sweep_event["from_setpoint"] = sweep_args["start"]
+                    sweep_event["to_setpoint"] = sweep_args["end"]
+                    sweep_event["light"] = sweep["light_on"]
+                    sweep_event["effective_area"] = compliance_area
+                    sweepeid = db.xadd("tbl_event:sweep", fields={"json": json.dumps(sweep_event)}, maxlen=1000, approximate=True).decode()
                     # do the experiment
-                    svtb = self.suns_voc(args["i_dwell"], ss, sm, intensities_reversed, datcb)
-                    # mark it as done
-                    db.xadd("tbl_event:isweeps_done", fields={"id": isweepeid}, maxlen=1000, approximate=True).decode()
+                    iv = sm.measure(sweep_args["nPoints"])
+                    # record the data
+                    dbl.putsmdat(iv, sweepeid, en.Event.ELECTRIC_SWEEP, rid)  # type: ignore
+                    # mark the event's data collection as done
+                    db.xadd("tbl_event:sweeps_done", fields={"id": sweepeid}, maxlen=1000, approximate=True).decode()
+                    # do legacy data handling
+
+                    dh.handle_data(iv, dodb=False)  # type: ignore
                     # keep the data
-                    data += svtb
-            else:
-                ssvoc = None
-
-            # perform sweeps
-            for sweep in sweeps:
-                if sweep["first_direction"]:
-                    start_setpoint = args["sweep_start"]
-                    end_setpoint = args["sweep_end"]
-                    sweep_index = 1
-                else:
-                    start_setpoint = args["sweep_end"]
-                    end_setpoint = args["sweep_start"]
-                    sweep_index = 2
-
-                if self.pkiller.is_set():
-                    self.lg.debug("Killed by killer.")
-                    return data
-                self.lg.debug(f"Performing {sweep} sweep (from {start_setpoint}V to {end_setpoint}V)")
-                # sweeps may or may not need light
-                if sweep["light_on"]:
+                    data += iv
+
+                    if mppt_enabled:
+                        # register this curve with the mppt
+                        mppt.register_curve(iv, light=sweep["light_on"])
+                    elif sweep["light_on"]:
+                        mppt.keep_curve(iv)  # still good for planning the next sweep
+
+                # mppt
+                elif phase == "mppt":
+                    dh.illuminated_sweep = None  # not a sweep
+                    if self.pkiller.is_set():
+                        self.lg.debug("Killed by killer.")
+                        return data
+                    self.lg.debug(f"Performing max. power tracking for {args['mppt_dwell']} seconds.")
+
+                    # mppt always needs light
                     ss.lit = True
-                    if sweep["first_direction"]:
-                        self.clear_plot("iv_measurement")
                     if isinstance(sm, virt.FakeSMU):
-                        sm.intensity = ss.intensity / 100  # tell the simulated device how much light it's getting
+                        # tell the simulated device how much light it's getting
+                        sm.intensity = ss.intensity / 100
                     compliance_area = pix["area"]
-                else:
-                    ss.lit = False
-                    if sweep["first_direction"]:
-                        self.clear_plot("iv_measurement")
+
+                    dh.kind = "mppt_measurement"
+                    self.clear_plot("mppt_measurement")
+
+                    if ssvoc is not None:
+                        # tell the mppt what our measured steady state Voc was
+                        mppt.Voc = ssvoc
+
+                    mppt_args = {}
+                    mppt_args["duration"] = args["mppt_dwell"]
+                    mppt_args["NPLC"] = args["nplc"]
+                    mppt_args["extra"] = args["mppt_params"]
+                    mppt_args["voc_compliance"] = sm.voltage_limit
+                    mppt_args["i_limit"] = min((sm.current_limit, Fabric.find_i_limit(area=compliance_area, jmax=args["jmax"], imax=args["imax"])))
+                    mppt_args["area"] = pix["area"]
+
+                    # db prep
+                    mppt_event = {}
+                    mppt_event["run_id"] = rid
+                    mppt_event["ecs"] = next(ecs)
+                    mppt_event["device_id"] = pix["did"]
+                    mppt_event["algorithm"] = args["mppt_params"]
+                    mppt_event["effective_area"] = compliance_area
+                    mpptid = db.xadd("tbl_event:mppt", fields={"json": json.dumps(mppt_event)}, maxlen=1000, approximate=True).decode()
+                    # data collection prep
+                    datcb = lambda x: (dbl.putsmdat(x, cast(int, mpptid), en.Event.MPPT, rid), dh.handle_data(x, dodb=False))
+                    mppt_args["callback"] = datcb
+                    # do the experiment
+                    (mt, vt) = mppt.launch_tracker(**mppt_args)
+                    # mark the event's data collection as done
+                    db.xadd("tbl_event:mppt_done", fields={"id": mpptid}, maxlen=1000, approximate=True).decode()
+
+                    # TODO: consider moving these into the mpp tracker
+                    mppt.reset()
+                    # reset nplc because the mppt can mess with it
+                    if args["nplc"] != -1:
+                        sm.setNPLC(args["nplc"])
+
+                    # in the case where we had to do a brief Voc in the mppt because we were running it blind,
+                    # send that data to the handler
+                    if len(vt) > 0:
+                        dh.kind = "vtmppt_measurement"
+
+                        # db prep
+                        ss_event = {}
+                        ss_event["run_id"] = rid
+                        ss_event["ecs"] = next(ecs)
+                        ss_event["device_id"] = pix["did"]
+                        ss_event["fixed"] = en.Fixed.CURRENT
+                        ss_event["setpoint"] = 0.0
+                        ss_event["effective_area"] = compliance_area
+                        sseid = db.xadd("tbl_event:ss", fields={"json": json.dumps(ss_event)}, maxlen=1000, approximate=True).decode()
+                        # simulate the ssvoc measurement from the voc data returned by the mpp tracker
+                        for d in vt:
+                            assert len(d) == 4, "Malformed smu data (resistance mode?)"
+                            dbl.putsmdat([d], sseid, en.Event.SS, rid)
+                            dh.handle_data([d], dodb=False)
+                        # mark the event as done
+                        db.xadd("tbl_event:ss_done", fields={"id": sseid}, maxlen=1000, approximate=True).decode()
+                        # keep the data
+                        data += vt
+
+                    # keep the mppt data
+                    data += mt
+
+                # "J_sc"
+                elif phase == "jsc":
+                    dh.illuminated_sweep = None  # not a sweep
+                    if self.pkiller.is_set():
+                        self.lg.debug("Killed by killer.")
+                        return data
+                    self.lg.debug(f"Measuring current at constant voltage for {args['v_dwell']} seconds.")
+
+                    # jsc always needs light
+                    ss.lit = True
                     if isinstance(sm, virt.FakeSMU):
-                        sm.intensity = 0  # tell the simulated device how much light it's getting
-                    compliance_area = pix["dark_area"]
-
-                dh.kind = f"iv_measurement/{sweep_index}"  # TODO: check if this /1 is still needed
-                dh.illuminated_sweep = sweep["light_on"]
-
-                sweep_args = {}
-                sweep_args["sourceVoltage"] = True
-                sweep_args["senseRange"] = "f"
-                sweep_args["compliance"] = min((sm.current_limit, Fabric.find_i_limit(area=compliance_area, jmax=args["jmax"], imax=args["imax"])))
-                sweep_args["nPoints"] = int(args["iv_steps"])
-                sweep_args["stepDelay"] = args["source_delay"] / 1000
-                sweep_args["start"] = start_setpoint
-                sweep_args["end"] = end_setpoint
-                sm.setupSweep(**sweep_args)
-
-                # db prep
-                sweep_event = {}
-                sweep_event["run_id"] = rid
-                sweep_event["ecs"] = next(ecs)
-                sweep_event["device_id"] = pix["did"]
-                sweep_event["fixed"] = en.Fixed.VOLTAGE
-                sweep_event["linear"] = True
-                sweep_event["n_points"] = sweep_args["nPoints"]
-                sweep_event["from_setpoint"] = sweep_args["start"]
-                sweep_event["to_setpoint"] = sweep_args["end"]
-                sweep_event["light"] = sweep["light_on"]
-                sweep_event["effective_area"] = compliance_area
-                sweepeid = db.xadd("tbl_event:sweep", fields={"json": json.dumps(sweep_event)}, maxlen=1000, approximate=True).decode()
-                # do the experiment
-                iv = sm.measure(sweep_args["nPoints"])
-                # record the data
-                dbl.putsmdat(iv, sweepeid, en.Event.ELECTRIC_SWEEP, rid)  # type: ignore
-                # mark the event's data collection as done
-                db.xadd("tbl_event:sweeps_done", fields={"id": sweepeid}, maxlen=1000, approximate=True).decode()
-                # do legacy data handling
-
-                dh.handle_data(iv, dodb=False)  # type: ignore
-                # keep the data
-                data += iv
-
-                if mppt_enabled:
-                    # register this curve with the mppt
-                    mppt.register_curve(iv, light=sweep["light_on"])
-
-            # TODO: read and interpret parameters for smart mode
-            dh.illuminated_sweep = None  # not a sweep
-
-            # mppt if
-            if mppt_enabled:
-                if self.pkiller.is_set():
-                    self.lg.debug("Killed by killer.")
-                    return data
-                self.lg.debug(f"Performing max. power tracking for {args['mppt_dwell']} seconds.")
-
-                # mppt always needs light
-                ss.lit = True
-                if isinstance(sm, virt.FakeSMU):
-                    # tell the simulated device how much light it's getting
-                    sm.intensity = ss.intensity / 100
-                compliance_area = pix["area"]
-
-                dh.kind = "mppt_measurement"
-                self.clear_plot("mppt_measurement")
-
-                if ssvoc is not None:
-                    # tell the mppt what our measured steady state Voc was
-                    mppt.Voc = ssvoc
-
-                mppt_args = {}
-                mppt_args["duration"] = args["mppt_dwell"]
-                mppt_args["NPLC"] = args["nplc"]
-                mppt_args["extra"] = args["mppt_params"]
-                mppt_args["voc_compliance"] = sm.voltage_limit
-                mppt_args["i_limit"] = min((sm.current_limit, Fabric.find_i_limit(area=compliance_area, jmax=args["jmax"], imax=args["imax"])))
-                mppt_args["area"] = pix["area"]
-
-                # db prep
-                mppt_event = {}
-                mppt_event["run_id"] = rid
-                mppt_event["ecs"] = next(ecs)
-                mppt_event["device_id"] = pix["did"]
-                mppt_event["algorithm"] = args["mppt_params"]
-                mppt_event["effective_area"] = compliance_area
-                mpptid = db.xadd("tbl_event:mppt", fields={"json": json.dumps(mppt_event)}, maxlen=1000, approximate=True).decode()
-                # data collection prep
-                datcb = lambda x: (dbl.putsmdat(x, cast(int, mpptid), en.Event.MPPT, rid), dh.handle_data(x, dodb=False))
-                mppt_args["callback"] = datcb
-                # do the experiment
-                (mt, vt) = mppt.launch_tracker(**mppt_args)
-                # mark the event's data collection as done
-                db.xadd("tbl_event:mppt_done", fields={"id": mpptid}, maxlen=1000, approximate=True).decode()
-
-                # TODO: consider moving these into the mpp tracker
-                mppt.reset()
-                # reset nplc because the mppt can mess with it
-                if args["nplc"] != -1:
-                    sm.setNPLC(args["nplc"])
-
-                # in the case where we had to do a brief Voc in the mppt because we were running it blind,
-                # send that data to the handler
-                if len(vt) > 0:
-                    dh.kind = "vtmppt_measurement"
+                        # tell the simulated device how much light it's getting
+                        sm.intensity = ss.intensity / 100
+                    compliance_area = pix["area"]
+
+                    dh.kind = "it_measurement"
+                    self.clear_plot("it_measurement")
+
+                    ss_args = {}
+                    ss_args["sourceVoltage"] = True
+                    ss_args["compliance"] = min((sm.current_limit, Fabric.find_i_limit(area=compliance_area, jmax=args["jmax"], imax=args["imax"])))
+                    ss_args["setPoint"] = args["v_dwell_value"]
+                    ss_args["senseRange"] = "a"  # NOTE: "a" can possibly cause unknown delays between points
+                    sm.setupDC(**ss_args)
 
                     # db prep
                     ss_event = {}
                     ss_event["run_id"] = rid
                     ss_event["ecs"] = next(ecs)
                     ss_event["device_id"] = pix["did"]
-                    ss_event["fixed"] = en.Fixed.CURRENT
-                    ss_event["setpoint"] = 0.0
+                    ss_event["fixed"] = en.Fixed.VOLTAGE
+                    ss_event["setpoint"] = args["v_dwell_value"]
                     ss_event["effective_area"] = compliance_area
                     sseid = db.xadd("tbl_event:ss", fields={"json": json.dumps(ss_event)}, maxlen=1000, approximate=True).decode()
-                    # simulate the ssvoc measurement from the voc data returned by the mpp tracker
-                    for d in vt:
-                        assert len(d) == 4, "Malformed smu data (resistance mode?)"
-                        dbl.putsmdat([d], sseid, en.Event.SS, rid)
-                        dh.handle_data([d], dodb=False)
-                    # mark the event as done
+                    # data collection prep
+                    datcb = lambda x: (dbl.putsmdat(x, cast(int, sseid), en.Event.SS, rid), dh.handle_data(x, dodb=False))
+                    # do the experiment
+                    it = sm.measure_until(t_dwell=args["v_dwell"], cb=datcb, shaped=True)
+                    # mark it as done
                     db.xadd("tbl_event:ss_done", fields={"id": sseid}, maxlen=1000, approximate=True).decode()
                     # keep the data
-                    data += vt
-
-                # keep the mppt data
-                data += mt
-
-            # "J_sc" if
-            if (args["v_dwell_check"]) and (args["v_dwell"] > 0):
-                if self.pkiller.is_set():
-                    self.lg.debug("Killed by killer.")
-                    return data
-                self.lg.debug(f"Measuring current at constant voltage for {args['v_dwell']} seconds.")
-
-                # jsc always needs light
-                ss.lit = True
-                if isinstance(sm, virt.FakeSMU):
-                    # tell the simulated device how much light it's getting
-                    sm.intensity = ss.intensity / 100
-                compliance_area = pix["area"]
-
-                dh.kind = "it_measurement"
-                self.clear_plot("it_measurement")
-
-                ss_args = {}
-                ss_args["sourceVoltage"] = True
-                ss_args["compliance"] = min((sm.current_limit, Fabric.find_i_limit(area=compliance_area, jmax=args["jmax"], imax=args["imax"])))
-                ss_args["setPoint"] = args["v_dwell_value"]
-                ss_args["senseRange"] = "a"  # NOTE: "a" can possibly cause unknown delays between points
-                sm.setupDC(**ss_args)
-
-                # db prep
-                ss_event = {}
-                ss_event["run_id"] = rid
-                ss_event["ecs"] = next(ecs)
-                ss_event["device_id"] = pix["did"]
-                ss_event["fixed"] = en.Fixed.VOLTAGE
-                ss_event["setpoint"] = args["v_dwell_value"]
-                ss_event["effective_area"] = compliance_area
-                sseid = db.xadd("tbl_event:ss", fields={"json": json.dumps(ss_event)}, maxlen=1000, approximate=True).decode()
-                # data collection prep
-                datcb = lambda x: (dbl.putsmdat(x, cast(int, sseid), en.Event.SS, rid), dh.handle_data(x, dodb=False))
-                # do the experiment
-                it = sm.measure_until(t_dwell=args["v_dwell"], cb=datcb)
-                # mark it as done
-                db.xadd("tbl_event:ss_done", fields={"id": sseid}, maxlen=1000, approximate=True).decode()
-                # keep the data
-                data += it
+                    data += it
 
         sm.outOn(False)  # it's probably wise to shut off the smu after every pixel
         return data
 
+    @staticmethod
+    def plan_phases(args: dict, sweeps: list[dict], lit: bool | None = None) -> list[tuple[str, dict | None]]:
+        """
+        lists the phases of the device routine as (phase, sweep) tuples in the order they'll be done.
+        give it the light's current state (lit) to get the phases regrouped to minimize light changes:
+        the dark sweeps then get done as one block before or after everything that needs light.
+        this plans one device, see plan_sequence() for planning several measured one after the other
+        """
+        phases: list[tuple[str, dict | None]] = []
+        if (args["i_dwell"] > 0) and args["i_dwell_check"]:
+            phases.append(("voc", None))
+        for sweep in sweeps:
+            phases.append(("sweep", sweep))
+        if (args["mppt_check"]) and (args["mppt_dwell"] > 0):
+            phases.append(("mppt", None))
+        if (args["v_dwell_check"]) and (args["v_dwell"] > 0):
+            phases.append(("jsc", None))
+
+        if lit is not None:
+            # the relative order within each block is kept (light sweeps still come before the mppt that uses them)
+            dark = [phase for phase in phases if (phase[0] == "sweep") and (not phase[1]["light_on"])]  # type: ignore
+            light = [phase for phase in phases if phase not in dark]
+            phases = min((dark + light, light + dark), key=lambda x: Fabric.count_light_changes(x, args, lit))
+        return phases
+
+    @staticmethod
+    def estimate_step_time(args: dict, sweeps: list[dict], sm: SourcemeterAPI) -> float:
+        """[s] about how long the device routine takes with this smu (not counting stage motion or light changes)"""
+        t = 0.0
+        for phase, sweep in Fabric.plan_phases(args, sweeps):
+            if phase == "voc":
+                t += args["i_dwell"]
+            elif phase == "sweep":
+                n_points = int(args["iv_steps"])
+                step_delay = args["source_delay"] / 1000
+                t_sweep = None
+                if hasattr(sm, "expected_sweep_time"):
+                    t_sweep = sm.expected_sweep_time(n_points, step_delay)  # what its sweeps like this have been taking
+                if t_sweep is None:
+                    t_sweep = n_points * max(step_delay, 0)
+                t += t_sweep
+            elif phase == "mppt":
+                t += args["mppt_dwell"]
+            elif phase == "jsc":
+                t += args["v_dwell"]
+        return t
+
+    @staticmethod
+    def plan_sequence(args: dict, sweeps: list[dict], n: int, lit: bool) -> list[list[tuple[str, dict | None]]]:
+        """
+        phase plans (see plan_phases()) for n devices measured one after the other starting from the lit state,
+        each one starting from the light state the one before it left the light in. so with dark sweeps to do,
+        they alternate between ending in the light and ending in the dark and there's no light change between devices
+        """
+        plans = []
+        for k in range(n):
+            plan = Fabric.plan_phases(args, sweeps, lit=lit)
+            plans.append(plan)
+            lit = (Fabric.light_states(plan, args) or [lit])[-1]
+        return plans
+
+    @staticmethod
+    def count_sequence_changes(plans: list[list[tuple[str, dict | None]]], args: dict, lit: bool = False) -> int:
+        """counts how many times the light gets switched on or off going through phase plans one after the other starting from the lit state"""
+        return Fabric.count_light_changes([phase for plan in plans for phase in plan], args, lit)
+
+    @staticmethod
+    def count_light_changes(phases: list[tuple[str, dict | None]], args: dict, lit: bool = False) -> int:
+        """counts how many times the light gets switched on or off going through a list of phases starting from the lit state"""
+        n_changes = 0
+        for state in Fabric.light_states(phases, args):
+            if state != lit:
+                n_changes += 1
+                lit = state
+        return n_changes
+
+    @staticmethod
+    def light_states(phases: list[tuple[str, dict | None]], args: dict) -> list[bool]:
+        """the light states a list of phases needs, in order"""
+        states = []
+        for phase, sweep in phases:
+            if phase == "voc":
+                if args["suns_voc"] < -Fabric.svoc_step_threshold:
+                    states.append(False)  # suns-Voc up starts in the dark
+                states.append(True)
+                if args["suns_voc"] > Fabric.svoc_step_threshold:
+                    states.append(False)  # suns-Voc down ends in the dark
+            elif phase == "sweep":
+                states.append(sweep["light_on"])  # type: ignore
+            else:
+                states.append(True)
+        return states
+
     @staticmethod
     def record_spectrum(ss: LightAPI, outq: Queue | mQueue, lg: Logger) -> list[dict]:
         """does spectrum fetching at the start of the standard routine"""
@@ -4,9 +4,9 @@ from centralcontrol.virt import FakeLight
 
 # from centralcontrol.newport import Newport
 
+import time
 from threading import BrokenBarrierError
-from threading import Barrier as tBarrier
-from multiprocessing.synchronize import Barrier as mBarrier
+from threading import Condition
 from typing import Type, Callable
 
 from centralcontrol.logstuff import get_logger
@@ -44,13 +44,95 @@ def factory(cfg: dict) -> Type["LightAPI"]:
     return type(name, bases, tdict)  # return the configured light class overlayed with our API
 
 
+class ElasticBarrier(object):
+    """
+    a thread barrier (like threading.Barrier) whose number of parties can shrink while others wait on it
+    lets a thread that has run out of work drop out of light synchronization without breaking the barrier for everyone else
+    """
+
+    def __init__(self, parties: int, action: Callable | None = None, timeout: float | None = None):
+        self._cond = Condition()
+        self._parties = parties
+        self._action = action
+        self._timeout = timeout
+        self._count = 0  # number of threads currently waiting
+        self._generation = 0  # increments every time the barrier trips
+        self._broken = False
+
+    @property
+    def parties(self) -> int:
+        """the number of threads required to trip the barrier"""
+        return self._parties
+
+    @property
+    def n_waiting(self) -> int:
+        """the number of threads currently waiting at the barrier"""
+        return self._count
+
+    @property
+    def broken(self) -> bool:
+        return self._broken
+
+    def wait(self, timeout: float | None = None) -> int:
+        """wait for the barrier to trip. returns an arrival index and raises BrokenBarrierError on timeout/abort"""
+        if timeout is None:
+            timeout = self._timeout
+        with self._cond:
+            if self._broken:
+                raise BrokenBarrierError
+            index = self._count
+            self._count += 1
+            if self._count >= self._parties:
+                self._trip()
+            else:
+                generation = self._generation
+                if not self._cond.wait_for(lambda: (self._generation != generation) or self._broken, timeout):
+                    self._break()  # timed out
+                if self._generation == generation:
+                    raise BrokenBarrierError
+            return index
+
+    def leave(self) -> None:
+        """permanently remove one party from the barrier. trips it if everyone remaining is already waiting"""
+        with self._cond:
+            self._parties = max(self._parties - 1, 0)
+            if (self._count > 0) and (self._count >= self._parties) and (not self._broken):
+                self._trip()
+
+    def abort(self) -> None:
+        """put the barrier into the broken state. current and future waiters get BrokenBarrierError"""
+        with self._cond:
+            self._break()
+
+    def _trip(self):
+        """run the action and release the waiters. must be called with the condition held"""
+        try:
+            if self._action:
+                self._action()
+        except:
+            self._break()
+            raise
+        self._count = 0
+        self._generation += 1
+        self._cond.notify_all()
+
+    def _break(self):
+        """must be called with the condition held"""
+        self._broken = True
+        self._count = 0
+        self._cond.notify_all()
+
+
 class LightAPI(object):
     """unified light programming interface"""
 
-    barrier: mBarrier | tBarrier
-    barrier_timeout = 10  # s. wait at most this long for thread sync on light state change
+    barrier: ElasticBarrier
+    barrier_timeout: float | None = 10  # s. wait at most this long for thread sync on light state change
     _current_intensity: int = 0  # percent. 0 means off. otherwise can be on [10, 100]. what we believe the light's intensity is
     requested_intensity: int = 0  # percent. 0 means off. otherwise can be on [10, 100]. keeps track of what we want the light's intensity to be
+    synced_intensity: int = 0  # percent. what the last trip of the barrier applied (the last request made before it)
+    n_changes: int = 0  # how many times the light's intensity has been changed
+    change_time: float = 0.0  # s. total time spent changing the light's intensity
     active_intensity: int  # the intensity value the hardware was initalized with. used in "on"
     get_spectrum: Callable[[], tuple[list[float], list[float]]]
     get_temperatures: Callable[[], list[float]]
@@ -76,7 +158,7 @@ class LightAPI(object):
             self.active_intensity = int(kwargs["intensity"])  # use this initial intensity for the "on" value
 
         # thing that blocks to ensure sync
-        self.barrier = tBarrier(1, action=self.apply_intensity, timeout=self.barrier_timeout)
+        self.barrier = ElasticBarrier(1, action=self.apply_intensity, timeout=self.barrier_timeout)
 
         super(LightAPI, self).__init__(**kwargs)
 
@@ -145,9 +227,16 @@ class LightAPI(object):
         self.barrier.abort()
 
         # thing that blocks to ensure sync
-        self.barrier = tBarrier(value, action=self.apply_intensity, timeout=self.barrier_timeout)
+        self.barrier = ElasticBarrier(value, action=self.apply_intensity, timeout=self.barrier_timeout)
         return None
 
+    def leave_sync(self) -> None:
+        """
+        drop the calling thread out of light synchronization (for when it has nothing left to measure)
+        unlike setting n_sync, this does not disturb threads that are already waiting
+        """
+        self.barrier.leave()
+
     @property
     def intensity(self) -> int:
         """
@@ -162,18 +251,22 @@ class LightAPI(object):
         if isinstance(value, int) and ((value == 0) or ((value >= 10) and (value <= 100))):
             if value != self._current_intensity:
                 self.lg.debug(f"Request to change light intensity to {value}. Waiting for synchronization...")
-                self.requested_intensity = value
-                try:
-                    draw = self.barrier.wait()
-                    if draw == 0:  # we're the lucky winner!
-                        self.lg.debug(f"Light intensity synchronization complete!")
-                    if value != self.requested_intensity:
-                        self.lg.debug(f"Something's fishy. We wanted {value}, but got {self.requested_intensity}")
-                except BrokenBarrierError as e:
-                    # most likely a timeout
-                    # could also be if the barrier was reset or aborted during the wait
-                    # or if the call to change the light state errored
-                    raise ValueError(f"The light synchronization barrier was broken! {e}")
+                while True:
+                    self.requested_intensity = value
+                    try:
+                        draw = self.barrier.wait()
+                        if draw == 0:  # we're the lucky winner!
+                            self.lg.debug(f"Light intensity synchronization complete!")
+                    except BrokenBarrierError as e:
+                        # most likely a timeout
+                        # could also be if the barrier was reset or aborted during the wait
+                        # or if the call to change the light state errored
+                        raise ValueError(f"The light synchronization barrier was broken! {e}")
+                    if self.synced_intensity == value:
+                        break
+                    # another thread asked for a different intensity at the same sync and got it. measuring now
+                    # would happen at the wrong light level, so go back to the barrier for the next change instead
+                    self.lg.warning(f"Conflicting light requests: wanted {value}, but the light was set to {self.synced_intensity}. Waiting to sync again.")
             else:
                 # requested state matches actual state
                 self.lg.debug(f"Light intensity is already {value}")
@@ -189,8 +282,10 @@ class LightAPI(object):
         setpoint = forced_intensity
         if setpoint is None:
             setpoint = self.requested_intensity
+            self.synced_intensity = setpoint
 
         self.lg.debug(f"apply_intensity() doing {setpoint}")
+        t0 = time.time()
         case = "B"
         if case == "A":  # non-blinky mode
             if setpoint == 0:
@@ -211,6 +306,8 @@ class LightAPI(object):
 
         if (isinstance(on_ret, str) and on_ret.startswith("sn")) and (set_ret == 0) and (off_ret == 0):
             self._current_intensity = setpoint
+            self.n_changes += 1
+            self.change_time += time.time() - t0
         else:
             self.lg.debug(f"failure to set the light's intensity: {off_ret=} and {set_ret=} and {on_ret=}")
 
@@ -2,14 +2,39 @@
 
 import sys
 import time
+import math
 import serial
 from threading import Event as tEvent
 from multiprocessing.synchronize import Event as mEvent
 import socket
 import re
+import contextlib
+import functools
+import threading
+import typing
+
+import numpy
 
 import logging
 from centralcontrol.logstuff import get_logger
+from centralcontrol import readings
+from centralcontrol.channels import SharedComms
+from centralcontrol.session import SessionStore
+from centralcontrol.shadow import Shadow
+from centralcontrol.tcp import TcpTransport
+from centralcontrol.timing import SweepTiming
+from centralcontrol.tsp import ScriptManager
+
+
+def batched(method):
+    """makes all of a k2xxx method's writes go out as one batch"""
+
+    @functools.wraps(method)
+    def wrapper(self: "k2xxx", *args, **kwargs):
+        with self.batch():
+            return method(self, *args, **kwargs)
+
+    return wrapper
 
 
 class k2xxx(object):
@@ -36,11 +61,12 @@ class k2xxx(object):
     status = 0
     nplc_user_set = 1.0
     last_sweep_time: float = 0.0
+    last_readings: numpy.ndarray | None = None  # the latest measure()'s readings as a structured array
     readyForAction = False
     four88point1 = False
     print_sweep_deets = False  # false uses debug logging level, true logs sweep stats at info level
     connected = False
-    ser: serial.Serial
+    ser: serial.Serial | TcpTransport
     do_r: str | bool = False  # include resistance in measurement
     t_relay_bounce = 0.05  # number of seconds to wait to ensure the contact check relays have stopped bouncing
     last_lo = None  # we're not set up for contact checking
@@ -50,6 +76,32 @@ class k2xxx(object):
     killer: tEvent | mEvent
     address: str = ""
     threshold_ohm = 33.3  # resistance values below this give passing contact checker tests
+    binary = True  # transfer readings in the instrument's binary format, when it has one
+    data_dtype: numpy.dtype | None = None  # how binary readings are encoded, None while they're coming as ASCII
+    stream_interval: float | None = None  # [s] when set, measure_until has the instrument take its readings this far apart and collects them in blocks
+    stream_latency = 0.5  # [s] longest a streaming block lasts, so how long it can take to notice the killer
+    stream_max_points = 2500  # most readings to collect in one block (the 24xx sample buffer size)
+    filter_count = 1  # readings the instrument averages into each one it gives (see set_filter())
+    filter_max_count = 100  # the most its repeat filter takes
+    direct_tcp = True  # talk to socket:// (LAN) instruments with TcpTransport rather than pyserial's socket handler
+    fast_reconnect = True  # when the instrument's last session ended cleanly and nothing's changed since, connect skips the resets and self test
+    batch_max_len = 200  # [characters] longest line a batch sends at once, to stay well inside the instrument's input buffer
+    _batch: list[str] | None = None  # writes waiting to go out, None when we're not batching
+    # configuration we remember writing so we don't send it again when it wouldn't change anything (see shadow.py)
+    shadowed = frozenset({"sens:curr:nplc", "sens:volt:nplc", "sens:res:nplc", "disp:dig", "sour:func", "sour:volt:mode", "sour:curr:mode", "sour:del:auto", "sens:curr:prot", "sens:volt:prot", "sens:curr:prot:rsyn", "sens:volt:prot:rsyn", "sens:curr:rang:auto", "sens:volt:rang:auto", "sens:res:rang:auto", "rout:term", "syst:rsen", "form:elem", "smua.measure.nplc", "smua.source.func", "smua.source.limiti", "smua.source.limitv", "smua.sense", "smub.measure.nplc", "smub.source.func", "smub.source.limiti", "smub.source.limitv", "smub.sense"})
+    shadow_invalidators = frozenset({"*rst", "syst:pres", "*rcl", "sens:res:mode", "reset()", "smua.reset()", "smub.reset()"})  # these change settings behind our back
+    shadow: Shadow
+    scripts: ScriptManager  # runs whole sweeps and tracking on 2600s (see tsp.py)
+    _sweep: tuple[str, tuple, int] | None = None  # (script, its arguments, points) of the 2600 sweep setupSweep readied for measure() to run
+    list_sweeps = True  # setupSweep takes levels
+    list_max_points = 100  # most levels a list sweep can have (the 24xx source memory list length)
+    timing: SweepTiming  # how long this instrument's sweeps really take, for their timeouts (see timing.py)
+    _sweep_key: str = ""  # the timing configuration of the sweep setupSweep readied
+    _t_trigger: float = 0.0  # [s] perf_counter() when the last measurement got triggered
+    _sweep_timeout: float | None = None  # [s] the comms timeout for the sweep setupSweep readied
+    channel = "a"  # which of a 2600's channels this drives (smua or smub), drivers for the channels of one instrument share its comms
+    link: SharedComms | None = None  # the comms shared with drivers for the instrument's other channels, None when it only has the one
+    comms_lock: threading.RLock  # held for each command and its reply, or a whole measurement, so channels sharing the comms take turns
     connect_kwargs: dict
     __write_term_str = "\n"
     __write_term_bytes = b"\n"
@@ -63,7 +115,7 @@ class k2xxx(object):
     __src:str = ""  # keeps track of volt/curr source mode of hardware
     __srcs:list[str]  # same as __src, except for multichannel
 
-    def __init__(self, address:str, front:bool=front, two_wire:bool=two_wire, killer:tEvent|mEvent=tEvent(), print_sweep_deets:bool=print_sweep_deets, cc_mode:str=cc_mode, read_term:str=__read_term_str, write_term:str=__write_term_str, **kwargs):
+    def __init__(self, address:str, front:bool=front, two_wire:bool=two_wire, killer:tEvent|mEvent=tEvent(), print_sweep_deets:bool=print_sweep_deets, cc_mode:str=cc_mode, read_term:str=__read_term_str, write_term:str=__write_term_str, binary:bool=binary, stream_interval:float|None=stream_interval, direct_tcp:bool=direct_tcp, fast_reconnect:bool=fast_reconnect, sessions:SessionStore|None=None, timing:SweepTiming|None=None, channel:str=channel, **kwargs):
         """just set class variables here"""
         self.lg = get_logger(".".join([__name__, type(self).__name__]))  # setup logging
         self.lg.debug("k2xxx init starting")
@@ -77,6 +129,18 @@ class k2xxx(object):
         self.write_term = write_term
         self.read_term = read_term
         self.cc_mode = cc_mode
+        self.binary = binary
+        self.stream_interval = stream_interval
+        self.direct_tcp = direct_tcp
+        self.fast_reconnect = fast_reconnect
+        self.sessions = SessionStore() if sessions is None else sessions  # session fingerprints for fast reconnects
+        self.timing = SweepTiming() if timing is None else timing  # learned sweep timing
+        if channel not in ("a", "b"):
+            raise ValueError(f"Unknown smu channel: {channel}")
+        self.channel = channel
+        self.comms_lock = threading.RLock()
+        self.shadow = Shadow(self.shadowed, self.shadow_invalidators)
+        self.scripts = ScriptManager(self)
         self.connect_kwargs = kwargs  # use the the rest of the keyword argumests here in connect()
 
         self.lg.debug("k2xxx initialized.")
@@ -98,6 +162,25 @@ class k2xxx(object):
         """comms timeout (read only. set it with the timeout kwarg passed to init)"""
         return self.__timeout
 
+    @property
+    def smu(self) -> str:
+        """the TSP name of our channel"""
+        return f"smu{self.channel}"
+
+    @property
+    def channels(self) -> tuple[str, ...]:
+        """the instrument's channels"""
+        if (self.series == "2600") and (self.model in ("2602",)):
+            ret = ("a", "b")
+        else:
+            ret = ("a",)
+        return ret
+
+    @property
+    def shared(self) -> bool:
+        """whether a driver for another of the instrument's channels is using our comms too"""
+        return (self.link is not None) and (len(self.link.users) > 1)
+
     @property
     def write_term(self) -> str:
         return self.__write_term_str
@@ -183,9 +266,110 @@ class k2xxx(object):
 
         return success
 
+    def open_comms(self) -> serial.Serial | TcpTransport:
+        """a connection to the instrument: a plain TCP one for LAN instruments (unless direct_tcp is off), pyserial's otherwise"""
+        if self.direct_tcp and self.address.startswith("socket://"):
+            return TcpTransport(self.address, **self.connect_kwargs)
+        return serial.serial_for_url(self.address, **self.connect_kwargs)
+
+    def session_settings(self) -> dict:
+        """the comms settings that go into a session fingerprint"""
+        return {"read_term": self.read_term, "write_term": self.write_term, "direct_tcp": self.direct_tcp, "connect_kwargs": {key: repr(val) for key, val in sorted(self.connect_kwargs.items())}}
+
+    def reconnect(self) -> bool:
+        """
+        the fast way in: open the comms, flush them and check that the instrument is the one we left cleanly last session
+        returns False (with the comms closed again) when that's not the case so the full connect can take over
+        """
+        if "socket" in self.address:
+            self.read_term = "\n"  # as the full connect would have it
+            [sockethost, socketport] = self.address.removeprefix("socket://").split(":", 1)
+            self.__sockethost = sockethost
+            self.__socketport = int(socketport)
+        fingerprint = self.sessions.recall(self.address, self.session_settings())
+        if fingerprint is None:
+            return False
+        try:
+            self.ser = self.open_comms()
+            self.__timeout = self.ser.timeout
+            self.ser.reset_output_buffer()
+            if self.ser.rtscts:
+                self.ser.rts = True
+            if not self.hard_input_buffer_reset():
+                raise ValueError("ghost connection")
+            self.shadow.invalidate()
+            self.identify()
+            if self.idn != fingerprint["idn"]:
+                raise ValueError(f"expected {fingerprint['idn']}, got {self.idn}")
+        except Exception as e:
+            self.lg.debug(f"Fast reconnect to {self.address} didn't work out ({e}), doing the full connect")
+            try:
+                if self.ser:
+                    self.ser.close()
+            except Exception:
+                pass
+            self.sessions.opened(self.address)
+            return False
+        self.connected = self.ser.is_open
+        self.sessions.opened(self.address)  # it's not clean again until we disconnect cleanly
+        self.setup(self.front, self.two_wire)
+        self.lg.debug(f"k2xxx reconnected.")
+        return True
+
     def connect(self):
+        """attempt to connect to hardware and initialize it, or join the comms of a driver already connected to another of its channels"""
+        self.scripts.forget()  # it might be a different instrument now, or been power cycled
+        with SharedComms.claim(self.address):
+            if not self.attach():
+                self.connect_alone()
+                self.share()
+        return 0
+
+    def attach(self) -> bool:
+        """joins the comms of a driver for another of the instrument's channels that's already connected, False when there's none"""
+        link = SharedComms.find(self.address)
+        if link is None:
+            return False
+        if self.channel in link.users:
+            raise ValueError(f"Channel {self.channel} of {self.address} is already connected")
+        peer = next(iter(link.users.values()))
+        if self.channel not in peer.channels:
+            raise ValueError(f"{peer.model} at {self.address} has no channel {self.channel}")
+        self.ser = link.ser
+        self.__timeout = peer.timeout
+        self.__sockethost = peer.__sockethost
+        self.__socketport = peer.__socketport
+        self.read_term = peer.read_term
+        self.write_term = peer.write_term
+        for name in ("idn", "series", "model", "opts", "not2400", "data_dtype"):
+            setattr(self, name, getattr(peer, name))
+        self.timing.load(self.idn)
+        self.shadow.invalidate()
+        self.comms_lock = link.lock
+        with self.comms_lock:
+            self.setWires(self.two_wire)
+            self.__src = {"0": "curr", "1": "volt"}.get(self.query(f"print({self.smu}.source.func)"), "")
+        self.link = link
+        link.join(self)
+        self.connected = True
+        self.lg.debug(f"k2xxx channel {self.channel} joined the comms to {self.address}.")
+        return True
+
+    def share(self):
+        """lets drivers for the instrument's other channels join our comms, when it has other channels"""
+        if self.channel not in self.channels:
+            self.disconnect()
+            raise ValueError(f"{self.model} at {self.address} has no channel {self.channel}")
+        if len(self.channels) > 1:
+            self.link = SharedComms.open(self)
+
+    def connect_alone(self):
         """attempt to connect to hardware and initialize it"""
 
+        if self.fast_reconnect and self.reconnect():
+            return
+        self.sessions.opened(self.address)
+
         remaining_connection_retries = 5
         while remaining_connection_retries > 0:
             if "socket" in self.address:
@@ -202,7 +386,7 @@ class k2xxx(object):
                 self.lg.debug(f"Socket clean.")
 
             try:
-                self.ser = serial.serial_for_url(self.address, **self.connect_kwargs)
+                self.ser = self.open_comms()
                 self.lg.debug(f"Connection opened: {self.address}")
             except Exception as e:
                 raise ValueError(f"Failure connecting to {self.address} with: {e}")
@@ -318,6 +502,8 @@ class k2xxx(object):
         if not matched:
             raise RuntimeError(f"Unsupported SMU IDN: {self.idn}")
 
+        self.timing.load(self.idn)  # what we learned about its sweeps last time
+
     def config_buffers(self, conf_strs:list[str]):
         """config all buffers (tsp command)"""
         if self.series in ("2600",):
@@ -372,6 +558,7 @@ class k2xxx(object):
             buffer_confs.append("collecttimestamps = 1")
             buffer_confs.append("timestampresolution = 0.0001")
             self.config_buffers(buffer_confs)
+        self.setup_data_format()
 
         # if self.series in ("2400", "2400G"):
         # from: https://web.archive.org/web/20250109111448/https://download.tek.com/manual/2400S-900-01_K-Sep2011_User.pdf
@@ -435,7 +622,7 @@ class k2xxx(object):
                     self.__srcs[chani] = "curr"
                 elif chansrc == "1":
                     self.__srcs[chani] = "volt"
-            self.__src = self.__srcs[0]
+            self.__src = self.__srcs[chans.index(self.smu)] if self.smu in chans else ""
 
         if self.series in ("2400", "2400G"):
             self.write("syst:azero off")  # we'll do this once before every measurement
@@ -469,28 +656,179 @@ class k2xxx(object):
 
         self.lg.debug("k2xxx setup complete.")
 
+    def setup_data_format(self):
+        """switches reading transfers to the instrument's binary format if we can, otherwise leaves them as ASCII"""
+        self.data_dtype = None
+        if self.binary:
+            try:
+                if self.series in ("2400", "2400G"):
+                    self.write("form:data real,32")
+                    self.write("form:bord swap")  # little endian
+                    if "REAL" in self.query("form:data?").upper():
+                        self.data_dtype = numpy.dtype("<f4")
+                elif self.series in ("2600",):
+                    self.write("format.data = format.REAL64")
+                    self.write("format.byteorder = format.LITTLEENDIAN")
+                    self.data_dtype = numpy.dtype("<f8")
+                    self.write("printnumber(1.5)")
+                    if list(self.read_numbers(1)) != [1.5]:
+                        self.data_dtype = None
+            except Exception as e:
+                self.lg.debug(f"Binary data format setup failed: {repr(e)}")
+                self.data_dtype = None
+            if self.data_dtype is None:
+                self.lg.debug("Falling back to ASCII reading transfers")
+                self.hard_input_buffer_reset()
+                if self.series in ("2400", "2400G"):
+                    self.write("form:data asc")
+                elif self.series in ("2600",):
+                    self.write("format.data = format.ASCII")
+        self.lg.debug(f"Reading transfer format: {self.data_dtype or 'ASCII'}")
+
+    def read_numbers(self, n: int) -> numpy.ndarray:
+        """reads n numbers (a binary block or an ASCII list, whichever comes) from the instrument"""
+        if not self.ser:
+            raise RuntimeError("smu comms not set up")
+        return self.drive(self.numbers_reader(n))
+
+    def numbers_reader(self, n: int) -> typing.Generator[int | bytes, bytes, numpy.ndarray]:
+        """
+        read_numbers without the reading: yields what it wants next (a number of bytes, or the bytes to read up to and including)
+        gets sent what was read and returns the numbers, so the same parsing serves blocking comms (drive()) and asyncio (see aio.py)
+        """
+        head = yield 1
+        if head == b"#":  # binary block
+            if self.data_dtype is None:
+                raise ValueError("Got binary readings without binary format setup")
+            n_digits = int((yield 1))
+            if n_digits == 0:  # 2600 style, the length is implied
+                n_bytes = n * self.data_dtype.itemsize
+            else:  # IEEE 488.2 definite length
+                n_bytes = int((yield n_digits))
+            payload = yield n_bytes
+            if len(payload) != n_bytes:
+                raise ValueError(f"Short binary read: {len(payload)} of {n_bytes} bytes")
+            yield self.__read_term_bytes
+            ret = numpy.frombuffer(payload, dtype=self.data_dtype).astype(float)
+        else:
+            ret = readings.parse((head + (yield self.__read_term_bytes)).removesuffix(self.__read_term_bytes))
+        return ret
+
+    def drive(self, reader: typing.Generator[int | bytes, bytes, typing.Any]) -> typing.Any:
+        """runs a reader (like numbers_reader()) on the blocking comms and returns what it returns"""
+        try:
+            want = next(reader)
+            while True:
+                if isinstance(want, bytes):
+                    want = reader.send(self.ser.read_until(want))
+                else:
+                    want = reader.send(self.ser.read(want))
+        except StopIteration as stop:
+            return stop.value
+
     def read(self) -> str:
         if not self.ser:
             raise RuntimeError("smu comms not set up")
         return self.ser.read_until(self.__read_term_bytes).decode().removesuffix(self.__read_term_str)
 
-    def write(self, cmd:str):
+    def write(self, cmd:str, force:bool=False):
+        """sends cmd (or queues it while batching), unless it'd set something to what it already is and isn't forced"""
+        if not self.shadow.needed(cmd, force=force):
+            return
+        if self._batch is not None:
+            self._batch.append(cmd)
+        else:
+            self.send(cmd)
+
+    def send(self, cmd:str):
+        """writes a line to the instrument right away, batch or no batch"""
         if not self.ser:
             raise RuntimeError("smu comms not set up")
         cmd_bytes = len(cmd)
-        self.cts()
-        bytes_written = self.ser.write(cmd.encode() + self.__write_term_bytes)
-        if bytes_written is None:
-            raise ValueError("Write failure.")
-        elif cmd_bytes != (bytes_written - self.__write_term_len):
-            raise ValueError(f"Write failure: {bytes_written - self.write_term_len} != {cmd_bytes}")
+        try:
+            with self.comms_lock:
+                self.cts()
+                bytes_written = self.ser.write(cmd.encode() + self.__write_term_bytes)
+            if bytes_written is None:
+                raise ValueError("Write failure.")
+            elif cmd_bytes != (bytes_written - self.__write_term_len):
+                raise ValueError(f"Write failure: {bytes_written - self.write_term_len} != {cmd_bytes}")
+        except Exception:
+            self.shadow.invalidate()  # no telling what made it through
+            raise
 
     def query(self, question: str) -> str:
-        self.write(question)
-        return self.read()
+        with self.comms_lock:
+            if self._batch:
+                self.send_batch()  # everything before the question has to go first
+            self.send(question)
+            return self.read()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        coalesces the writes made in this context, they go out at the end joined into as few lines as possible
+        followed by a single *OPC?/error check for the lot (so opc() calls in here cost nothing)
+        queries still work in here, they send whatever's waiting first
+        """
+        if self._batch is not None:  # the outermost batch does the sending
+            yield
+            return
+        self._batch = []
+        try:
+            yield
+            with self.comms_lock:  # the check's reply is ours
+                self.send_batch(check=True)
+        except Exception:
+            self.shadow.invalidate()  # some of what's in the shadow never got sent
+            raise
+        finally:
+            self._batch = None
+
+    def send_batch(self, check: bool = False):
+        """sends the batched writes, with check the last line also asks for *OPC? and the first queued error"""
+        assert self._batch is not None, "not batching"
+        cmds, self._batch = self._batch, []
+        if self.series == "2600":
+            sep = "; "
+            if check:
+                cmds = cmds + ["waitcomplete()", "print(errorqueue.count)"]
+        else:
+            sep = ";"
+            cmds = [cmd if cmd.startswith((":", "*")) else f":{cmd}" for cmd in cmds]  # from the root, not the previous command's subsystem
+            if check:
+                cmds = cmds + ["*OPC?", ":syst:err?"]
+        line = ""
+        for cmd in cmds:
+            if line and (len(line) + len(sep) + len(cmd) > self.batch_max_len):
+                self.send(line)
+                line = cmd
+            elif line:
+                line = line + sep + cmd
+            else:
+                line = cmd
+        if line:
+            self.send(line)
+        if check:
+            reply = self.read()
+            if self.series == "2600":
+                n_errors = int(float(reply))
+                if n_errors:
+                    self.shadow.invalidate()
+                    errors = [self.query("print(errorqueue.next())").replace("\t", " ") for i in range(n_errors)]  # takes them off the queue so later batches start clean
+                    self.lg.warning(f"Error(s) after batched commands: {'; '.join(errors)}")
+            else:
+                opc_val, _, error = reply.partition(";")
+                if opc_val != "1":
+                    self.lg.debug(f"*OPC? gave: {opc_val}")
+                if not error.startswith(("0,", "+0,")):
+                    self.shadow.invalidate()
+                    self.lg.warning(f"Error after batched commands: {error}")
 
     def opc(self) -> bool:
         """asks the hardware to finish whatever it's doing then send a 1"""
+        if self._batch is not None:
+            return True  # the batch's check does this
         retries = 5
         ret: bool = False
         opc_val = None
@@ -507,6 +845,7 @@ class k2xxx(object):
 
     def hardware_reset(self):
         """attempt to stop everything and put the hardware into a known baseline state"""
+        self.shadow.invalidate()
         try:
             self.opc()
         except:
@@ -627,9 +966,36 @@ class k2xxx(object):
             pass
 
     def disconnect(self):
+        """do our best to close down and clean up the instrument, just our channel of it while another channel's still using the comms"""
+        with SharedComms.claim(self.address):
+            if not self.detach():
+                self.disconnect_alone()
+
+    def detach(self) -> bool:
+        """leaves comms that drivers for other channels are still using, with our channel switched off. False when nobody else is using them"""
+        link, self.link = self.link, None
+        if (link is None) or (not link.leave(self)):
+            return False
+        with self.comms_lock:
+            try:
+                self.write(f"{self.smu}.source.output = {self.smu}.OUTPUT_OFF")
+                self.write(f"{self.smu}.reset()")
+                self.opc()
+            except Exception as e:
+                self.lg.debug(f"Issue switching channel {self.channel} off: {e}")
+        self.comms_lock = threading.RLock()
+        self.connected = False
+        self.timing.save()
+        return True
+
+    def disconnect_alone(self):
         """do our best to close down and clean up the instrument"""
 
         self.hardware_reset()
+        try:
+            clean = bool(self.ser) and self.ser.is_open and self.opc()  # the instrument's still with us after all that
+        except Exception:
+            clean = False
 
         # going local this way is only possible from rs232 on an og 2400
         # so we won't do that
@@ -665,6 +1031,10 @@ class k2xxx(object):
         else:
             self.connected = False
 
+        if self.fast_reconnect and self.idn:
+            self.sessions.closed(self.address, self.session_settings(), self.idn, clean)
+        self.timing.save()
+
     def setWires(self, two_wire=False):
         self.two_wire = two_wire  # record setting
 
@@ -673,21 +1043,13 @@ class k2xxx(object):
             if self.series in ("2400", "2400G"):
                 self.write("syst:rsen 0")
             elif self.series in ("2600",):
-                chans = ["smua"]
-                if self.model in ("2602",):
-                    chans.append("smub")
-                for chan in chans:
-                    self.write(f"{chan}.sense = {chan}.SENSE_LOCAL")
+                self.write(f"{self.smu}.sense = {self.smu}.SENSE_LOCAL")
         else:
             # four wire mode on
             if self.series in ("2400", "2400G"):
                 self.write("syst:rsen 1")  # four wire mode off
             elif self.series in ("2600",):
-                chans = ["smua"]
-                if self.model in ("2602",):
-                    chans.append("smub")
-                for chan in chans:
-                    self.write(f"{chan}.sense = {chan}.SENSE_REMOTE")
+                self.write(f"{self.smu}.sense = {self.smu}.SENSE_REMOTE")
 
     def setTerminals(self, front=False):
         if self.series in ("2400", "2400G"):
@@ -709,15 +1071,36 @@ class k2xxx(object):
     def outOn(self, on=True):
         if on:
             if self.series == "2600":
-                self.write("smua.source.output = smua.OUTPUT_ON")
+                self.write(f"{self.smu}.source.output = {self.smu}.OUTPUT_ON")
             else:
                 self.write("outp 1")
         else:
             if self.series == "2600":
-                self.write("smua.source.output = smua.OUTPUT_OFF")
+                self.write(f"{self.smu}.source.output = {self.smu}.OUTPUT_OFF")
             else:
                 self.write("outp 0")
 
+    def set_filter(self, count: int = 1):
+        """has the instrument average count readings (its repeat filter) into each one it gives, 1 for no averaging"""
+        count = int(count)
+        if not (1 <= count <= self.filter_max_count):
+            raise ValueError(f"The filter count goes from 1 to {self.filter_max_count}, not {count}")
+        if self.series == "2600":
+            if count > 1:
+                self.write(f"{self.smu}.measure.filter.type = {self.smu}.FILTER_REPEAT_AVG")
+                self.write(f"{self.smu}.measure.filter.count = {count}")
+                self.write(f"{self.smu}.measure.filter.enable = {self.smu}.FILTER_ON")
+            else:
+                self.write(f"{self.smu}.measure.filter.enable = {self.smu}.FILTER_OFF")
+        else:
+            if count > 1:
+                self.write("sens:aver:tcon rep")
+                self.write(f"sens:aver:coun {count}")
+                self.write("sens:aver on")
+            else:
+                self.write("sens:aver off")
+        self.filter_count = count
+
     def getNPLC(self):
         return float(self.query("sens:curr:nplc?"))
 
@@ -731,6 +1114,7 @@ class k2xxx(object):
         else:
             self.write("display:digits 7")
 
+    @batched
     def setupDC(self, sourceVoltage: bool = True, compliance: float = 0.04, setPoint: float = 0.0, senseRange: str = "f", ohms: str | bool = False):
         """setup DC measurement operation
         if senseRange == 'a' the instrument will auto range for both current and voltage measurements
@@ -739,6 +1123,9 @@ class k2xxx(object):
         ohms = True will use the given DC source/sense settings but include a resistance measurement in the output
         ohms = "auto" will override everything and make the output data change to (voltage,current,resistance,time,status)
         """
+        self._sweep = None
+        if self.link is not None:
+            self.link.arm(self.channel, None)
 
         if ohms == "auto":
             if self.series == "2600":
@@ -780,16 +1167,16 @@ class k2xxx(object):
                     snc = "volt"
             self.__src = src
             if self.series == "2600":
-                self.write(f"smua.source.func = smua.{src}")
-                self.write(f"smua.source.range{lvl} = {setPoint:0.8f}")
-                self.write(f"smua.source.level{lvl} = {setPoint:0.8f}")
+                self.write(f"{self.smu}.source.func = {self.smu}.{src}")
+                self.write(f"{self.smu}.source.range{lvl} = {setPoint:0.8f}")
+                self.write(f"{self.smu}.source.level{lvl} = {setPoint:0.8f}")
             else:
                 self.write(f"source:func {src}")
                 self.write(f"source:{src}:mode fixed")
                 self.write(f"source:{src} {setPoint:0.8f}")
 
             if self.series == "2600":
-                self.write("smua.source.delay = smua.DELAY_AUTO")
+                self.write(f"{self.smu}.source.delay = {self.smu}.DELAY_AUTO")
             else:
                 self.write("source:delay:auto on")
 
@@ -802,7 +1189,7 @@ class k2xxx(object):
                 if self.series != "2600":
                     self.write(f'sens:func "{snc}"')
             if self.series == "2600":
-                self.write(f"smua.source.limit{limit} = {compliance:0.8f}")
+                self.write(f"{self.smu}.source.limit{limit} = {compliance:0.8f}")
             else:
                 self.write(f"sens:{snc}:prot {compliance:0.8f}")
 
@@ -815,18 +1202,18 @@ class k2xxx(object):
                     self.write(f"sens:{snc}:protection:rsynchronize on")
             elif senseRange == "a":
                 if self.series == "2600":
-                    self.write(f"smua.measure.autorange{limit} = smua.AUTORANGE_ON")
+                    self.write(f"{self.smu}.measure.autorange{limit} = {self.smu}.AUTORANGE_ON")
                 else:
                     self.write(f"sens:{snc}:range:auto on")
             else:
                 if self.series == "2600":
-                    self.write(f"smua.measure.range{limit} = {senseRange:0.8f}")
+                    self.write(f"{self.smu}.measure.range{limit} = {senseRange:0.8f}")
                 else:
                     self.write(f"sens:{snc}:range {senseRange:0.8f}")
 
             if self.series != "2600":
                 # this again is to make sure the sense range gets updated
-                self.write(f"sens:{snc}:protection {compliance:0.8f}")
+                self.write(f"sens:{snc}:protection {compliance:0.8f}", force=True)
 
             # always auto range ohms
             if ohms:
@@ -838,27 +1225,30 @@ class k2xxx(object):
         self.do_r = ohms
         self.outOn()
         if self.series == "2600":
-            self.write("smua.measure.count = 1")
+            self.write(f"{self.smu}.measure.count = 1")
         else:
             self.write("trigger:count 1")
 
         self.do_azer()
 
-    def setupSweep(self, sourceVoltage: bool = True, compliance: float = 0.04, nPoints: int = 101, stepDelay: float = -1, start: float = 0.0, end: float = 1.0, senseRange: str = "f"):
+    @batched
+    def setupSweep(self, sourceVoltage: bool = True, compliance: float = 0.04, nPoints: int = 101, stepDelay: float = -1, start: float = 0.0, end: float = 1.0, senseRange: str = "f", levels: list[float] | None = None):
         """setup for a sweep operation
         if senseRange == 'a' the instrument will auto range for both current and voltage measurements
         if senseRange == 'f' then the sense range will follow the compliance setting
         if stepDelay < 0 then step delay is on auto (~5ms), otherwise it's set to the value here (in seconds)
+        if levels is given, it's a list sweep through those source values in order (start, end and nPoints then come from levels)
         """
         assert self.ser, "smu comms not set up"
 
-        nplc = self.getNPLC()
-        ln_freq = 50  # assume 50Hz line freq just because that's safer for timing
-        n_types = 2  # we measure both V and I
-        adc_conversion_time = (ln_freq * nplc) * n_types
-        adc_conversion_time_ms = adc_conversion_time * 1000
-        t_overhead_ms = 3  # worst case overhead in SDM cycle (see 2400 manual A-7, page 513)
-        sdm_period_baseline = adc_conversion_time_ms + t_overhead_ms
+        if levels is not None:
+            levels = [float(level) for level in levels]
+            if not (0 < len(levels) <= self.list_max_points):
+                raise ValueError(f"A list sweep takes 1 to {self.list_max_points} levels, not {len(levels)}")
+            start = levels[0]
+            end = levels[-1]
+            nPoints = len(levels)
+        sweep_key = self.sweep_key(stepDelay, senseRange, levels is not None)
 
         if sourceVoltage:
             src = "volt"
@@ -866,73 +1256,117 @@ class k2xxx(object):
         else:
             src = "curr"
             snc = "volt"
-        self.__src = src
-        self.write(f"sour:func {src}")
-        self.write(f"sour:{src} {start:0.8f}")
-
-        # seems to do exactly nothing
-        # if snc == 'current':
-        #  holdoff_delay = 0.005
-        #  sm.write(':sense:current:range:holdoff on')
-        #  sm.write(':sense:current:range:holdoff {:.6f}'.format(holdoff_delay))
-        #  self.opc()  # needed to prevent input buffer overrun with serial comms (should be taken care of by flowcontrol!)
-
-        self.write(f"sens:{snc}:prot {compliance:0.8f}")
-
-        if senseRange == "f":
-            self.write(f"sens:{snc}:range:auto 0")
-            self.write(f"sens:{snc}:prot:rsyn 1")
-        elif senseRange == "a":
-            self.write(f"sens:{snc}:range:auto on")
+
+        if self.series == "2600":
+            # the instrument runs the whole sweep from a script when measure() asks for it (see tsp.py)
+            if senseRange == "f":
+                senseRange = "a"  # the 2600 setup can't follow the compliance, autorange instead
+            self.setupDC(sourceVoltage=sourceVoltage, compliance=compliance, setPoint=start, senseRange=senseRange)
+            if levels is None:
+                self._sweep = ("sweep", (sourceVoltage, start, end, nPoints, max(stepDelay, 0)), nPoints)
+            else:
+                self._sweep = ("list", (sourceVoltage, levels, max(stepDelay, 0)), nPoints)
         else:
-            self.write(f"sens:{snc}:range {senseRange:0.8f}")
+            self.__src = src
+            self.write(f"sour:func {src}")
+            self.write(f"sour:{src} {start:0.8f}")
 
-        # this again is to make sure the sense range gets updated
-        self.write(f"sens:{snc}:prot {compliance:0.8f}")
+            # seems to do exactly nothing
+            # if snc == 'current':
+            #  holdoff_delay = 0.005
+            #  sm.write(':sense:current:range:holdoff on')
+            #  sm.write(':sense:current:range:holdoff {:.6f}'.format(holdoff_delay))
+            #  self.opc()  # needed to prevent input buffer overrun with serial comms (should be taken care of by flowcontrol!)
 
-        self.outOn()
-        self.write(f"sour:{src}:mode sweep")
-        self.write("sour:sweep:spacing linear")
-        if stepDelay < 0:
-            # this just sets delay to 1ms (probably. the actual delay is in table 3-4, page 97, 3-13 of the k2400 manual)
-            self.write("sour:delay:auto 1")
-            sdm_delay_ms = 3  # worst case
-        else:
-            self.write("sour:delay:auto 0")
-            self.write(f"sour:delay {stepDelay:0.6f}")  # this value is in seconds!
-            sdm_delay_ms = stepDelay * 1000
-
-        self.write(f"trigger:count {nPoints}")
-        self.write(f"sour:sweep:points {nPoints}")
-        self.write(f"sour:{src}:start {start:0.8f}")
-        self.write(f"sour:{src}:stop {end:0.8f}")
-        self.opc()
-
-        # relax the timeout since the above can take a bit longer to process
-        self.ser.timeout = 5
-        if sourceVoltage:
-            self.dV = abs(float(self.query("sour:volt:step?")))
-        else:
-            self.dI = abs(float(self.query("sour:curr:step?")))
-        self.ser.timeout = self.timeout  # restore default timeout
-        # sm.write(':source:{:s}:range {:.4f}'.format(src,max(start,end)))
-        self.write("sour:sweep:ranging best")
-        # sm.write(':sense:{:s}:range:auto off'.format(snc))
+            self.write(f"sens:{snc}:prot {compliance:0.8f}")
+
+            if senseRange == "f":
+                self.write(f"sens:{snc}:range:auto 0")
+                self.write(f"sens:{snc}:prot:rsyn 1")
+            elif senseRange == "a":
+                self.write(f"sens:{snc}:range:auto on")
+            else:
+                self.write(f"sens:{snc}:range {senseRange:0.8f}")
+
+            # this again is to make sure the sense range gets updated
+            self.write(f"sens:{snc}:prot {compliance:0.8f}", force=True)
+
+            self.outOn()
+            if levels is None:
+                self.write(f"sour:{src}:mode sweep")
+                self.write("sour:sweep:spacing linear")
+            else:
+                self.write(f"sour:{src}:mode list")
+                self.write(f"sour:list:{src} {','.join(f'{level:0.6f}' for level in levels)}")
+            if stepDelay < 0:
+                # this just sets delay to 1ms (probably. the actual delay is in table 3-4, page 97, 3-13 of the k2400 manual)
+                self.write("sour:delay:auto 1")
+            else:
+                self.write("sour:delay:auto 0")
+                self.write(f"sour:delay {stepDelay:0.6f}")  # this value is in seconds!
+
+            self.write(f"trigger:count {nPoints}")
+            if levels is None:
+                self.write(f"sour:sweep:points {nPoints}")
+                self.write(f"sour:{src}:start {start:0.8f}")
+                self.write(f"sour:{src}:stop {end:0.8f}")
+            self.opc()
+
+            # sm.write(':source:{:s}:range {:.4f}'.format(src,max(start,end)))
+            self.write("sour:sweep:ranging best")
+            # sm.write(':sense:{:s}:range:auto off'.format(snc))
 
         self.do_azer()
 
-        # calculate the expected sweep duration with safety margin
-        to_fudge_margin = 1.2  # give the sweep an extra 20 per cent in case our calcs are slightly off
-        max_sweep_duration_ms = nPoints * (sdm_delay_ms + sdm_period_baseline) * to_fudge_margin  # [ms]
+        # the instrument's linear sweep step (the mean step of a list sweep), worked out here rather than asked for with sour:{src}:step? to keep the batch going
+        step = abs(end - start) / max(nPoints - 1, 1)
+        if sourceVoltage:
+            self.dV = step
+        else:
+            self.dI = step
+
+        # make sure long sweeps don't result in comms timeouts, without waiting ages when something's gone wrong
+        self._sweep_key = sweep_key
+        timeout = self.timing.timeout(sweep_key, nPoints)  # from how long sweeps like this have taken
+        if timeout is None:  # never seen one like it, go by the manual with plenty of room
+            to_fudge_margin = 1.2  # give the sweep an extra 20 per cent in case our calcs are slightly off
+            max_transport_time = 10  # [s] let's assume no sweep will ever take longer than 10s to transport
+            timeout = self.modelled_sweep_time(nPoints, stepDelay) * to_fudge_margin + max_transport_time
+        self._sweep_timeout = timeout
+        with self.comms_lock:  # not in the middle of another channel's read
+            self.ser.timeout = timeout  # [s]
+        if (self.link is not None) and (self._sweep is not None):
+            self.link.arm(self.channel, self.measure_shape(nPoints))
+
+    def sweep_key(self, stepDelay: float = -1, senseRange: str = "f", listed: bool = False) -> str:
+        """names the configuration a sweep's timing gets learned under"""
+        return self.timing.key(nplc=self.nplc_user_set, delay=max(stepDelay, -1), range=senseRange, list=listed, binary=self.data_dtype is not None)
+
+    def modelled_sweep_time(self, nPoints: int, stepDelay: float = -1) -> float:
+        """[s] how long a sweep should take going by the manual"""
+        ln_freq = 50  # assume 50Hz line freq just because that's safer for timing
+        n_types = 2  # we measure both V and I
+        adc_conversion_time = self.nplc_user_set / ln_freq * n_types * self.filter_count  # not getNPLC(), that'd be a round trip in the middle of the batch
+        t_overhead = 0.003  # worst case overhead in SDM cycle (see 2400 manual A-7, page 513)
+        if stepDelay >= 0:
+            sdm_delay = stepDelay
+        elif self.series == "2600":
+            sdm_delay = 0.0  # the sweep script doesn't delay
+        else:
+            sdm_delay = 0.003  # auto delay, worst case (table 3-4, page 97, 3-13 of the k2400 manual)
+        return nPoints * (sdm_delay + adc_conversion_time + t_overhead)
 
-        # make sure long sweeps don't result in comms timeouts
-        max_transport_time_ms = 10000  # [ms] let's asssetupSume no sweep will ever take longer than 10s to transport
-        self.ser.timeout = (max_sweep_duration_ms + max_transport_time_ms) / 1000  # [s]
+    def expected_sweep_time(self, nPoints: int, stepDelay: float = -1, senseRange: str = "f", listed: bool = False) -> float:
+        """[s] how long a sweep set up with these should take from trigger to readings in hand, learned when we've done one like it before"""
+        expected = self.timing.expected(self.sweep_key(stepDelay, senseRange, listed), nPoints)
+        if expected is None:
+            expected = self.modelled_sweep_time(nPoints, stepDelay)
+        return expected
 
     def do_azer(self):
         """parform autozero routine"""
         if self.series == "2600":
-            self.write("smua.measure.autozero = smua.AUTOZERO_ONCE")
+            self.write(f"{self.smu}.measure.autozero = {self.smu}.AUTOZERO_ONCE")
         else:
             self.write("syst:azer once")
         self.opc()  # ensure the instrument is ready after all this
@@ -951,22 +1385,89 @@ class k2xxx(object):
         a "measurement" is a tuple of length 4: voltage,current,time,status (or length 5: voltage,current,resistance,time,status if dc setup was done in ohms mode)
         for a prior DC setup, the list will be 1 long.
         for a prior sweep setup, the list returned will be n sweep points long
+        with the comms shared with another channel, this gets made together with its measurement when it wants one too (see channels.py)
+        """
+        if self.link is not None:
+            return self.link.measure(self, nPoints)
+        return self.measure_alone(nPoints)
+
+    def measure_alone(self, nPoints: int = 1) -> list[tuple[float, float, float, int]] | list[tuple[float, float, float, float, int]]:
+        """measure() for our channel on its own"""
+        with self.comms_lock:
+            n_numbers, fields, r = self.measure_start(nPoints)
+            return self.measure_finish(self.read_numbers(n_numbers), nPoints, fields, r)
+
+    def measure_shape(self, nPoints: int = 1) -> tuple:
+        """what a measure(nPoints) would be, channels' measurements of the same shape can be made together"""
+        if self._sweep is not None:
+            ret = ("sweep", self._sweep[2])
+        elif nPoints == 1:
+            ret = ("dc", 1)
+        else:
+            ret = ("alone", self.channel)
+        return ret
+
+    def lane(self) -> tuple[bool, list[float], float]:
+        """our part of the dual script's arguments: (source voltage?, the levels to step through, step delay [s]), no levels for a DC reading"""
+        if self._sweep is None:
+            return (True, [], 0.0)
+        script, args, _ = self._sweep
+        if script == "sweep":
+            src_v, start, end, n, dly = args
+            levels = [float(level) for level in numpy.linspace(start, end, n)]
+        else:
+            src_v, levels, dly = args
+        return (src_v, levels, dly)
+
+    def measure_together(self, peers: dict[str, "k2xxx"], points: dict[str, int]) -> dict[str, list]:
+        """
+        the measurements of both of the instrument's channels (peers, including us) in one go
+        both channels step through their levels together, so a pair of sweeps takes as long as one, and all their readings come back in one transfer
         """
+        lanes = {channel: peers[channel].lane() for channel in ("a", "b")}
+        n = max(len(levels) for _, levels, _ in lanes.values()) or 1
+        timeouts = [sm._sweep_timeout if sm._sweep is not None else sm.timeout for sm in peers.values()]
+        with self.comms_lock:
+            self.ser.timeout = None if None in timeouts else max(timeouts)
+            try:
+                t_trigger = time.perf_counter()
+                for sm in peers.values():
+                    sm._t_trigger = t_trigger
+                (src_a, levels_a, dly_a), (src_b, levels_b, dly_b) = lanes["a"], lanes["b"]
+                self.scripts.call("dual", n, src_a, levels_a, src_b, levels_b, max(dly_a, dly_b))
+                rows = self.read_numbers(n * 8).reshape(n, 8)
+                ret = {}
+                for k, channel in enumerate(("a", "b")):
+                    ret[channel] = peers[channel].measure_finish(rows[:, 4 * k : 4 * k + 4].ravel(), points[channel], 4, False)
+            finally:
+                self.ser.timeout = self.timeout
+        return ret
 
+    def measure_start(self, nPoints: int = 1) -> tuple[int, int, bool]:
+        """the first half of measure(): triggers the measurement, returns how many numbers to read back, in how many fields and whether r is wanted"""
         # figure out how many points per sample we expect
         if isinstance(self.do_r, bool) and (not self.do_r):
             pps = 4
         else:
             pps = 5
-        vals = []
         # trigger measurement
-        if self.series == "2600":
-            self.write("smua.measure.overlappediv(smua.nvbuffer1, smua.nvbuffer2)")
+        self._t_trigger = time.perf_counter()
+        if (self.series == "2600") and (self._sweep is not None):
+            script, args, _ = self._sweep
+            self.ser.timeout = self._sweep_timeout  # another channel's setupSweep might have set it since ours
+            self.scripts.call(script, *args)  # prints the lot when it's done
+        elif self.series == "2600":
+            if self.link is not None:
+                self.ser.timeout = self.timeout  # not whatever another channel's sweep left
+            self.write(f"{self.smu}.measure.overlappediv({self.smu}.nvbuffer1, {self.smu}.nvbuffer2)")
             self.write("waitcomplete()")
             #self.opc()
         else:
             self.write("read?")
-        if self.series == "2600":
+        n_rows = nPoints
+        if (self.series == "2600") and (self._sweep is not None):
+            n_rows = self._sweep[2]
+        elif self.series == "2600":
             # print(f'{self.query("printbuffer(1, 1, smua.nvbuffer1.readings, smua.nvbuffer2.readings, smua.nvbuffer1.timestamps, smua.nvbuffer1.statuses)")=}')
             # print(f'{self.query("printbuffer(1, 1, smua.nvbuffer1.measurefunctions)")=}')
             # print(f'{self.query("printbuffer(1, 1, smua.nvbuffer1.measureranges)")=}')
@@ -987,59 +1488,49 @@ class k2xxx(object):
             # print(f'{self.query("printbuffer(1, 1, smua.nvbuffer2.statuses)")=}')
             # print(f'{self.query("printbuffer(1, 1, smua.nvbuffer2.timestamps)")=}')
             #red = self.query(f"printbuffer(1, {nPoints}, smua.nvbuffer1.readings, smua.nvbuffer2.readings, smua.nvbuffer1.timestamps, smua.nvbuffer1.statuses)")
-            red = self.query(f"printbuffer(smua.nvbuffer1.n, smua.nvbuffer1.n, smua.nvbuffer1.readings, smua.nvbuffer2.readings, smua.nvbuffer1.timestamps, smua.nvbuffer1.statuses)")
+            self.write(f"printbuffer({self.smu}.nvbuffer1.n, {self.smu}.nvbuffer1.n, {self.smu}.nvbuffer2.readings, {self.smu}.nvbuffer1.readings, {self.smu}.nvbuffer1.timestamps, {self.smu}.nvbuffer1.statuses)")
+            n_rows = 1
 
             #red = self.query("print(smua.measure.iv(smua.nvbuffer1, smua.nvbuffer2))")
             #red = self.query("print(smua.measure.iv(smua.nvbuffer1, smua.nvbuffer2))")
             #printbuffer(1, 10, smua.nvbuffer1.readings)
+        if self.series == "2600":
+            fields = 4  # no r from a 2600, it gets worked out
         else:
-            red = self.read()
-        red_nums = [float(x.removesuffix("\x00")) for x in red.split(",")]
-        for i in range(nPoints):
-            line = []
-            for j in range(pps):
-                line.append(red_nums[i * pps + j])
-            line[-1] = int(line[-1])  # status is an int and it's always last
-            vals.append(tuple(line))
+            fields = pps
+        return (n_rows * fields, fields, pps == 5)
+
+    def measure_finish(self, nums: numpy.ndarray, nPoints: int, fields: int, r: bool) -> list[tuple[float, float, float, int]] | list[tuple[float, float, float, float, int]]:
+        """the second half of measure(): decodes the numbers measure_start() asked for"""
+        rec = readings.decode(nums, r=r, fields=fields)
+        self.last_readings = rec
 
         # if this was a sweep, compute how long it took
         if nPoints > 1:
-            first_element = vals[0]
-            last_element = vals[-1]
-            if pps == 4:
-                t_start = first_element[2]
-                t_end = last_element[2]
-            elif pps == 5:
-                t_start = first_element[3]
-                t_end = last_element[3]
-            else:
-                t_start = 0
-                t_end = 0
-            v_start = first_element[0]
-            v_end = last_element[0]
-            self.last_sweep_time = t_end - t_start
-            n_vals = len(vals)
-            stats_string = f"sweep duration={self.last_sweep_time:0.2f}s|mean voltage step={(v_start-v_end)/n_vals*1000:+0.2f}mV|mean sample period={self.last_sweep_time/n_vals*1000:0.0f}ms|mean sweep rate={(v_start-v_end)/self.last_sweep_time:+0.3f}V/s"
-            if self.print_sweep_deets:
-                self.lg.log(29, stats_string)
-            else:
-                self.lg.debug(stats_string)
+            self.last_sweep_time = readings.log_sweep(self.lg, rec, loud=self.print_sweep_deets)
+            if self._sweep_key:
+                self.timing.observe(self._sweep_key, len(rec), self.last_sweep_time, time.perf_counter() - self._t_trigger)
             # reset comms timeout to default value after sweep
             if self.ser:
                 self.ser.timeout = self.timeout
 
         # update the status byte
-        self.status = vals[-1][-1]
-        return vals
+        self.status = int(rec["status"][-1])
+        return rec.tolist()
 
-    def measure_until(self, t_dwell: float = float("Infinity"), n_measurements=float("Infinity"), cb=lambda x: None) -> list[tuple[float, float, float, int]] | list[tuple[float, float, float, float, int]]:
+    def measure_until(self, t_dwell: float = float("Infinity"), n_measurements=float("Infinity"), cb=lambda x: None, interval: float | None = None) -> list[tuple[float, float, float, int]] | list[tuple[float, float, float, float, int]]:
         """Makes a series of single dc measurements
         until termination conditions are met
         supports a callback after every measurement
         cb gets a single tuple every time one is generated
         returns data in the same format as the measure command does:
         a list of tuples, where each element has length 4 normally, 5 for resistance
+        with an interval (or stream_interval set) the instrument times the measurements itself, see stream()
         """
+        if interval is None:
+            interval = self.stream_interval
+        if interval is not None:
+            return self.stream(t_dwell=t_dwell, n_measurements=n_measurements, cb=cb, interval=interval)
         i = 0
         t_end = time.time() + t_dwell
         q = []
@@ -1053,6 +1544,121 @@ class k2xxx(object):
             self.lg.debug("Killed by killer")
         return q
 
+    def stream(self, t_dwell: float = float("Infinity"), n_measurements=float("Infinity"), cb=lambda x: None, interval: float = 0.0) -> list[tuple[float, float, float, int]] | list[tuple[float, float, float, float, int]]:
+        """measure_until, but with the instrument pacing the measurements
+        the source stays as setupDC left it while the instrument takes readings interval apart (24xx: trigger delay, 2600: measure interval)
+        and buffers them, we collect them in blocks of up to stream_latency long and hand each block to cb as it comes in
+        so the sample rate and the timestamps are the instrument's, not the command round trip's and the host's
+        """
+        if not self.ser:
+            raise RuntimeError("smu comms not set up")
+        if isinstance(self.do_r, bool) and (not self.do_r):
+            pps = 4
+        else:
+            pps = 5
+        line_period = 1 / 50  # assume 50Hz line freq just because that's safer for timing
+        t_reading = self.nplc_user_set * line_period * 2 * self.filter_count + 0.003  # we measure both V and I (filter_count times), plus worst case overhead
+        if self.series == "2600":
+            period = max(interval, t_reading)
+        else:
+            period = interval + t_reading
+            self.write(f"trigger:delay {interval:0.6f}")
+        block = int(min(max(self.stream_latency // period, 1), self.stream_max_points))
+
+        i = 0
+        t_end = time.time() + t_dwell
+        t_next = float("-Infinity")  # the soonest the next reading can be taken, on the instrument's clock
+        q = []
+        try:
+            while (i < n_measurements) and (time.time() < t_end) and (not self.killer.is_set()):
+                n = min(block, n_measurements - i)
+                remaining = t_end - time.time()
+                if remaining < n * period:
+                    n = max(math.ceil(remaining / period), 1)
+                n = int(n)
+                with self.comms_lock:
+                    if self.timeout is not None:
+                        self.ser.timeout = n * period * 1.2 + self.timeout  # the whole block has to get measured before it comes back
+                    if self.series == "2600":
+                        self.scripts.call("dwell", n, interval, t_next)
+                        fields = 4
+                    else:
+                        self.write(f"trigger:count {n}")
+                        self.write("read?")
+                        fields = pps
+                    rec = readings.decode(self.read_numbers(n * fields), r=(pps == 5), fields=fields)
+                    if self.series == "2600":
+                        (offset,) = self.read_numbers(1)
+                        rec["t"] += offset  # from the buffer's own timebase onto the one t_next is on
+                i += len(rec)
+                if len(rec):
+                    t_next = rec["t"][-1] + interval  # keep to the interval from one block to the next
+                self.last_readings = rec
+                chunk = rec.tolist()
+                q += chunk
+                cb(chunk)
+        finally:
+            self.ser.timeout = self.timeout
+            if self.series == "2600":
+                self.write(f"{self.smu}.measure.count = 1")
+                self.write(f"{self.smu}.measure.interval = 0")
+            else:
+                self.write("trigger:count 1")
+                self.write("trigger:delay 0")
+        if q:
+            self.status = q[-1][-1]
+        if self.killer.is_set():
+            self.lg.debug("Killed by killer")
+        return q
+
+    @property
+    def tracks_onboard(self) -> bool:
+        """whether track() can run max power point tracking on the instrument"""
+        return self.series == "2600"
+
+    def track(self, v_start: float, dv: float, t_dwell: float = float("Infinity"), cb=lambda x: None, step_delay: float = 0.0, v_limits: tuple[float, float] = (float("-Infinity"), float("Infinity"))) -> list[tuple[float, float, float, int]] | list[tuple[float, float, float, float, int]]:
+        """perturb and observe max power point tracking run by the instrument (2600 series only), for use after a voltage sourcing setupDC
+        starts at v_start [V] stepping by dv [V] (kept within v_limits), waiting step_delay [s] before each reading
+        keeps going for t_dwell or until killed, in blocks of up to stream_latency long, each block goes to cb as it comes in
+        returns data in the same format as the measure command does
+        """
+        if not self.ser:
+            raise RuntimeError("smu comms not set up")
+        if not self.tracks_onboard:
+            raise NotImplementedError(f"Onboard tracking is not supported by {self.series}")
+        if isinstance(self.do_r, bool) and (not self.do_r):
+            pps = 4
+        else:
+            pps = 5
+        line_period = 1 / 50  # assume 50Hz line freq just because that's safer for timing
+        period = step_delay + self.nplc_user_set * line_period * 2 * self.filter_count + 0.003  # we measure both V and I (filter_count times), plus worst case overhead
+        block = int(min(max(self.stream_latency // period, 1), self.stream_max_points))
+
+        v = v_start
+        p_last = float("-Infinity")  # nothing to compare the first step with
+        t_end = time.time() + t_dwell
+        q = []
+        try:
+            while (time.time() < t_end) and (not self.killer.is_set()):
+                n = max(min(block, math.ceil((t_end - time.time()) / period)), 1)
+                with self.comms_lock:
+                    if self.timeout is not None:
+                        self.ser.timeout = n * period * 1.2 + self.timeout
+                    self.scripts.call("mppt", v, dv, p_last, n, step_delay, *v_limits)
+                    rec = readings.decode(self.read_numbers(n * 4), r=(pps == 5), fields=4)
+                    v, dv, p_last = self.read_numbers(3)  # where to carry on from
+                self.last_readings = rec
+                chunk = rec.tolist()
+                q += chunk
+                cb(chunk)
+        finally:
+            self.ser.timeout = self.timeout
+        if q:
+            self.status = q[-1][-1]
+        if self.killer.is_set():
+            self.lg.debug("Killed by killer")
+        return q
+
     def enable_cc_mode(self, value: bool = True):
         """setup contact check mode"""
         if self.cc_mode == "internal":
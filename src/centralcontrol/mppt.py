@@ -1,5 +1,4 @@
 import numpy
-import time
 import random
 import typing
 import logging
@@ -8,6 +7,7 @@ from threading import Event as tEvent
 from multiprocessing.synchronize import Event as mEvent
 from centralcontrol.sourcemeter import SourcemeterAPI as smapi
 from centralcontrol.logstuff import get_logger
+from centralcontrol import clock
 
 
 class MPPT:
@@ -28,6 +28,9 @@ class MPPT:
 
     t0: float | None = None  # the time we started the mppt algorithm
 
+    # the last light curve registered (voltages, currents), kept through reset() since the next device's curve is likely similar
+    curve: tuple[numpy.ndarray, numpy.ndarray] | None = None
+
     # if we're forced to guess Voc or Vmpp, assume that vmpp is this fraction of Voc
     voc_vmpp_guess_ratio = 0.7
 
@@ -72,6 +75,7 @@ class MPPT:
         Impp = i[maxIndex]
         Tmpp = t[maxIndex]
         if light is True:  # this was from a light i-v curve
+            self.keep_curve(vector)
             self.lg.debug(f"MPPT IV curve inspector investigating new light curve params: {(Pmax, Vmpp, Impp, Voc, Isc)}")
             if (self.Pmax is None) or (Pmax > self.Pmax):
                 if self.Pmax is None:
@@ -93,13 +97,26 @@ class MPPT:
         # returns maximum power[W], Vmpp, Impp and the index
         return (Pmax, Vmpp, Impp, maxIndex)
 
+    def keep_curve(self, vector):
+        """remembers a light IV curve (raw measurements) for planning sweeps with"""
+        self.curve = (numpy.array([e[0] for e in vector]), numpy.array([e[1] for e in vector]))
+
+    def plan_sweep(self, start: float, end: float, n_points: int, uniform: float = 0.3) -> list[float] | None:
+        """
+        source voltages for a list sweep from start to end that put the points where the last light curve bends
+        (around the max power point and Voc) rather than evenly spaced, None if there's no curve to go on
+        """
+        if self.curve is None:
+            return None
+        return adaptive_levels(*self.curve, start=start, end=end, n_points=n_points, uniform=uniform)
+
     def launch_tracker(self, duration: float = 30.0, callback: typing.Callable[[list[tuple[float, float, float, int]]], None] = lambda x: None, NPLC=-1, voc_compliance=3, i_limit=0.1, extra="basic://7:10:10", area=1):
         """
         general function to call begin a max power point tracking algorithm
         duration given in seconds, optionally calling callback function on each measurement point
         """
         m = []  # list holding mppt measurements
-        self.t0 = time.time()  # start the mppt timer
+        self.t0 = clock.time()  # start the mppt timer
         self.area = area
 
         if NPLC != -1:
@@ -159,6 +176,15 @@ class MPPT:
                     raise (ValueError("MPPT configuration failure, Usage: --mppt-params basic://[degrees]:[dwell]:[sweep_delay_ms]"))
                 params = [float(f) for f in params]
                 m += self.really_dumb_tracker(duration, start_voltage=self.Vmpp, callback=callback, dAngleMax=params[0], dwell_time=params[1], sweep_delay_ms=params[2])
+        elif algo == "po":
+            if len(params) == 0:  # use defaults
+                m += self.perturb_observe(duration, start_voltage=self.Vmpp, callback=callback)
+            else:
+                params = params.split(":")
+                if len(params) != 2:
+                    raise (ValueError("MPPT configuration failure, Usage: po://[step_mV]:[delay_ms]"))
+                params = [float(f) for f in params]
+                m += self.perturb_observe(duration, start_voltage=self.Vmpp, callback=callback, dv=params[0] / 1000, delay_ms=params[1])
         elif algo == "spo":
             if len(params) == 0:  #  use defaults
                 m += self.spo(duration, callback=callback)
@@ -180,12 +206,47 @@ class MPPT:
         else:
             self.lg.debug(f"WARNING: MPPT algorithm {algo} not understood, not doing max power point tracking")
 
-        run_time = time.time() - self.t0
+        run_time = clock.time() - self.t0
         self.lg.debug("Final value seen by the max power point tracker after running for {:.1f} seconds is".format(run_time))
         if (self.Vmpp) and (self.Impp):
             self.lg.debug("{:0.4f} mW @ {:0.2f} mV and {:0.2f} mA".format(self.Vmpp * self.Impp * 1000 * -1, self.Vmpp * 1000, self.Impp * 1000))
         return (m, ssvocs)
 
+    def perturb_observe(self, duration: float, start_voltage: float, callback: typing.Callable[[list[tuple[float, float, float, int]]], None] = lambda x: None, dv: float = 0.005, delay_ms: float = 0.0):
+        """
+        perturb and observe: keeps stepping the voltage by dv, turning back whenever the power drops
+        the smu runs it itself if it can (so it goes at instrument speed), otherwise it's done from here one setpoint at a time
+        """
+        if self.quadrant_lock:
+            v_limits = (0.0001, float("Infinity"))
+        else:
+            v_limits = (float("-Infinity"), -0.0001)
+
+        if getattr(self.sm, "tracks_onboard", False):
+            q = self.sm.track(start_voltage, dv, t_dwell=duration, cb=callback, step_delay=delay_ms / 1000, v_limits=v_limits)
+        else:
+            q = []
+            w = start_voltage
+            p_last = float("-Infinity")
+            t_end = clock.time() + duration
+            while (clock.time() < t_end) and (not self.killer.is_set()):
+                v, i, tx = self.measure(w, q, delay_ms=delay_ms, callback=callback)
+                p = v * i * -1
+                if p < p_last:
+                    dv = -dv
+                p_last = p
+                w += dv
+                if not (v_limits[0] <= w <= v_limits[1]):  # hit a limit, turn back rather than sit there
+                    w = min(max(w, v_limits[0]), v_limits[1])
+                    dv = -dv
+
+        # take whatever the most recent readings were to be the mppt
+        if q:
+            self.Vmpp = q[-1][0]
+            self.Impp = q[-1][1]
+
+        return q
+
     def spo(self, duration, callback=lambda x: None):
         """just runs with a fixed start voltage"""
         self.lg.warning("spo:// does not attempt to hold maximum power point")
@@ -257,7 +318,7 @@ class MPPT:
         w = start_voltage
         m.appendleft(self.measure(w, q, delay_ms=delay_ms, callback=callback))
         # x.appendleft(w)
-        run_time = time.time() - self.t0
+        run_time = clock.time() - self.t0
 
         # we don't know too much about which way is down the gradient before we actually get started running the mppt algo here,
         # so let's seed with this initial delta value
@@ -315,7 +376,7 @@ class MPPT:
                 delta = sign(delta) * max_step
 
             # update runtime
-            run_time = time.time() - self.t0
+            run_time = clock.time() - self.t0
 
             if (run_time > jump_period) and (jump_period > 0) and (jump_percent != 0) and ((run_time - last_jump_time) > jump_period):
                 # force a perturbation if that's enabled
@@ -348,7 +409,7 @@ class MPPT:
 
         self.sm.setSource(setpoint)
         if delay_ms > 0:
-            time.sleep(delay_ms / 1000)
+            clock.sleep(delay_ms / 1000)
         measurement = self.sm.measure()
         callback(measurement)
 
@@ -402,7 +463,7 @@ class MPPT:
         Voc = self.Voc
         Isc = self.Isc
 
-        run_time = time.time() - self.t0
+        run_time = clock.time() - self.t0
         while (not self.killer.is_set()) and (run_time < duration):
             self.lg.debug("Exploring for new Mpp...")
             i_explore = numpy.array(Impp)
@@ -492,7 +553,7 @@ class MPPT:
             Impp = dq[-1][1]
             q += dq
 
-            run_time = time.time() - self.t0
+            run_time = clock.time() - self.t0
 
         if self.killer.is_set():
             self.lg.debug("Killed by killer.")
@@ -500,3 +561,39 @@ class MPPT:
         self.Impp = Impp
         self.Vmpp = Vmpp
         return q
+
+
+def adaptive_levels(v: numpy.ndarray, i: numpy.ndarray, start: float, end: float, n_points: int, uniform: float = 0.3) -> list[float]:
+    """
+    n_points voltages from start to end (both included, in that order) spaced according to the I-V curve (v, i):
+    the point density goes with how fast dI/dV changes there (as |d2I/dV2|**0.5), plus a uniform fraction so no part of the range is left bare
+    """
+    lo, hi = sorted((float(start), float(end)))
+    v, idx = numpy.unique(numpy.asarray(v, dtype=float), return_index=True)  # sorted, no repeats
+    i = numpy.asarray(i, dtype=float)[idx]
+    if (n_points < 3) or (len(v) < 4) or (hi == lo):
+        levels = numpy.linspace(start, end, n_points)
+        return levels.tolist()
+
+    grid = numpy.linspace(lo, hi, 2001)
+    ig = numpy.interp(grid, v, i)  # flat beyond the curve's ends, so no density gets put there
+    width = max(len(grid) * (v[-1] - v[0]) / (hi - lo) / len(v), 1)  # smooth over about one of the curve's point spacings to tame its noise
+    kernel = numpy.ones(int(width) | 1)
+    ig = numpy.convolve(numpy.pad(ig, len(kernel) // 2, mode="edge"), kernel / len(kernel), mode="valid")
+    bend = numpy.sqrt(numpy.abs(numpy.gradient(numpy.gradient(ig, grid), grid)))  # the density that evens out linear interpolation error between points
+
+    def cumulative(y: numpy.ndarray) -> numpy.ndarray:
+        """running trapezoid integral of y over the grid"""
+        return numpy.concatenate(([0.0], numpy.cumsum((y[1:] + y[:-1]) / 2 * numpy.diff(grid))))
+
+    total = cumulative(bend)[-1]
+    if total > 0:
+        density = uniform / (hi - lo) + (1 - uniform) * bend / total
+    else:  # a straight line, nothing to concentrate on
+        density = numpy.ones_like(grid)
+    cdf = cumulative(density)
+    cdf /= cdf[-1]
+    levels = numpy.interp(numpy.linspace(0, 1, n_points), cdf, grid)
+    if start > end:
+        levels = levels[::-1]
+    return levels.tolist()
@@ -33,14 +33,24 @@ class MQTTClient(object):
 
     client_id: str
 
+    # where log messages go. class level so that a station's worker process can move them into its namespace
+    log_topic: str = "measurement/log"
+
+    # retained status topics (one per station)
+    status_topics: list[str]
+
     mqttc: mqtt.Client
 
     lg: logging.Logger
 
     workers: list[threading.Thread]  # list of things doing work for us
 
-    def __init__(self, host="127.0.0.1", port=1883, parent_outq: None | Queue | mQueue = None, parent_inq: None | Queue = None):
+    def __init__(self, host="127.0.0.1", port=1883, parent_outq: None | Queue | mQueue = None, parent_inq: None | Queue = None, status_topics: None | list[str] = None):
         self.workers = []
+        if status_topics:
+            self.status_topics = status_topics
+        else:
+            self.status_topics = ["measurement/status"]
         if parent_outq:
             self.outq = parent_outq
         else:
@@ -92,7 +102,7 @@ class MQTTClient(object):
     def send_log_msg(self, record: logging.LogRecord):
         payload = {"level": record.levelno, "msg": record.msg}  # TODO: consider sending up the unmodified record
         # payload = record
-        self.outq.put({"topic": "measurement/log", "payload": json.dumps(payload), "qos": 2})
+        self.outq.put({"topic": self.log_topic, "payload": json.dumps(payload), "qos": 2})
 
     def on_message(self, client: mqtt.Client, userdata: typing.Any, msg: mqtt.MQTTMessage):
         """The callback for when a message appears in a channel we're subscribed to"""
@@ -106,7 +116,9 @@ class MQTTClient(object):
         self.lg.debug(f"mqtt_server connected to broker with result code {rc}")
         client.subscribe("measurement/#", qos=2)  # for measurement messages
         client.subscribe("cmd/#", qos=2)  # for utility messages
-        client.publish("measurement/status", json.dumps("Ready"), qos=2, retain=True)
+        client.subscribe("station/#", qos=2)  # for messages to a named station
+        for status_topic in self.status_topics:
+            client.publish(status_topic, json.dumps("Ready"), qos=2, retain=True)
 
     # when client disconnects from broker
     def on_disconnect(self, client: mqtt.Client, userdata, rc):
@@ -155,7 +167,8 @@ class MQTTClient(object):
         """disconnects from the message broker"""
 
         # sticky an offline message in the status channel. blocking send because we're about to shut down
-        self.mqttc.publish("measurement/status", json.dumps("Offline"), qos=2, retain=True).wait_for_publish()
+        for status_topic in self.status_topics:
+            self.mqttc.publish(status_topic, json.dumps("Offline"), qos=2, retain=True).wait_for_publish()
 
         # ask the out_relay to stop
         self.outq.put("die")
@@ -0,0 +1,162 @@
+"""
+a population of simulated solar cells for the virtual smus
+every device gets its own (seeded, reproducible) model parameters plus slow drift, light soaking, ion migration style hysteresis and the occasional fault
+"""
+
+import json
+import threading
+import zlib
+
+import numpy
+
+
+class DevicePopulation(object):
+    """
+    per-device model parameters and their evolution in time, stored as arrays so whole populations can be evolved at once
+    a device's parameters depend only on the seed and its key, not on the order devices get measured in
+    """
+
+    # parameter distributions
+    Iphd: tuple[float, float] = (23, 0.05)  # photocurrent density [mA/cm^2], (mean, relative standard deviation)
+    I0d: tuple[float, float] = (1e-12, 1.0)  # dark current density [mA/cm^2], (median, log-normal sigma)
+    n: tuple[float, float] = (1.3, 0.05)  # ideality factor, (mean, standard deviation)
+    Rsa: tuple[float, float] = (1.8, 0.3)  # arial series resistance [ohm*cm^2], (median, log-normal sigma)
+    Rsha: tuple[float, float] = (8e2, 0.5)  # arial shunt resistance [ohm*cm^2], (median, log-normal sigma)
+    iph_drift: tuple[float, float] = (-0.02, 0.01)  # photocurrent drift [fraction/hour], (mean, standard deviation)
+    rs_drift: tuple[float, float] = (0.05, 0.5)  # series resistance growth [fraction/hour], (median, log-normal sigma)
+    soak_gain: tuple[float, float] = (0.0, 0.1)  # photocurrent gain from light soaking, (min, max)
+    soak_tau: tuple[float, float] = (60, 0.5)  # light soaking time constant [s], (median, log-normal sigma)
+    hysteresis: tuple[float, float] = (0.0, 0.05)  # photocurrent change per volt of ion displacement [1/V], (min, max)
+    ion_tau: tuple[float, float] = (5, 0.5)  # ion migration time constant [s], (median, log-normal sigma)
+    p_open: float = 0.02  # probability of an open circuit device
+    p_short: float = 0.02  # probability of a shorted device
+    open_ohms: float = 1e9  # what an open circuit device looks like
+    short_ohms: float = 0.5  # what a shorted device looks like
+
+    # fault kinds
+    OK = 0
+    OPEN = 1
+    SHORT = 2
+
+    def __init__(self, seed: int = 0, **kwargs):
+        self.seed = seed
+        for key, val in kwargs.items():
+            if not hasattr(self, key):
+                raise ValueError(f"Unknown device population setting: {key}")
+            if isinstance(val, list):
+                val = tuple(val)  # from json
+            setattr(self, key, val)
+
+        self.keys: dict[str, int] = {}  # device key --> index into the arrays
+        names = ["Iphd", "I0d", "n", "Rsa", "Rsha", "iph_drift", "rs_drift", "soak_gain", "soak_tau", "hysteresis", "ion_tau", "t0", "t_last", "lit_time", "Vm", "V"]
+        self.p = {name: numpy.empty(0) for name in names}
+        self.fault = numpy.empty(0, dtype=int)
+        self.lock = threading.RLock()  # smus measure from their own threads
+
+    def draw(self, key: str) -> tuple[dict[str, float], int]:
+        """this device's model parameters"""
+        rng = numpy.random.default_rng([self.seed, zlib.crc32(key.encode())])
+        d = {}
+        d["Iphd"] = self.Iphd[0] * (1 + self.Iphd[1] * rng.standard_normal())
+        d["I0d"] = self.I0d[0] * numpy.exp(self.I0d[1] * rng.standard_normal())
+        d["n"] = max(1.0, self.n[0] + self.n[1] * rng.standard_normal())
+        d["Rsa"] = self.Rsa[0] * numpy.exp(self.Rsa[1] * rng.standard_normal())
+        d["Rsha"] = self.Rsha[0] * numpy.exp(self.Rsha[1] * rng.standard_normal())
+        d["iph_drift"] = self.iph_drift[0] + self.iph_drift[1] * rng.standard_normal()
+        d["rs_drift"] = self.rs_drift[0] * numpy.exp(self.rs_drift[1] * rng.standard_normal())
+        d["soak_gain"] = rng.uniform(*self.soak_gain)
+        d["soak_tau"] = self.soak_tau[0] * numpy.exp(self.soak_tau[1] * rng.standard_normal())
+        d["hysteresis"] = rng.uniform(*self.hysteresis)
+        d["ion_tau"] = self.ion_tau[0] * numpy.exp(self.ion_tau[1] * rng.standard_normal())
+        r = rng.uniform()
+        if r < self.p_open:
+            fault = self.OPEN
+        elif r < self.p_open + self.p_short:
+            fault = self.SHORT
+        else:
+            fault = self.OK
+        return (d, fault)
+
+    def add(self, keys: list[str], t: float) -> numpy.ndarray:
+        """makes sure these devices exist (born at time t if they're new), returns their indices"""
+        with self.lock:
+            new = [key for key in dict.fromkeys(keys) if key not in self.keys]
+            if new:
+                draws = [self.draw(key) for key in new]
+                for name in self.p:
+                    if name in draws[0][0]:
+                        col = [d[name] for d, fault in draws]
+                    elif name in ("t0", "t_last"):
+                        col = [t] * len(new)
+                    else:  # lit_time, Vm, V
+                        col = [0.0] * len(new)
+                    self.p[name] = numpy.append(self.p[name], col)
+                self.fault = numpy.append(self.fault, [fault for d, fault in draws])
+                for key in new:
+                    self.keys[key] = len(self.keys)
+            return numpy.array([self.keys[key] for key in keys], dtype=int)
+
+    def step(self, idx: numpy.ndarray, t: float, V: numpy.ndarray | float | None, lit: numpy.ndarray | bool):
+        """advances these devices to time t (held at their previous bias, light on or off, since they were last stepped) then biases them at V (None for no change)"""
+        with self.lock:
+            p = self.p
+            dt = numpy.maximum(t - p["t_last"][idx], 0)
+            p["lit_time"][idx] += dt * lit
+            a = numpy.exp(-dt / p["ion_tau"][idx])
+            p["Vm"][idx] = p["V"][idx] + (p["Vm"][idx] - p["V"][idx]) * a  # ions relax toward the bias they were held at
+            if V is not None:
+                p["V"][idx] = V
+            p["t_last"][idx] = t
+
+    def trace(self, i: int, t: float, V: numpy.ndarray, dt: float, lit: bool) -> dict[str, numpy.ndarray]:
+        """steps device i through the bias points V, dt apart starting at t, returns its parameters at each point"""
+        with self.lock:
+            p = self.p
+            self.step(numpy.array([i]), t, V[0], lit)  # catch up to the first point
+            n_points = len(V)
+            a = numpy.exp(-dt / p["ion_tau"][i])
+            Vm = numpy.empty(n_points)
+            vm = Vm[0] = p["Vm"][i]
+            for k in range(1, n_points):  # a tiny linear filter, but a recursive one
+                vm = V[k - 1] + (vm - V[k - 1]) * a
+                Vm[k] = vm
+            times = t + dt * numpy.arange(n_points)
+            lit_time = p["lit_time"][i] + dt * numpy.arange(n_points) * lit
+            p["Vm"][i] = Vm[-1]
+            p["V"][i] = V[-1]
+            p["lit_time"][i] = lit_time[-1]
+            p["t_last"][i] = times[-1]
+            return self.parameters(numpy.full(n_points, i), times, V, Vm, lit_time)
+
+    def parameters(self, idx: numpy.ndarray, t: numpy.ndarray | float, V: numpy.ndarray | None = None, Vm: numpy.ndarray | None = None, lit_time: numpy.ndarray | None = None) -> dict[str, numpy.ndarray]:
+        """model parameters of these devices at time t, by default in the state they were last stepped to"""
+        with self.lock:
+            p = self.p
+            if V is None:
+                V = p["V"][idx]
+            if Vm is None:
+                Vm = p["Vm"][idx]
+            if lit_time is None:
+                lit_time = p["lit_time"][idx]
+            hours = (t - p["t0"][idx]) / 3600
+            ret = {}
+            soak = 1 + p["soak_gain"][idx] * (1 - numpy.exp(-lit_time / p["soak_tau"][idx]))
+            ions = 1 + p["hysteresis"][idx] * (Vm - V)  # ions still arranged for a higher bias help extraction
+            ret["Iphd"] = p["Iphd"][idx] * numpy.maximum(1 + p["iph_drift"][idx] * hours, 0) * soak * numpy.maximum(ions, 0)
+            ret["Rsa"] = p["Rsa"][idx] * (1 + p["rs_drift"][idx] * hours)
+            ret["I0d"] = p["I0d"][idx]
+            ret["n"] = p["n"][idx]
+            ret["Rsha"] = p["Rsha"][idx]
+            ret["fault"] = self.fault[idx]
+            return ret
+
+
+_populations: dict[str, DevicePopulation] = {}
+
+
+def get(cfg: dict) -> DevicePopulation:
+    """the population described by cfg, shared by everything in this process that asks for the same one"""
+    key = json.dumps(cfg, sort_keys=True)
+    if key not in _populations:
+        _populations[key] = DevicePopulation(**cfg)
+    return _populations[key]
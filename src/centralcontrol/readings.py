@@ -0,0 +1,150 @@
+"""
+decoding smu readings
+turns what the smus send back into numpy structured arrays (one row per reading, fields v, i, [r,] t, status) in one vectorised go
+"""
+
+import functools
+import logging
+
+import numpy
+
+FIELDS = ("v", "i", "t", "status")  # the normal layout
+FIELDS_R = ("v", "i", "r", "t", "status")  # the resistance mode layout
+# how a block of readings can be combined into one (see aggregate())
+STATS = {"mean": numpy.mean, "median": numpy.median, "min": numpy.min, "max": numpy.max, "std": numpy.std}
+
+
+@functools.cache
+def dtype(r: bool = False) -> numpy.dtype:
+    """the record dtype for readings, with a resistance field or without"""
+    names = FIELDS_R if r else FIELDS
+    return numpy.dtype([(name, numpy.int64 if name == "status" else numpy.float64) for name in names])
+
+
+def parse(raw: bytes | str) -> numpy.ndarray:
+    """a comma separated ASCII list of numbers --> a float array"""
+    if isinstance(raw, str):
+        raw = raw.encode()
+    raw = raw.replace(b"\x00", b"").strip()
+    if not raw:
+        return numpy.empty(0)
+    return numpy.array(raw.split(b","), dtype=float)
+
+
+def decode(raw: bytes | str | numpy.ndarray, r: bool = False, fields: int | None = None, t_div: float = 1.0) -> numpy.ndarray:
+    """
+    raw readings --> a structured array with fields v, i, [r,] t, status
+    raw is either the smu's comma separated ASCII response or the numbers already parsed out of it (e.g. from a binary transfer),
+    consisting of rows of fields numbers: v, i, t, status (or v, i, r, t, status)
+    fields defaults to 5 if r else 4, when r is wanted but the smu only sends 4 fields, r is derived as v/i
+    times get divided by t_div (e.g. 1000 for smus that report them in ms)
+    """
+    if fields is None:
+        fields = 5 if r else 4
+    if fields not in (4, 5):
+        raise ValueError(f"Readings have 4 or 5 fields, not {fields}")
+    if isinstance(raw, (bytes, str)):
+        nums = parse(raw)
+    else:
+        nums = numpy.asarray(raw, dtype=float).ravel()
+    if len(nums) % fields:
+        raise ValueError(f"Got {len(nums)} numbers, that's not a whole number of {fields} field readings")
+    cols = nums.reshape(-1, fields)
+    ret = numpy.empty(len(cols), dtype=dtype(r))
+    ret["v"] = cols[:, 0]
+    ret["i"] = cols[:, 1]
+    if r:
+        if fields == 5:
+            ret["r"] = cols[:, 2]
+        else:
+            with numpy.errstate(divide="ignore", invalid="ignore"):
+                ret["r"] = cols[:, 0] / cols[:, 1]
+    ret["t"] = cols[:, -2] / t_div
+    ret["status"] = cols[:, -1]
+    return ret
+
+
+def aggregate(rec: numpy.ndarray, n: int, stat: str = "mean") -> numpy.ndarray:
+    """
+    readings combined n at a time (a short last block too): v, i (and r) by stat from STATS,
+    t the block's mean time and status all the block's status bits or'ed together, so a flag set on any reading stays set
+    """
+    if stat not in STATS:
+        raise ValueError(f"Readings get combined by one of {', '.join(STATS)}, not {stat}")
+    if (n <= 1) or (len(rec) == 0):
+        return rec
+    m = len(rec) // n
+    blocks = []
+    if m:
+        blocks.append(rec[: m * n].reshape(m, n))
+    if len(rec) % n:
+        blocks.append(rec[m * n :].reshape(1, -1))
+    combined = []
+    for block in blocks:
+        ret = numpy.empty(len(block), dtype=rec.dtype)
+        for name in rec.dtype.names:
+            if name == "status":
+                ret[name] = numpy.bitwise_or.reduce(block[name], axis=1)
+            elif name == "t":
+                ret[name] = block[name].mean(axis=1)
+            else:
+                ret[name] = STATS[stat](block[name], axis=1)
+        combined.append(ret)
+    return numpy.concatenate(combined)
+
+
+class Aggregator(object):
+    """
+    aggregate() for readings as they come in (like a measure_until callback gets them)
+    each time whole blocks of n are in, they're combined and handed on to cb, in the same format
+    """
+
+    def __init__(self, n: int = 1, stat: str = "mean", cb=lambda x: None):
+        if stat not in STATS:
+            raise ValueError(f"Readings get combined by one of {', '.join(STATS)}, not {stat}")
+        self.n = max(int(n), 1)
+        self.stat = stat
+        self.cb = cb
+        self.pending: list[tuple] = []  # readings waiting for the rest of their block
+        self.rows: list[tuple] = []  # everything combined so far
+
+    def add(self, data: list[tuple]):
+        self.pending += data
+        k = len(self.pending) // self.n * self.n
+        if k:
+            self.emit(self.pending[:k])
+            del self.pending[:k]
+
+    def flush(self):
+        """combines what's left over, a block short"""
+        if self.pending:
+            self.emit(self.pending)
+            self.pending = []
+
+    def emit(self, data: list[tuple]):
+        rec = numpy.array([tuple(row) for row in data], dtype=dtype(len(data[0]) == len(FIELDS_R)))
+        chunk = aggregate(rec, self.n, self.stat).tolist()
+        self.rows += chunk
+        self.cb(chunk)
+
+
+def sweep_stats(rec: numpy.ndarray) -> tuple[float, str]:
+    """how long a sweep took and a human readable summary of it"""
+    duration = float(rec["t"][-1] - rec["t"][0])
+    dv = float(rec["v"][0] - rec["v"][-1])
+    n_vals = len(rec)
+    if duration:
+        rate = f"{dv/duration:+0.3f}V/s"
+    else:
+        rate = "?V/s"
+    return (duration, f"sweep duration={duration:0.2f}s|mean voltage step={dv/n_vals*1000:+0.2f}mV|mean sample period={duration/n_vals*1000:0.0f}ms|mean sweep rate={rate}")
+
+
+def log_sweep(lg: logging.Logger, rec: numpy.ndarray, loud: bool = False) -> float:
+    """logs a sweep's stats (at level 29 if loud, else debug) and returns its duration"""
+    duration, stats_string = sweep_stats(rec)
+    if loud:
+        lg.log(29, stats_string, stacklevel=2)
+    else:
+        lg.debug(stats_string, stacklevel=2)
+    return duration
@@ -0,0 +1,92 @@
+"""
+remembering instrument sessions from one connection to the next
+an instrument's fingerprint (what it said it was, how we talked to it and whether we left it cleanly)
+lets the next connect skip the slow resets and self tests when nothing has changed
+"""
+
+import json
+import os
+import pathlib
+import threading
+import time
+
+from centralcontrol.logstuff import get_logger
+
+# where the fingerprints live unless told otherwise
+DEFAULT_PATH = pathlib.Path(os.environ.get("XDG_CACHE_HOME", pathlib.Path.home() / ".cache")) / "centralcontrol" / "sessions.json"
+
+
+def load_json(path: os.PathLike) -> dict:
+    """a JSON file's top level dict, empty when there's no such file or it holds something else"""
+    try:
+        with open(path, "r") as fh:
+            ret = json.load(fh)
+    except (OSError, ValueError):
+        ret = {}
+    if not isinstance(ret, dict):
+        ret = {}
+    return ret
+
+
+def save_json(path: pathlib.Path, data: dict):
+    """writes data to a JSON file in one go (raises OSError when that fails)"""
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(tmp, "w") as fh:
+        json.dump(data, fh, indent=1)
+    os.replace(tmp, path)  # so that nobody ever reads half a file
+
+
+class SessionStore(object):
+    """
+    the last session fingerprint of each instrument address, kept in a small JSON file
+    failing to read or write the file only ever costs us the fast path, never a connection
+    """
+
+    def __init__(self, path: str | os.PathLike | None = None, max_age: float = 7 * 24 * 60 * 60):
+        self.lg = get_logger(".".join([__name__, type(self).__name__]))
+        self.path = pathlib.Path(DEFAULT_PATH if path is None else path)
+        self.max_age = max_age  # [s] fingerprints older than this don't count
+
+    def load(self) -> dict[str, dict]:
+        """address --> fingerprint for everything in the file"""
+        return load_json(self.path)
+
+    def put(self, address: str, fingerprint: dict | None):
+        """stores (or with None, drops) an address's fingerprint"""
+        sessions = self.load()
+        if (fingerprint is None) and (address not in sessions):
+            return  # nothing to do
+        sessions.pop(address, None)
+        now = time.time()
+        sessions = {key: val for key, val in sessions.items() if isinstance(val, dict) and (now - val.get("t_disconnect", 0) <= self.max_age)}  # the stale ones are no use
+        if fingerprint is not None:
+            sessions[address] = fingerprint
+        try:
+            save_json(self.path, sessions)
+        except OSError as e:
+            self.lg.debug(f"Couldn't save session fingerprints to {self.path}: {e}")
+
+    def recall(self, address: str, settings: dict) -> dict | None:
+        """the fingerprint of the instrument at address if its last session ended cleanly, recently and with the same comms settings"""
+        fingerprint = self.load().get(address)
+        if not isinstance(fingerprint, dict):
+            return None
+        if not fingerprint.get("clean", False):
+            return None
+        if fingerprint.get("settings") != settings:
+            return None
+        if not (0 <= time.time() - fingerprint.get("t_disconnect", 0) <= self.max_age):
+            return None
+        return fingerprint
+
+    def opened(self, address: str):
+        """a session's begun, it doesn't count as clean until closed() says so"""
+        self.put(address, None)
+
+    def closed(self, address: str, settings: dict, idn: str, clean: bool):
+        """a session's over, remember how it ended"""
+        if clean:
+            self.put(address, {"idn": idn, "settings": settings, "clean": True, "t_disconnect": time.time()})
+        else:
+            self.put(address, None)
@@ -0,0 +1,75 @@
+"""
+a write-through copy of the settings we've sent to an instrument
+lets the smu drivers skip configuration writes that wouldn't change anything
+"""
+
+import re
+
+
+def canonical(header: str) -> str:
+    """SCPI header in short form, so that e.g. :SOURce:VOLTage:STARt and sour:volt:star match"""
+    nodes = []
+    for node in header.strip().lstrip(":").lower().split(":"):
+        m = re.fullmatch(r"([*a-z]+)(\d*)", node)
+        if m is None:
+            nodes.append(node)
+            continue
+        word, suffix = m.groups()
+        if (len(word) > 4) and not word.startswith("*"):
+            if word[3] in "aeiou":
+                word = word[:3]
+            else:
+                word = word[:4]
+        if suffix == "1":
+            suffix = ""
+        nodes.append(word + suffix)
+    return ":".join(nodes)
+
+
+class Shadow(object):
+    """
+    what we believe an instrument's settings are, from what we've written to it
+    only the settings in shadowed are remembered, anything in invalidators makes us forget everything
+    """
+
+    def __init__(self, shadowed: frozenset[str] = frozenset(), invalidators: frozenset[str] = frozenset()):
+        self.shadowed = shadowed  # headers (SCPI short form or TSP names) of the settings worth remembering
+        self.invalidators = invalidators  # headers of commands with side effects we don't model
+        self.state: dict[str, str] = {}  # header --> the argument we last sent with it
+        self.hits = 0  # writes we skipped
+        self.misses = 0  # shadowed settings we had to send
+
+    @staticmethod
+    def split(cmd: str) -> tuple[str, str]:
+        """a command --> (header, argument)"""
+        m = re.fullmatch(r"\s*([\w.\[\]]+)\s*=\s*(.*?)\s*", cmd)
+        if m:  # a TSP assignment
+            header, arg = m.groups()
+        else:
+            header, _, arg = cmd.strip().partition(" ")
+            if ("(" not in header) and not header.endswith("?"):
+                header = canonical(header)
+        return (header, arg.strip())
+
+    def needed(self, cmd: str, force: bool = False) -> bool:
+        """whether cmd has to be sent (always, when forced), if it's a shadowed setting that's going out it gets remembered"""
+        header, arg = self.split(cmd)
+        if header in self.invalidators:
+            self.invalidate()
+            return True
+        if header.endswith("?"):
+            return True
+        if (not force) and (header in self.shadowed) and arg and (self.state.get(header) == arg):
+            self.hits += 1
+            return False
+        for key in list(self.state):  # settings along the same path (e.g. a range and its auto switch) can change each other
+            if key.startswith(header + ":") or header.startswith(key + ":"):
+                del self.state[key]
+        if (header in self.shadowed) and arg:
+            self.misses += 1
+            self.state[header] = arg
+        return True
+
+    def invalidate(self):
+        """forget everything, the instrument's settings are unknown"""
+        self.state.clear()
@@ -1,3 +1,5 @@
+import asyncio
+import math
 from typing import Callable, Type, Optional
 from threading import Event as tEvent
 from multiprocessing.synchronize import Event as mEvent
@@ -5,6 +7,9 @@ from centralcontrol.virt import FakeSMU as vsmu
 from centralcontrol.k2xxx import k2xxx
 from centralcontrol.amsmu import AmSmu
 from centralcontrol.logstuff import get_logger
+from centralcontrol.aio import AsyncSMU
+from centralcontrol import clock
+from centralcontrol import readings
 
 
 def factory(cfg: dict) -> Type["SourcemeterAPI"]:
@@ -71,6 +76,9 @@ class SourcemeterAPI(object):
     threshold_ohm: float
     voltage_limit: float = 3
     current_limit: float = 0.150
+    dwell_period: float | None = None  # [s] when set, shaped measure_until calls take a reading this often, on a fixed schedule (see measure_paced())
+    dwell_average: int = 1  # shaped measure_until calls combine this many readings into each one they give, so long dwells keep that many times less data
+    dwell_stat: str = "mean"  # how: "filter" has the instrument average them (if it can, that many), otherwise one of readings.STATS on the host
 
     # measure: Callable[[int | None], list[tuple[float, float, float, int]] | list[tuple[float, float, float, float, int]]]
     # setupSweep: Callable[[bool | None, float | None, int | None, float | None, float | None, str | None], None]
@@ -89,6 +97,16 @@ class SourcemeterAPI(object):
             self.voltage_limit = kwargs["voltage_limit"]
         if "current_limit" in kwargs:
             self.current_limit = kwargs["current_limit"]
+        if kwargs.get("dwell_period") is not None:
+            if not kwargs["dwell_period"] > 0:
+                raise ValueError(f"Invalid dwell period: {kwargs['dwell_period']}")
+            self.dwell_period = float(kwargs["dwell_period"])
+        if "dwell_average" in kwargs:
+            self.dwell_average = max(int(kwargs["dwell_average"]), 1)
+        if "dwell_stat" in kwargs:
+            if (kwargs["dwell_stat"] != "filter") and (kwargs["dwell_stat"] not in readings.STATS):
+                raise ValueError(f"Invalid dwell stat: {kwargs['dwell_stat']}")
+            self.dwell_stat = kwargs["dwell_stat"]
 
         if "address" in kwargs:
             self.lg.debug(f"SMU init phase 1: {kwargs['address']}")
@@ -102,6 +120,9 @@ class SourcemeterAPI(object):
         initargs.pop("virtual", None)
         initargs.pop("voltage_limit", None)
         initargs.pop("current_limit", None)
+        initargs.pop("dwell_period", None)
+        initargs.pop("dwell_average", None)
+        initargs.pop("dwell_stat", None)
         super(SourcemeterAPI, self).__init__(**initargs)
         return None
 
@@ -158,6 +179,96 @@ class SourcemeterAPI(object):
             compliance = min(compliance, self.voltage_limit)
         return super(SourcemeterAPI, self).setupDC(sourceVoltage=sourceVoltage, compliance=compliance, setPoint=setPoint, senseRange=senseRange, ohms=ohms)
 
+    @property
+    def dwell_shaped(self) -> bool:
+        """whether the dwell settings change what a shaped measure_until does"""
+        return (self.dwell_period is not None) or (self.dwell_average > 1)
+
+    def measure_until(self, t_dwell: float = float("Infinity"), n_measurements=float("Infinity"), cb=lambda x: None, shaped: bool = False, **kwargs) -> list[tuple[float, float, float, int]] | list[tuple[float, float, float, float, int]]:
+        """
+        measure_until, with shaped=True applying the dwell settings: a reading every dwell_period and every dwell_average readings combined into one
+        (cb and the return value get the combined readings, n_measurements counts them). only the Voc and Jsc dwells ask for that,
+        everything else (mppt, suns_voc) gets the readings as they come
+        """
+        if not (shaped and self.dwell_shaped):
+            return super(SourcemeterAPI, self).measure_until(t_dwell, n_measurements, cb, **kwargs)  # positional, the drivers name the count differently
+        if (self.dwell_period is not None) and kwargs:
+            raise ValueError(f"A paced dwell sets its own reading rate, it doesn't take {', '.join(kwargs)}")
+        on_instrument = (self.dwell_stat == "filter") and hasattr(self, "set_filter")
+        if on_instrument and (self.dwell_average > getattr(self, "filter_max_count", self.dwell_average)):
+            self.lg.debug(f"The instrument's filter can't average {self.dwell_average} readings, averaging them here instead")
+            on_instrument = False
+        if on_instrument:
+            aggregator = readings.Aggregator(1, "mean", cb)
+        else:
+            aggregator = readings.Aggregator(self.dwell_average, "mean" if self.dwell_stat == "filter" else self.dwell_stat, cb)
+        n_readings = n_measurements * aggregator.n
+        if on_instrument:
+            self.set_filter(self.dwell_average)
+        try:
+            if self.dwell_period is None:
+                super(SourcemeterAPI, self).measure_until(t_dwell, n_readings, aggregator.add, **kwargs)
+            else:
+                self.measure_paced(self.dwell_period, t_dwell, n_readings, aggregator.add)
+        finally:
+            if on_instrument:
+                self.set_filter(1)
+        aggregator.flush()
+        return aggregator.rows
+
+    def measure_paced(self, period: float, t_dwell: float = float("Infinity"), n_measurements=float("Infinity"), cb=lambda x: None) -> list[tuple[float, float, float, int]] | list[tuple[float, float, float, float, int]]:
+        """
+        single dc measurements one every period [s], on deadlines fixed from the start so the rate doesn't drift with how long each one takes
+        deadlines already gone by when a measurement finishes get skipped rather than made up for in a burst
+        """
+        t_start = clock.time()
+        t_end = t_start + t_dwell
+        k = 0  # the deadline we're on
+        i = 0
+        q = []
+        while (i < n_measurements) and (not self.killer.is_set()):
+            t_next = t_start + k * period
+            if t_next >= t_end:
+                break
+            wait = t_next - clock.time()
+            if (wait > 0) and clock.wait(self.killer, wait):
+                break
+            measurement = self.measure()
+            i += 1
+            q += measurement
+            cb(measurement)
+            k = max(k + 1, math.ceil((clock.time() - t_start) / period))
+        if self.killer.is_set():
+            self.lg.debug("Killed by killer")
+        return q
+
+    @property
+    def aio(self) -> AsyncSMU:
+        """the async side of this smu (see aio.py)"""
+        if "_aio" not in self.__dict__:
+            self._aio = AsyncSMU(self)
+        return self._aio
+
+    async def asetupDC(self, sourceVoltage: bool = True, compliance: float = 0.04, setPoint: float = 0.0, senseRange: str = "f", ohms: str | bool = False):
+        """setupDC for asyncio"""
+        return await self.aio.setupDC(sourceVoltage=sourceVoltage, compliance=compliance, setPoint=setPoint, senseRange=senseRange, ohms=ohms)
+
+    async def asetupSweep(self, **kwargs):
+        """setupSweep for asyncio"""
+        return await self.aio.setupSweep(**kwargs)
+
+    async def ameasure(self, nPoints: int = 1) -> list[tuple[float, float, float, int]] | list[tuple[float, float, float, float, int]]:
+        """measure for asyncio, the readings are waited for on the event loop where the smu allows it"""
+        return await self.aio.measure(nPoints)
+
+    async def ameasure_until(self, t_dwell: float = float("Infinity"), n_measurements=float("Infinity"), cb=lambda x: None, interval: float | None = None, shaped: bool = False) -> list[tuple[float, float, float, int]] | list[tuple[float, float, float, float, int]]:
+        """measure_until for asyncio"""
+        if shaped and self.dwell_shaped:
+            kwargs = {} if interval is None else {"interval": interval}
+            async with self.aio.lock:
+                return await asyncio.to_thread(self.measure_until, t_dwell, n_measurements, cb, shaped=True, **kwargs)
+        return await self.aio.measure_until(t_dwell=t_dwell, n_measurements=n_measurements, cb=cb, interval=interval)
+
     # TODO: add more API!
 
 
@@ -0,0 +1,67 @@
+"""a measurement station (rig) that one backend process can drive alongside others"""
+
+import concurrent.futures
+import multiprocessing
+from multiprocessing.queues import SimpleQueue as mQueue
+from multiprocessing.synchronize import Event as mEvent
+from queue import SimpleQueue as Queue
+
+
+class StationQueue(object):
+    """wraps an output queue so that everything put into it lands in a station's topic namespace"""
+
+    def __init__(self, outq: Queue | mQueue, prefix: str):
+        self.outq = outq
+        self.prefix = prefix
+
+    def put(self, msg: dict | str):
+        if isinstance(msg, dict) and ("topic" in msg):
+            msg = msg | {"topic": f"{self.prefix}{msg['topic']}"}
+        self.outq.put(msg)
+
+    def get(self):
+        return self.outq.get()
+
+
+class Station(object):
+    """
+    one measurement setup with its own worker process, kill signal and message topic namespace
+    the unnamed station uses the legacy (un-namespaced) topics so that single rig deployments keep working as before
+    """
+
+    name: str
+    pkiller: mEvent  # process killer signal
+    bc_response: mEvent  # bad connections ask blocker
+    executor: concurrent.futures.ProcessPoolExecutor | None = None
+    future: concurrent.futures.Future | None = None  # represents this station's long-running task
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.pkiller = multiprocessing.Event()
+        self.bc_response = multiprocessing.Event()
+
+    @property
+    def prefix(self) -> str:
+        """topic namespace prefix"""
+        if self.name:
+            ret = f"station/{self.name}/"
+        else:
+            ret = ""
+        return ret
+
+    @property
+    def runs_stream(self) -> str:
+        """the in-memory db stream that run requests for this station arrive on"""
+        if self.name:
+            ret = f"station:{self.name}:runs"
+        else:
+            ret = "runs"
+        return ret
+
+    def topic(self, topic: str) -> str:
+        """puts a topic into this station's namespace"""
+        return f"{self.prefix}{topic}"
+
+    @property
+    def busy(self) -> bool:
+        return (self.future is not None) and self.future.running()
@@ -0,0 +1,148 @@
+"""
+a plain TCP connection to a LAN instrument that looks enough like a pyserial one for the smu drivers
+pyserial's socket:// handler reads a byte (and does a select) at a time in read_until(),
+this one takes whatever has arrived in one recv_into() and searches it for the terminator in one go
+"""
+
+import select
+import socket
+import time
+import urllib.parse
+
+
+class TcpTransport(object):
+    """the parts of the pyserial Serial interface the smu drivers use, over a TCP socket with Nagle off"""
+
+    rtscts = False  # there's no flow control to do
+    xonxoff = False
+    cts = True  # so waits for it end right away
+    chunk_size = 65536  # [bytes] the receive buffer starts this big (it grows for bigger responses)
+    connect_timeout = 5.0  # [s] used when there's no timeout
+
+    def __init__(self, address: str, timeout: float | None = None, write_timeout: float | None = None, **kwargs):
+        """address is socket://host:port (like pyserial takes), serial port settings in kwargs mean nothing here and get ignored"""
+        url = urllib.parse.urlsplit(address)
+        if (url.scheme != "socket") or (url.hostname is None) or (url.port is None):
+            raise ValueError(f"Expected socket://host:port, not {address}")
+        self.port = f"{url.hostname}:{url.port}"
+        self._timeout = timeout
+        self.write_timeout = write_timeout
+        self._buf = bytearray(self.chunk_size)  # received bytes live in _buf[_head:_tail]
+        self._head = 0
+        self._tail = 0
+        self._socket = socket.create_connection((url.hostname, url.port), timeout=self.connect_timeout if timeout is None else timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # commands are small and we wait on every reply
+        self._socket.settimeout(write_timeout)  # only sends block on the socket, reads wait in select()
+        self.is_open = True
+
+    @property
+    def timeout(self) -> float | None:
+        """[s] how long a read waits for its data (None forever)"""
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value: float | None):
+        self._timeout = value
+
+    def fileno(self) -> int:
+        return self._socket.fileno()
+
+    @property
+    def in_waiting(self) -> int:
+        """number of bytes that can be read right away"""
+        self._fill(0)
+        return self._tail - self._head
+
+    def _fill(self, wait: float | None) -> bool:
+        """waits up to wait [s] (None forever) for more bytes and appends them to the buffer, False if none came"""
+        if not self.is_open:
+            raise ConnectionError("Connection is closed")
+        ready, _, _ = select.select([self._socket], [], [], wait)
+        if not ready:
+            return False
+        if self._tail == len(self._buf):  # out of room at the end
+            if self._head:  # move what we have to the front
+                n = self._tail - self._head
+                self._buf[:n] = self._buf[self._head : self._tail]
+                self._head = 0
+                self._tail = n
+            else:  # it's all one response, make room
+                self._buf.extend(bytes(len(self._buf)))
+        n = self._socket.recv_into(memoryview(self._buf)[self._tail :])
+        if n == 0:
+            raise ConnectionError(f"{self.port} closed the connection")
+        self._tail += n
+        return True
+
+    def _take(self, n: int) -> bytes:
+        """removes and returns the first n buffered bytes"""
+        ret = bytes(self._buf[self._head : self._head + n])
+        self._head += n
+        if self._head == self._tail:
+            self._head = self._tail = 0
+        return ret
+
+    def _wait_left(self, deadline: float | None) -> float | None:
+        """how long till deadline (never less than 0)"""
+        if deadline is None:
+            return None
+        return max(deadline - time.monotonic(), 0)
+
+    def read(self, size: int = 1) -> bytes:
+        """up to size bytes, fewer if the timeout runs out first"""
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        while self._tail - self._head < size:
+            if not self._fill(self._wait_left(deadline)):
+                break
+        return self._take(min(size, self._tail - self._head))
+
+    def read_until(self, expected: bytes = b"\n", size: int | None = None) -> bytes:
+        """bytes up to and including expected (or size of them), or what came before the timeout ran out"""
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        skip = 0  # bytes at the front already looked through
+        while True:
+            end = self._buf.find(expected, self._head + skip, self._tail)
+            if end >= 0:
+                n = end + len(expected) - self._head
+                break
+            n = self._tail - self._head
+            if (size is not None) and (n >= size):
+                break
+            skip = max(n - len(expected) + 1, 0)
+            if not self._fill(self._wait_left(deadline)):
+                break  # timed out
+        if size is not None:
+            n = min(n, size)
+        return self._take(n)
+
+    def read_nowait(self) -> bytes:
+        """everything that can be read right away"""
+        self._fill(0)
+        return self._take(self._tail - self._head)
+
+    def write(self, data: bytes) -> int:
+        if not self.is_open:
+            raise ConnectionError("Connection is closed")
+        self._socket.sendall(data)
+        return len(data)
+
+    def reset_input_buffer(self):
+        """throws away anything received"""
+        self._head = self._tail = 0
+        while self.is_open and self._fill(0):
+            self._head = self._tail = 0
+
+    def reset_output_buffer(self):
+        """nothing waits to go out, sendall() doesn't return till it's gone"""
+
+    def send_break(self, duration: float = 0.25):
+        """TCP has no break signal"""
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._socket.close()
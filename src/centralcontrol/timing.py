@@ -0,0 +1,90 @@
+"""
+learning how long an smu's sweeps really take
+the instrument's timestamps give a sweep's time per point, the wall clock time from trigger to readings in hand less that is
+the time it takes to get them back. both get averaged per instrument and sweep configuration and kept from one run to the next,
+so sweep timeouts can be tight and a run's duration can be estimated before anything has been measured
+"""
+
+import os
+import pathlib
+import threading
+
+from centralcontrol.logstuff import get_logger
+from centralcontrol.session import DEFAULT_PATH as SESSIONS_PATH
+from centralcontrol.session import load_json
+from centralcontrol.session import save_json
+
+# where the timings live unless told otherwise
+DEFAULT_PATH = SESSIONS_PATH.with_name("timing.json")
+
+
+class SweepTiming(object):
+    """
+    the learned sweep timing of one smu, kept in a small JSON file by instrument IDN
+    a model per configuration: the time per point and the transfer time per point, exponentially averaged over its sweeps
+    """
+
+    weight = 0.3  # how far each sweep moves the averages
+    margin = 1.5  # timeouts allow this many times the expected sweep time
+    slack = 1.0  # [s] plus this, for the odd hiccup
+    lock = threading.Lock()  # smus in the same process share the file
+
+    def __init__(self, path: str | os.PathLike | None = None, weight: float = weight, margin: float = margin, slack: float = slack):
+        self.lg = get_logger(".".join([__name__, type(self).__name__]))
+        self.path = pathlib.Path(DEFAULT_PATH if path is None else path)
+        self.weight = weight
+        self.margin = margin
+        self.slack = slack
+        self.instrument = ""  # whose timings these are
+        self.models: dict[str, dict[str, float]] = {}  # configuration --> {"period": [s] per point, "transfer": [s] per point, "n": sweeps seen}
+
+    @staticmethod
+    def key(**config) -> str:
+        """names a configuration from the settings that change how long its sweeps take"""
+        return ",".join(f"{name}={config[name]}" for name in sorted(config))
+
+    def load(self, instrument: str):
+        """switches to an instrument's saved timings"""
+        self.instrument = instrument
+        models = load_json(self.path).get(instrument, {})
+        self.models = models if isinstance(models, dict) else {}
+
+    def save(self):
+        """stores what's been learned for next time"""
+        if not self.instrument:
+            return
+        with self.lock:
+            everything = load_json(self.path)
+            everything[self.instrument] = self.models
+            try:
+                save_json(self.path, everything)
+            except OSError as e:
+                self.lg.debug(f"Couldn't save sweep timings to {self.path}: {e}")
+
+    def observe(self, key: str, n_points: int, t_sweep: float, t_total: float):
+        """learns from a sweep of n_points the instrument timed at t_sweep [s] (first point to last) that took t_total [s] from trigger to readings in hand"""
+        if (n_points < 2) or (t_sweep <= 0) or (t_total <= 0):
+            return  # nothing to learn from
+        period = t_sweep / (n_points - 1)
+        transfer = max(t_total - period * n_points, 0) / n_points
+        model = self.models.get(key)
+        if model is None:
+            self.models[key] = {"period": period, "transfer": transfer, "n": 1}
+        else:
+            model["period"] += self.weight * (period - model["period"])
+            model["transfer"] += self.weight * (transfer - model["transfer"])
+            model["n"] += 1
+
+    def expected(self, key: str, n_points: int) -> float | None:
+        """[s] how long a sweep should take from trigger to readings in hand, None before we've seen one like it"""
+        model = self.models.get(key)
+        if model is None:
+            return None
+        return n_points * (model["period"] + model["transfer"])
+
+    def timeout(self, key: str, n_points: int) -> float | None:
+        """[s] a comms timeout for a sweep, None before we've seen one like it"""
+        expected = self.expected(key, n_points)
+        if expected is None:
+            return None
+        return expected * self.margin + self.slack
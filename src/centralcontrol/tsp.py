@@ -0,0 +1,192 @@
+"""
+TSP scripts that run whole sweeps, dwells and max power point tracking on a 2600 series smu
+so they go at instrument speed rather than one command round trip per reading
+the scripts get uploaded once per session and called with parameters, they print their readings
+(v, i, t, status per reading, from the nvbuffers) in the instrument's data format when they're done
+they're written for smua, a driver for smub gets its own copies of them with smua swapped for smub
+"""
+
+import hashlib
+import typing
+
+if typing.TYPE_CHECKING:
+    from centralcontrol.k2xxx import k2xxx
+
+# local helpers every script gets, they assume smua.nvbuffer1 (currents) and smua.nvbuffer2 (voltages) are in append mode
+COMMON = """\
+local function cc_start()
+  smua.nvbuffer1.clear()
+  smua.nvbuffer2.clear()
+end
+local function cc_point(src_v, level, dly)
+  if src_v == 1 then
+    smua.source.levelv = level
+  else
+    smua.source.leveli = level
+  end
+  if dly > 0 then
+    delay(dly)
+  end
+  return smua.measure.iv(smua.nvbuffer1, smua.nvbuffer2)
+end
+local function cc_finish()
+  waitcomplete()
+  printbuffer(1, smua.nvbuffer1.n, smua.nvbuffer2.readings, smua.nvbuffer1.readings, smua.nvbuffer1.timestamps, smua.nvbuffer1.statuses)
+end
+"""
+
+# script name --> the function it defines (named NAME, renamed to its versioned name on upload)
+SCRIPTS = {
+    # a linear sweep of points from start to stop, dly [s] at each level before it's measured
+    "sweep": """\
+function NAME(src_v, start, stop, points, dly)
+  cc_start()
+  local step = 0
+  if points > 1 then
+    step = (stop - start) / (points - 1)
+  end
+  for k = 0, points - 1 do
+    cc_point(src_v, start + k * step, dly)
+  end
+  cc_finish()
+end
+""",
+    # a sweep through a table of levels
+    "list": """\
+function NAME(src_v, levels, dly)
+  cc_start()
+  for k = 1, table.getn(levels) do
+    cc_point(src_v, levels[k], dly)
+  end
+  cc_finish()
+end
+""",
+    # n readings at the present source level, interval [s] apart, the first not before t_next (on timer.measure.t()'s clock)
+    # buffer timestamps count from the buffer's first reading (its basetimestamp), so after the readings it prints
+    # what to add to them to put them on timer.measure.t()'s clock too, for them to line up from one call to the next
+    "dwell": """\
+function NAME(n, interval, t_next)
+  cc_start()
+  local wait = t_next - timer.measure.t()
+  if wait > 0 then
+    delay(wait)
+  end
+  smua.measure.interval = interval
+  smua.measure.count = n
+  local t_first = timer.measure.t()
+  smua.measure.iv(smua.nvbuffer1, smua.nvbuffer2)
+  smua.measure.count = 1
+  smua.measure.interval = 0
+  cc_finish()
+  printnumber(t_first - smua.nvbuffer1.timestamps[1])
+end
+""",
+    # n steps of perturb and observe max power point tracking from voltage v, in steps of dv kept within v_min..v_max (turning back at them)
+    # p_last is the power [W] the step before v made (-math.huge for none)
+    # prints where it got to (the next v, dv and p_last) after the readings so that the next call can carry on from there
+    "mppt": """\
+function NAME(v, dv, p_last, n, dly, v_min, v_max)
+  cc_start()
+  for k = 1, n do
+    local i, vm = cc_point(1, v, dly)
+    local p = -(i * vm)
+    if p < p_last then
+      dv = -dv
+    end
+    p_last = p
+    v = v + dv
+    if (v < v_min) or (v > v_max) then
+      v = math.min(math.max(v, v_min), v_max)
+      dv = -dv
+    end
+  end
+  cc_finish()
+  printnumber(v, dv, p_last)
+end
+""",
+    # both channels at once, n steps: each channel goes to its next level (an empty table keeps it where it is), then after dly [s]
+    # both get measured together. their readings come back in one printbuffer, smua's v, i, t, status then smub's on every row
+    "dual": """\
+function NAME(n, src_a, levels_a, src_b, levels_b, dly)
+  smua.nvbuffer1.clear()
+  smua.nvbuffer2.clear()
+  smub.nvbuffer1.clear()
+  smub.nvbuffer2.clear()
+  for k = 1, n do
+    if k <= table.getn(levels_a) then
+      if src_a == 1 then smua.source.levelv = levels_a[k] else smua.source.leveli = levels_a[k] end
+    end
+    if k <= table.getn(levels_b) then
+      if src_b == 1 then smub.source.levelv = levels_b[k] else smub.source.leveli = levels_b[k] end
+    end
+    if dly > 0 then
+      delay(dly)
+    end
+    smua.measure.overlappediv(smua.nvbuffer1, smua.nvbuffer2)
+    smub.measure.overlappediv(smub.nvbuffer1, smub.nvbuffer2)
+    waitcomplete()
+  end
+  printbuffer(1, n, smua.nvbuffer2.readings, smua.nvbuffer1.readings, smua.nvbuffer1.timestamps, smua.nvbuffer1.statuses, smub.nvbuffer2.readings, smub.nvbuffer1.readings, smub.nvbuffer1.timestamps, smub.nvbuffer1.statuses)
+end
+""",
+}
+
+# scripts that drive both channels themselves, the same for either channel's driver
+SHARED = frozenset({"dual"})
+
+
+def lua(value) -> str:
+    """a python value as a Lua literal"""
+    if isinstance(value, bool):
+        ret = str(int(value))
+    elif isinstance(value, (list, tuple)):
+        ret = "{" + ", ".join(lua(x) for x in value) + "}"
+    elif value in (float("Infinity"), float("-Infinity")):
+        ret = "math.huge" if value > 0 else "-math.huge"
+    else:
+        ret = repr(float(value))
+    return ret
+
+
+class ScriptManager(object):
+    """keeps the scripts in SCRIPTS loaded into a 2600 and calls them"""
+
+    def __init__(self, sm: "k2xxx"):
+        self.sm = sm
+        self.loaded: set[str] = set()  # the scripts we know are on the instrument this session
+
+    @staticmethod
+    def source(name: str, channel: str = "a") -> str:
+        """a script with its helpers, for the smu channel it's to drive"""
+        text = COMMON + SCRIPTS[name]
+        if (channel != "a") and (name not in SHARED):
+            text = text.replace("smua.", f"smu{channel}.")
+        return text
+
+    def function(self, name: str) -> str:
+        """the name a script's function goes by on the instrument, with a version hash so a changed script gets uploaded again"""
+        digest = hashlib.sha1(self.source(name, self.sm.channel).encode()).hexdigest()[:8]
+        return f"cc_{name}_{digest}"
+
+    def forget(self):
+        """the instrument might have been power cycled, check before the next call"""
+        self.loaded.clear()
+
+    def load(self, name: str):
+        """makes sure the script is on the instrument, uploading it only if it isn't there already"""
+        if name in self.loaded:
+            return
+        function = self.function(name)
+        if self.sm.query(f"print(type({function}))") != "function":
+            self.sm.lg.debug(f"Uploading TSP script {function}")
+            body = self.source(name, self.sm.channel).replace("NAME", function).splitlines()
+            for line in [f"loadscript {function}_s", *body, "endscript", f"{function}_s.run()"]:
+                self.sm.send(line)
+            if self.sm.query(f"print(type({function}))") != "function":
+                raise ValueError(f"TSP script {function} failed to load")
+        self.loaded.add(name)
+
+    def call(self, name: str, *args):
+        """starts a script running, the caller reads what it prints"""
+        self.load(name)
+        self.sm.send(f"{self.function(name)}({', '.join(lua(arg) for arg in args)})")
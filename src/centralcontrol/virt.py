@@ -1,14 +1,76 @@
 import collections
 import inspect
 import random
-import time
 from multiprocessing.synchronize import Event as mEvent
 from threading import Event as tEvent
+from threading import Lock
 
 import mpmath
 import numpy
 
+from centralcontrol import clock
+from centralcontrol import readings
 from centralcontrol.logstuff import get_logger
+from centralcontrol.population import DevicePopulation
+from centralcontrol.population import get as get_population
+
+
+def lambertw_exp(x: numpy.ndarray | float) -> numpy.ndarray:
+    """
+    principal branch of the Lambert W function of exp(x), elementwise in float64
+    works in the log domain (solves w + ln(w) = x) so that huge arguments, whose exp() would overflow, are fine
+    """
+    x = numpy.asarray(x, dtype=numpy.float64)
+    tiny = x < -36  # here W(exp(x)) == exp(x) to double precision
+    big = x > 1
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):  # the masked off elements may misbehave
+        # starting guess: the asymptotic expansion for big x, exp(x) otherwise
+        lx = numpy.log(numpy.where(big, x, 2.0))
+        w = numpy.where(big, x - lx + lx / numpy.where(big, x, 1.0), numpy.exp(numpy.minimum(x, 1.0)))
+
+        # Halley iterations on f(w) = w + ln(w) - x
+        todo = ~tiny
+        for i in range(8):
+            f = w + numpy.log(w) - x
+            step = f * w / (w + 1) / (1 + f / (2 * (w + 1) ** 2))
+            w = numpy.where(todo, w - step, w)
+            todo = todo & (numpy.abs(step) > 1e-15 * w)
+            if not todo.any():
+                break
+    return w
+
+
+def lambertw(z: numpy.ndarray | float) -> numpy.ndarray:
+    """principal branch of the Lambert W function for non-negative real z, elementwise in float64"""
+    z = numpy.asarray(z, dtype=numpy.float64)
+    with numpy.errstate(divide="ignore"):
+        w = lambertw_exp(numpy.log(z))  # log(0) = -inf is handled fine
+    return numpy.where(z == 0, 0.0, w)
+
+
+class IVTable(object):
+    """dense, monotonic V<->I lookup table for one set of device model parameters"""
+
+    def __init__(self, V: numpy.ndarray, I: numpy.ndarray):
+        self.V = V  # increasing
+        self.I = I  # cell's POV, so decreasing along V
+        self._I_up = I[::-1]  # increasing for V lookups
+        self._V_down = V[::-1]
+        self.V_range = (V[0], V[-1])
+        self.I_range = (I[-1], I[0])
+
+    def i_from_v(self, V: float) -> float | None:
+        """interpolated current at V, None off the edges of the table"""
+        if self.V_range[0] <= V <= self.V_range[1]:
+            return float(numpy.interp(V, self.V, self.I))
+        return None
+
+    def v_from_i(self, I: float) -> float | None:
+        """interpolated voltage at I, None off the edges of the table"""
+        if self.I_range[0] <= I <= self.I_range[1]:
+            return float(numpy.interp(I, self._I_up, self._V_down))
+        return None
 
 
 class FakeLight(object):
@@ -195,9 +257,9 @@ class FakeMC(object):
                 self.ml[key] = round(self.el[key] * spm)
                 self.pos[key] = round(self.ml[key] / 2)
                 self.goal[key] = round(self.ml[key] / 2)
-                self.home_done_time[key] = time.time()
-                self.jog_done_time[key] = time.time()
-                self.goto_done_time[key] = time.time()
+                self.home_done_time[key] = clock.time()
+                self.jog_done_time[key] = clock.time()
+                self.goto_done_time[key] = clock.time()
             self.virt_motion_setup = True
 
     def __enter__(self):
@@ -239,7 +301,7 @@ class FakeMC(object):
                 self.lg.debug(f"Virtual CALL. Class={type(self).__name__}. function={frame.f_code.co_name}. cmd={cmd}")
             if self.virt_motion_setup == True:
                 # now let's do timing related motion calcs
-                now = time.time()
+                now = clock.time()
                 for key, val in self.el.items():
                     if (now > self.home_done_time[key]) and (self.homing[key] == True):  # homing for this axis is done
                         self.ml[key] = round(self.el[key] * self.spm)
@@ -279,7 +341,7 @@ class FakeMC(object):
                     operate_on = self.detected_axes
                 for ax in operate_on:
                     axi = ax
-                    self.home_done_time[axi] = time.time() + 2 * self.el[axi] * self.spm / self.vs
+                    self.home_done_time[axi] = clock.time() + 2 * self.el[axi] * self.spm / self.vs
                     self.ml[axi] = -1
                     self.homing[axi] = True
                 return ""
@@ -291,7 +353,7 @@ class FakeMC(object):
                     self.pos[axi] = 0
                 else:
                     self.pos[axi] = round(self.el[axi] * self.spm)
-                self.jog_done_time[axi] = time.time() + self.el[axi] * self.spm / self.vs
+                self.jog_done_time[axi] = clock.time() + self.el[axi] * self.spm / self.vs
                 self.jogging[axi] = True
                 self.ml[axi] = -1
                 return ""
@@ -301,7 +363,7 @@ class FakeMC(object):
                 axi = cmd[1]
                 self.goingto[axi] = True
                 self.goal[axi] = round(float(cmd[2::]))
-                self.goto_done_time[axi] = time.time() + abs(self.goal[axi] - self.pos[axi]) / self.vs
+                self.goto_done_time[axi] = clock.time() + abs(self.goal[axi] - self.pos[axi]) / self.vs
                 return ""
             elif (len(cmd) == 2) and (cmd[0] == "r"):  # axis position request
                 axi = cmd[1]
@@ -318,11 +380,11 @@ class FakeMC(object):
                     for ax in to_estop:
                         axi = ax
                         self.ml[axi] = 0
-                        self.goto_done_time[axi] = time.time()
+                        self.goto_done_time[axi] = clock.time()
                         self.goal[axi] = self.pos[axi]
-                        self.home_done_time[axi] = time.time()
-                        self.jog_done_time[axi] = time.time()
-                        self.goto_done_time[axi] = time.time()
+                        self.home_done_time[axi] = clock.time()
+                        self.jog_done_time[axi] = clock.time()
+                        self.goto_done_time[axi] = clock.time()
                         self.homing[axi] = False
                         self.jogging[axi] = False
                         self.goingto[axi] = False
@@ -355,6 +417,7 @@ class FakeSMU(object):
     ccheck: bool = False
     killer: tEvent | mEvent
     print_sweep_deets: bool = False
+    last_readings: numpy.ndarray | None = None  # the latest measure()'s readings as a structured array
     address: str | None = None
     cc_fail_probability = 0.1  # how often should we simulate a failed contact check?
     cc_mode = "none"  # contact check mode
@@ -366,6 +429,20 @@ class FakeSMU(object):
     threshold_ohm: float = 33.3
     compliance_bit_number: int = 3
     n_status_bits: int = 24
+    vectorized: bool = True  # simulate sweeps with the float64 model instead of point by point with the mpmath (reference) one
+    use_tables: bool = True  # answer single point model evaluations from cached interpolation tables
+    table_points: int = 10001  # number of points in an interpolation table
+    table_span: tuple[float, float] = (-1.5, 0.3)  # [V] voltage range covered by an interpolation table, relative to Voc
+    table_cache_size: int = 32  # how many parameter sets' tables to keep
+    _tables: collections.OrderedDict[tuple, IVTable | None] = collections.OrderedDict()  # LRU cache of tables, shared by all instances
+    _tables_lock = Lock()  # FakeSMUs run in their own threads, this guards _tables (and the hit/miss counts)
+    table_hits: int = 0
+    table_misses: int = 0
+    population: DevicePopulation | None = None  # simulate devices drawn from this population instead of the one fixed cell
+    pixel: str | None = None  # which of the population's devices is connected
+    src: str = "voltage"
+    list_sweeps = True  # setupSweep takes levels
+    list_max_points = 100  # most levels a list sweep can have
 
     # if non-zero, we have a resistor of this ohm value connected instead of a solar cell
     resistor_connected = 0
@@ -376,7 +453,7 @@ class FakeSMU(object):
         self._votes_needed = 1
         self.on_votes = collections.deque([], maxlen=self._votes_needed)
 
-        self.t0 = time.time()
+        self.t0 = clock.time()
         self.measurementTime = 0.01  # [s] the time it takes the simulated sourcemeter to make a measurement
 
         # here we choose some numbers for our simulated solar cell model
@@ -409,6 +486,9 @@ class FakeSMU(object):
         if "dark_area" in kwargs:
             self.dark_area = kwargs["dark_area"]
 
+        if "population" in kwargs:
+            self.population = get_population(kwargs["population"])
+
         self.cellTemp = 40.25  # degC
         self.T = 273.15 + self.cellTemp  # cell temp in K
         self.K = 1.3806488e-23  # boltzman constant
@@ -428,6 +508,7 @@ class FakeSMU(object):
         self.nPoints = 1001
         self.sweepStart = 1
         self.sweepEnd = 0
+        self.sweepLevels: list[float] | None = None  # the source voltages of a list sweep, None for a linear one
 
         self.status = 0
         self.four88point1 = True
@@ -520,8 +601,15 @@ class FakeSMU(object):
             self.write(f":source:{self.src} {setPoint:0.8f}")
         return
 
-    def setupSweep(self, sourceVoltage: bool = True, compliance: float = 0.04, nPoints: int = 101, stepDelay: float = -1.0, start: float = 0.0, end: float = 1.0, senseRange="f"):
-        """setup for a sweep operation"""
+    def setupSweep(self, sourceVoltage: bool = True, compliance: float = 0.04, nPoints: int = 101, stepDelay: float = -1.0, start: float = 0.0, end: float = 1.0, senseRange="f", levels: list[float] | None = None):
+        """setup for a sweep operation, a list sweep through levels if they're given"""
+        if levels is not None:
+            levels = [float(level) for level in levels]
+            if not (0 < len(levels) <= self.list_max_points):
+                raise ValueError(f"A list sweep takes 1 to {self.list_max_points} levels, not {len(levels)}")
+            start = levels[0]
+            end = levels[-1]
+            nPoints = len(levels)
         if sourceVoltage:
             self.current_compliance = compliance
         # sm = self.sm
@@ -536,6 +624,7 @@ class FakeSMU(object):
         self.sweepMode = True
         self.sweepStart = start
         self.sweepEnd = end
+        self.sweepLevels = levels
         dv = self.query_values(":source:voltage:step?")
         assert isinstance(dv, float), f"{isinstance(dv, float)=}"
         self.dV = abs(dv)
@@ -549,8 +638,36 @@ class FakeSMU(object):
     def opc(self, *args, **kwargs):
         return
 
+    def evolve(self, V: float | None):
+        """brings the connected population device up to date and takes on its model parameters"""
+        if (self.population is not None) and (self.pixel is not None):
+            now = clock.time()
+            idx = self.population.add([self.pixel], now)
+            self.population.step(idx, now, V, self._intensity > 0)
+            p = self.population.parameters(idx, now)
+            self.Iphd = float(p["Iphd"][0])
+            self.I0d = float(p["I0d"][0])
+            self.n = float(p["n"][0])
+            self.Rsa = float(p["Rsa"][0])
+            self.Rsha = float(p["Rsha"][0])
+            self.resistor_connected = self.fault_ohms(int(p["fault"][0]))
+
+    def fault_ohms(self, fault: int) -> float:
+        """the resistor that simulates a faulty population device, 0 for a working one"""
+        if fault == DevicePopulation.OPEN:
+            ret = self.population.open_ohms
+        elif fault == DevicePopulation.SHORT:
+            ret = self.population.short_ohms
+        else:
+            ret = 0
+        return ret
+
     def update(self, current: bool = True):
         """compute device current or voltage given a known value of the other one"""
+        if current:
+            self.evolve(self.V)
+        else:
+            self.evolve(None)
         if self.resistor_connected != 0:
             if current:
                 self.I = self.V / self.resistor_connected
@@ -564,7 +681,7 @@ class FakeSMU(object):
             iph_scale = self._intensity
             Iph = self.Iphd * self._calc_area / 1000 * iph_scale
             if current:  # we're updating current from a known voltage
-                I = self.i_from_v(self.V, Rs, Rsh, Iph, I0, n)
+                I = self.solve_i(self.V, Rs, Rsh, Iph, I0, n)
                 # simulate the SMU hitting compliance
                 if abs(I) > abs(self.current_compliance):  # check if we're over the current limit
                     self.status |= 1 << self.compliance_bit_number  # set compliance bit
@@ -574,14 +691,14 @@ class FakeSMU(object):
                     else:
                         I = -1 * abs(self.current_compliance)
                     # then figure out what V should be there, due to compliance
-                    self.V = self.v_from_i(I, Rs, Rsh, Iph, I0, n)
+                    self.V = self.solve_v(I, Rs, Rsh, Iph, I0, n)
                 else:  # we're not violating the current limit
                     self.status &= (2 ^ self.n_status_bits) ^ (1 << self.compliance_bit_number)  # clear compliance bit
                 self.I = I * -1  # change from cell's POV to SMU's POV
             else:  # we're updating voltage from a known current
                 I = self.I * -1  # change from SMU's POV to cell's POV
                 # TODO: handle voltage compliance
-                self.V = self.v_from_i(I, Rs, Rsh, Iph, I0, n)
+                self.V = self.solve_v(I, Rs, Rsh, Iph, I0, n)
 
     def v_from_i(self, I, Rs, Rsh, Iph, I0, n) -> float:
         """find voltage from device params and current"""
@@ -627,6 +744,111 @@ class FakeSMU(object):
                 I = Iph
         return float(mpmath.fabs(I)) * float(mpmath.sign(mpmath.re(I)))
 
+    def iv_table(self, Rs, Rsh, Iph, I0, n) -> IVTable | None:
+        """the (cached) interpolation table for these device params"""
+        key = (Rs, Rsh, Iph, I0, n, float(self.Vth), self.table_points, self.table_span)
+        with FakeSMU._tables_lock:
+            if key in FakeSMU._tables:
+                FakeSMU._tables.move_to_end(key)
+                FakeSMU.table_hits += 1
+                return FakeSMU._tables[key]
+            FakeSMU.table_misses += 1
+
+        Voc = self.v_from_i(0, Rs, Rsh, Iph, I0, n)
+        V = numpy.linspace(Voc + self.table_span[0], Voc + self.table_span[1], self.table_points)
+        I = self.i_from_v_array(V, Rs, Rsh, Iph, I0, n)
+        if numpy.all(numpy.isfinite(I)) and numpy.all(numpy.diff(I) < 0):
+            table = IVTable(V, I)
+        else:
+            table = None  # not strictly monotonic in double precision, so no good for lookups
+
+        with FakeSMU._tables_lock:  # built outside of it, so another thread might have beaten us to it, the result's the same
+            FakeSMU._tables[key] = table
+            FakeSMU._tables.move_to_end(key)
+            while len(FakeSMU._tables) > self.table_cache_size:
+                FakeSMU._tables.popitem(last=False)  # evict the least recently used
+        return table
+
+    def solve_i(self, V, Rs, Rsh, Iph, I0, n) -> float:
+        """current at V, from a lookup table when possible"""
+        I = None
+        if self.use_tables and (self.population is None):
+            table = self.iv_table(Rs, Rsh, Iph, I0, n)
+            if table is not None:
+                I = table.i_from_v(V)
+        elif self.vectorized and (self.population is not None):  # parameters are always on the move, tables would never get reused
+            I = float(self.i_from_v_array(numpy.array([V]), Rs, Rsh, Iph, I0, n)[0])
+        if I is None:  # exact solution off the edges of the table
+            I = self.i_from_v(V, Rs, Rsh, Iph, I0, n)
+        return I
+
+    def solve_v(self, I, Rs, Rsh, Iph, I0, n) -> float:
+        """voltage at I, from a lookup table when possible"""
+        V = None
+        if self.use_tables and (self.population is None):
+            table = self.iv_table(Rs, Rsh, Iph, I0, n)
+            if table is not None:
+                V = table.v_from_i(I)
+        if V is None:  # exact solution off the edges of the table
+            V = self.v_from_i(I, Rs, Rsh, Iph, I0, n)
+        return V
+
+    def i_from_v_array(self, V: numpy.ndarray, Rs, Rsh, Iph, I0, n) -> numpy.ndarray:
+        """
+        find currents from device params and an array of voltages, the float64 counterpart of i_from_v()
+        the params may be arrays too (one per voltage), then the resistance case is picked by the whole lot
+        """
+        V = numpy.asarray(V, dtype=numpy.float64)
+        nVth = float(self.Vth) * n
+        if numpy.all(Rs > 0) and numpy.all(Rsh < float("inf")):  # both resistors active
+            x = numpy.log(I0 * Rs * Rsh / (nVth * (Rs + Rsh))) + (Rs * (I0 * Rsh + Iph * Rsh - V) / (Rs + Rsh) + V) / nVth
+            I = (Rs * (I0 * Rsh + Iph * Rsh - V) - nVth * (Rs + Rsh) * lambertw_exp(x)) / (Rs * (Rs + Rsh))
+        elif numpy.all(Rs <= 0) and numpy.all(Rsh < float("inf")):  # Rs is perfect (0 ohm)
+            I = -I0 * numpy.exp(V / nVth) + I0 + Iph - V / Rsh
+        elif numpy.all(Rs > 0) and numpy.all(Rsh == float("inf")):  # Rsh is perfect (inf ohm)
+            x = numpy.log(I0 * Rs / nVth) + (Rs * (I0 + Iph) + V) / nVth
+            I = (Rs * (I0 + Iph) - nVth * lambertw_exp(x)) / Rs
+        else:  # no resistive losses
+            I = -I0 * numpy.exp(V / nVth) + I0 + Iph
+        return I
+
+    def sweep_values(self, voltages: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """simulates a whole voltage sweep at once, returns the voltages, currents (from the smu's POV) and status words"""
+        V = numpy.array(voltages, dtype=numpy.float64)
+        if (self.population is not None) and (self.pixel is not None):
+            now = clock.time()
+            i = int(self.population.add([self.pixel], now)[0])
+            p = self.population.trace(i, now, V, self.measurementTime, self._intensity > 0)  # per point parameters
+            self.resistor_connected = self.fault_ohms(int(p["fault"][0]))
+        else:
+            p = {"Rsa": self.Rsa, "Rsha": self.Rsha, "n": self.n, "I0d": self.I0d, "Iphd": self.Iphd}
+        if self.resistor_connected != 0:
+            I = V / self.resistor_connected
+        else:
+            Rs = numpy.broadcast_to(p["Rsa"] / self._calc_area, V.shape)
+            Rsh = numpy.broadcast_to(p["Rsha"] / self._calc_area, V.shape)
+            n = numpy.broadcast_to(p["n"], V.shape)
+            I0 = numpy.broadcast_to(p["I0d"] * self._calc_area / 1000, V.shape)
+            Iph = numpy.broadcast_to(p["Iphd"] * self._calc_area / 1000 * self._intensity, V.shape)
+            I = self.i_from_v_array(V, Rs, Rsh, Iph, I0, n)
+            # simulate the SMU hitting compliance (rare enough that these points can take the scalar path)
+            limit = abs(self.current_compliance)
+            over = numpy.abs(I) > limit
+            I[over] = numpy.where(I[over] >= 0, limit, -limit)
+            for i in numpy.flatnonzero(over):
+                V[i] = self.v_from_i(I[i], Rs[i], Rsh[i], Iph[i], I0[i], n[i])
+            I = I * -1  # change from cell's POV to SMU's POV
+
+            status = numpy.empty(len(V), dtype=int)
+            for i in range(len(V)):
+                if over[i]:
+                    self.status |= 1 << self.compliance_bit_number  # set compliance bit
+                else:
+                    self.status &= (2 ^ self.n_status_bits) ^ (1 << self.compliance_bit_number)  # clear compliance bit
+                status[i] = self.status
+            return (V, I, status)
+        return (V, I, numpy.full(len(V), self.status))
+
     def write(self, command):
         if ":source:current " in command:
             self.I = float(command.split(" ")[1])
@@ -637,14 +859,23 @@ class FakeSMU(object):
             self.sweepMode = False
         elif ":source:sweep:points " in command:
             self.nPoints = int(command.split(" ")[1])
+            self.sweepLevels = None
         elif ":source:voltage:start " in command:
             self.sweepStart = float(command.split(" ")[1])
+            self.sweepLevels = None
         elif ":source:voltage:stop " in command:
             self.sweepEnd = float(command.split(" ")[1])
+            self.sweepLevels = None
         elif ":source:voltage " in command:
             self.V = float(command.split(" ")[1])
             self.update(current=True)
 
+    def sweep_voltages(self) -> numpy.ndarray:
+        """the source voltages of the sweep we're set up for"""
+        if self.sweepLevels is not None:
+            return numpy.array(self.sweepLevels)
+        return numpy.linspace(self.sweepStart, self.sweepEnd, self.nPoints)
+
     def query_ascii_values(self, command):
         return self.query_values(command)
 
@@ -653,28 +884,42 @@ class FakeSMU(object):
 
     def query_values(self, command):
         if command == "READ?":
-            if self.sweepMode:
+            if self.sweepMode and self.vectorized and (isinstance(self.ohms, bool) and (not self.ohms)):
+                voltages = self.sweep_voltages()
+                t_start = clock.time() - self.t0
+                V, I, status = self.sweep_values(voltages)
+                clock.sleep(self.measurementTime * len(voltages))
+                times = t_start + self.measurementTime * numpy.arange(1, len(voltages) + 1)
+                sweepArray = list(zip(V.tolist(), I.tolist(), times.tolist(), status.tolist()))
+                self.V = sweepArray[-1][0]
+                self.I = sweepArray[-1][1]
+                self.last_sweep_time = sweepArray[-1][2] - sweepArray[0][2]
+                self.lg.debug(f"Sweep duration = {self.last_sweep_time} s")
+                return sweepArray
+            elif self.sweepMode:
                 sweepArray = []
-                voltages = numpy.linspace(self.sweepStart, self.sweepEnd, self.nPoints)
+                voltages = self.sweep_voltages()
                 for i in range(len(voltages)):
                     self.V = voltages[i]
                     self.update(current=True)
-                    time.sleep(self.measurementTime)
+                    clock.sleep(self.measurementTime)
                     if isinstance(self.ohms, bool) and (not self.ohms):
-                        measurementLine = (self.V, self.I, time.time() - self.t0, self.status)
+                        measurementLine = (self.V, self.I, clock.time() - self.t0, self.status)
                     else:  # ohms
-                        measurementLine = (self.V, self.I, self.V / self.I, time.time() - self.t0, self.status)
+                        measurementLine = (self.V, self.I, self.V / self.I, clock.time() - self.t0, self.status)
                     sweepArray.append(measurementLine)
                 self.last_sweep_time = sweepArray[-1][2] - sweepArray[0][2]
                 self.lg.debug(f"Sweep duration = {self.last_sweep_time} s")
                 return sweepArray
             else:  # non sweep mode
-                time.sleep(self.measurementTime)
+                clock.sleep(self.measurementTime)
+                if self.population is not None:  # the device has moved on since the source was set
+                    self.update(current=(self.src == "voltage"))
                 if isinstance(self.ohms, bool) and (not self.ohms):
-                    measurementLine = (self.V, self.I, time.time() - self.t0, self.status)
+                    measurementLine = (self.V, self.I, clock.time() - self.t0, self.status)
                 else:  # ohms
                     # ohm = 700 + random.random() * 100
-                    measurementLine = (self.V, self.I, self.V / self.I, time.time() - self.t0, self.status)
+                    measurementLine = (self.V, self.I, self.V / self.I, clock.time() - self.t0, self.status)
                 return [measurementLine]
         elif command == ":source:voltage:step?":
             dV = (self.sweepEnd - self.sweepStart) / self.nPoints
@@ -691,9 +936,9 @@ class FakeSMU(object):
         returns a queqe of measurements
         """
         i = 0
-        t_end = time.time() + t_dwell
+        t_end = clock.time() + t_dwell
         q = []
-        while (i < measurements) and (time.time() < t_end) and (not self.killer.is_set()):
+        while (i < measurements) and (clock.time() < t_end) and (not self.killer.is_set()):
             i = i + 1
             msmt = self.measure()
             cb(msmt)
@@ -707,30 +952,13 @@ class FakeSMU(object):
             m_len = 5
         vals = self.query_values("READ?")
         assert isinstance(vals, list), f"{isinstance(vals, list)=}"
+        rec = readings.decode(numpy.array(vals, dtype=float), r=(m_len == 5))
+        self.last_readings = rec
 
-        if len(vals) > 1:
-            first_element = vals[0]
-            last_element = vals[-1]
-            if m_len == 4:
-                t_start = first_element[2]
-                t_end = last_element[2]
-            elif m_len == 5:
-                t_start = first_element[3]
-                t_end = last_element[3]
-            else:
-                t_start = 0
-                t_end = 0
-            v_start = first_element[0]
-            v_end = last_element[0]
-            self.last_sweep_time = t_end - t_start
-            n_vals = len(vals)
-            stats_string = f"sweep duration={self.last_sweep_time:0.2f}s|mean voltage step={(v_start-v_end)/n_vals*1000:+0.2f}mV|mean sample period={self.last_sweep_time/n_vals*1000:0.0f}ms|mean sweep rate={(v_start-v_end)/self.last_sweep_time:+0.3f}V/s"
-            if self.print_sweep_deets == True:
-                self.lg.log(29, stats_string)
-            else:
-                self.lg.debug(stats_string)
+        if len(rec) > 1:
+            self.last_sweep_time = readings.log_sweep(self.lg, rec, loud=self.print_sweep_deets)
 
-        return vals  # type: ignore
+        return rec.tolist()
 
     def enable_cc_mode(self, value: bool = True):
         if self.cc_mode != "none":
@@ -0,0 +1,92 @@
+import pathlib
+import tempfile
+import time
+import unittest
+
+from centralcontrol.capture import CLOSE
+from centralcontrol.capture import OPEN
+from centralcontrol.capture import RX
+from centralcontrol.capture import TX
+from centralcontrol.capture import Recorder
+from centralcontrol.capture import ReplayEmulator
+from centralcontrol.capture import load
+from centralcontrol.emulator import McEmulator
+from centralcontrol.emulator import SmuEmulator
+from centralcontrol.k2xxx import k2xxx
+from centralcontrol.mc import MC
+from centralcontrol.timing import SweepTiming
+
+
+class CaptureTestCase(unittest.TestCase):
+    """testing for recording instrument traffic and replaying it"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = str(pathlib.Path(self.tmp.name) / "session.ccap")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def timing(self) -> SweepTiming:
+        """sweep timings kept with the test's files, not the user's"""
+        return SweepTiming(pathlib.Path(self.tmp.name) / "timing.json")
+
+    def session(self, address: str) -> list:
+        """a short k2xxx session: connect, a DC point, a sweep, disconnect"""
+        sm = k2xxx(address, timeout=2, fast_reconnect=False, timing=self.timing())
+        sm.connect()
+        sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.5)
+        data = sm.measure()
+        sm.setupSweep(compliance=0.04, nPoints=11, start=0, end=1)
+        data += sm.measure(11)
+        sm.disconnect()
+        return data
+
+    def test_k2xxx(self):
+        """a replayed session gives the driver the same readings, at full speed"""
+        with SmuEmulator(dialect="2400", point_time=0.001, latency=0.005) as emu, Recorder(emu.address, self.path) as rec:
+            t0 = time.perf_counter()
+            recorded = self.session(rec.address)
+            t_recorded = time.perf_counter() - t0
+        meta, events = load(self.path)
+        self.assertEqual(meta["target"], f"{emu.host}:{emu.port}")
+        kinds = {event.kind for event in events}
+        self.assertTrue({OPEN, TX, RX, CLOSE} <= kinds)
+        self.assertEqual(sum(len(event.data) for event in events if event.kind == TX), emu.n_rx)
+        self.assertEqual(sum(len(event.data) for event in events if event.kind == RX), emu.n_tx)
+
+        with ReplayEmulator(self.path) as replay:
+            t0 = time.perf_counter()
+            replayed = self.session(replay.address)
+            t_replayed = time.perf_counter() - t0
+        self.assertEqual(replay.mismatches, [])
+        self.assertEqual([m[:2] for m in replayed], [m[:2] for m in recorded])
+        self.assertLess(t_replayed, t_recorded)
+
+    def test_mc(self):
+        """the telnet drivers replay too"""
+        with McEmulator() as emu, Recorder(emu.address, self.path) as rec:
+            with MC(f"{rec.host}:{rec.port}", timeout=1) as mc:
+                mc.set_mux([("A", 3)])
+                version = mc.firmware_version
+        with ReplayEmulator(self.path) as replay:
+            with MC(f"{replay.host}:{replay.port}", timeout=1) as mc:
+                mc.set_mux([("A", 3)])
+                self.assertEqual(mc.firmware_version, version)
+        self.assertEqual(replay.mismatches, [])
+
+    def test_mismatch(self):
+        """the driver doing something different gets noted"""
+        with SmuEmulator(dialect="2400", point_time=0.001) as emu, Recorder(emu.address, self.path) as rec:
+            self.session(rec.address)
+        with ReplayEmulator(self.path) as replay:
+            sm = k2xxx(replay.address, timeout=0.5, fast_reconnect=False, timing=self.timing())
+            sm.connect()
+            sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.6)  # 0.5 in the recording
+            sm.ser.close()
+        self.assertGreater(len(replay.mismatches), 0)
+        self.assertIn(b"0.5", replay.mismatches[0][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
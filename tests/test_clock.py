@@ -0,0 +1,54 @@
+import threading
+import time
+import unittest
+
+from centralcontrol import clock
+from centralcontrol import virt
+
+
+class ClockTestCase(unittest.TestCase):
+    """testing for the (virtual) clock"""
+
+    def test_virtual_speed(self):
+        """a virtual second takes a wall time second/speed"""
+        vc = clock.VirtualClock(speed=50)
+        t0 = time.monotonic()
+        v0 = vc.time()
+        vc.sleep(5)
+        self.assertLess(time.monotonic() - t0, 1)
+        self.assertGreaterEqual(vc.time() - v0, 5)
+
+    def test_bad_speed(self):
+        with self.assertRaises(ValueError):
+            clock.VirtualClock(speed=0)
+
+    def test_wait(self):
+        """event waits time out in virtual seconds"""
+        t0 = time.monotonic()
+        with clock.using(clock.VirtualClock(speed=50)):
+            self.assertFalse(clock.wait(threading.Event(), 5))
+        self.assertLess(time.monotonic() - t0, 1)
+
+    def test_using(self):
+        """the wall clock comes back after the context"""
+        vc = clock.VirtualClock(speed=10)
+        with clock.using(vc):
+            self.assertIs(clock.get(), vc)
+        self.assertIsNot(clock.get(), vc)
+        self.assertEqual(clock.get().speed, 1.0)
+
+    def test_fake_smu_dwell(self):
+        """a virtual smu dwells in virtual time"""
+        sm = virt.FakeSMU()
+        sm.connect()
+        sm.setupDC(sourceVoltage=False, compliance=3, setPoint=0.0, senseRange="a")
+        t0 = time.monotonic()
+        with clock.using(clock.VirtualClock(speed=20)):
+            data = sm.measure_until(t_dwell=10)
+        self.assertLess(time.monotonic() - t0, 5)
+        self.assertGreater(data[-1][2] - data[0][2], 9)
+        sm.disconnect()
+
+
+if __name__ == "__main__":
+    unittest.main()
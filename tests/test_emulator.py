@@ -0,0 +1,587 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import pathlib
+import socket
+import tempfile
+import time
+import unittest
+
+import centralcontrol.sourcemeter as sourcemeter
+from centralcontrol.aio import AsyncSMU
+from centralcontrol.capture import TX
+from centralcontrol.capture import Recorder
+from centralcontrol.capture import load
+from centralcontrol.amsmu import AmSmu
+from centralcontrol.emulator import I7540dEmulator
+from centralcontrol.emulator import McEmulator
+from centralcontrol.emulator import SmuEmulator
+from centralcontrol.emulator import WavelabsEmulator
+from centralcontrol.k2xxx import k2xxx
+from centralcontrol.mc import MC
+from centralcontrol.mppt import MPPT
+from centralcontrol.motion import Motion
+from centralcontrol.mux481can import Mux481can
+from centralcontrol.session import SessionStore
+from centralcontrol.tcp import TcpTransport
+from centralcontrol.timing import SweepTiming
+from centralcontrol.wavelabs import Wavelabs
+
+
+class EmulatorTestCase(unittest.TestCase):
+    """testing for the instrument emulators, through the real drivers"""
+
+    point_time = 0.001
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def caches(self, **given) -> dict:
+        """session and sweep timing stores of the test's own (unless given), so the user's real ones never see the emulators"""
+        ret = {"sessions": SessionStore(pathlib.Path(self.tmp.name) / "sessions.json"), "timing": SweepTiming(pathlib.Path(self.tmp.name) / "timing.json")}
+        ret.update(given)
+        return ret
+
+    def ask(self, emu: SmuEmulator, cmd: str) -> str:
+        with socket.create_connection((emu.host, emu.port), timeout=2) as s:
+            s.sendall((cmd + "\n").encode())
+            return s.recv(4096).decode().strip()
+
+    def test_scpi_parsing(self):
+        """long/short forms, compound commands and the error queue"""
+        with SmuEmulator(dialect="2400", point_time=self.point_time) as emu:
+            self.assertEqual(emu.canonical(":SOURce:VOLTage:STARt"), "sour:volt:star")
+            self.assertEqual(emu.canonical("SENSe1:CURRent:PROTection"), "sens:curr:prot")
+            self.assertEqual(self.ask(emu, "trigger:count 7;:trig:coun?;*OPC?"), "7;1")
+            self.assertEqual(self.ask(emu, "bogus:thing?;*OPC?"), "1")  # no reply for a bad query
+            self.assertEqual(self.ask(emu, "syst:err?"), '-113,"Undefined header"')
+            self.assertEqual(self.ask(emu, "syst:err?"), '0,"No error"')
+
+    def test_k2xxx(self):
+        for dialect, binary in [("2400", True), ("2450", True), ("2400", False)]:
+            with self.subTest(dialect=dialect, binary=binary), SmuEmulator(dialect=dialect, point_time=self.point_time) as emu:
+                sm = k2xxx(emu.address, timeout=2, binary=binary, **self.caches())
+                sm.connect()
+                self.assertEqual(sm.model, "2400")
+                self.assertEqual(sm.not2400, dialect == "2450")
+                self.assertEqual(sm.data_dtype is not None, binary)
+                sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.5)
+                [(v, i, t, status)] = sm.measure()
+                self.assertEqual(v, 0.5)
+                self.assertLess(i, 0)  # an illuminated cell makes power
+                sm.setupSweep(compliance=0.04, nPoints=11, start=0, end=1)
+                data = sm.measure(11)
+                for k, m in enumerate(data):
+                    self.assertAlmostEqual(m[0], 0.1 * k, places=6)
+                sm.disconnect()
+
+    def test_k2xxx_ascii_fallback(self):
+        """readings come as ASCII from an instrument that doesn't do binary"""
+
+        class AsciiOnly(SmuEmulator):
+            def scpi(self, cmd: str) -> str | None:
+                if cmd.lower().startswith("form:data"):
+                    return "ASC" if cmd.endswith("?") else None
+                return super().scpi(cmd)
+
+        with AsciiOnly(dialect="2400", point_time=self.point_time) as emu:
+            sm = k2xxx(emu.address, timeout=2, **self.caches())
+            sm.connect()
+            self.assertIsNone(sm.data_dtype)
+            sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.5)
+            self.assertEqual(sm.measure()[0][0], 0.5)
+            sm.disconnect()
+
+    def test_k2xxx_tsp(self):
+        with SmuEmulator(dialect="2600", point_time=self.point_time) as emu:
+            sm = k2xxx(emu.address, timeout=2, **self.caches())
+            sm.connect()
+            self.assertEqual(sm.series, "2600")
+            self.assertEqual(sm.data_dtype, "<f8")
+            sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.5, senseRange="a")
+            sm.measure()
+            sm.measure()
+            self.assertEqual(sm.query("print(smua.nvbuffer1.n)"), "2.00000e+00")  # buffers are in append mode
+            sm.disconnect()
+
+    def test_k2xxx_batch(self):
+        """setup commands go out joined into a few lines with one check at the end"""
+        with SmuEmulator(dialect="2400", point_time=self.point_time) as emu:
+            sm = k2xxx(emu.address, timeout=2, **self.caches())
+            sm.connect()
+            n_commands = emu.n_commands
+            sm.setupSweep(compliance=0.04, nPoints=11, start=0, end=1)
+            self.assertLessEqual(emu.n_commands - n_commands, 3)
+            self.assertEqual(emu.sweep_stop["volt"], 1)
+            self.assertAlmostEqual(sm.dV, 0.1)
+            with self.assertLogs(sm.lg, "WARNING"):
+                with sm.batch():
+                    sm.write("outp 1")
+                    self.assertEqual(sm.query("outp?"), "1")  # a query sends what came before it
+                    sm.write("bogus:thing?")
+            sm.disconnect()
+
+    def test_k2xxx_stream(self):
+        """measure_until with the instrument timing the readings and us collecting them in blocks"""
+        for dialect, relative in [("2400", False), ("2600", False), ("2600", True)]:  # a real 2600's buffer timestamps restart with every block
+            with self.subTest(dialect=dialect, relative=relative), SmuEmulator(dialect=dialect, point_time=self.point_time, relative_timestamps=relative) as emu:
+                sm = k2xxx(emu.address, timeout=2, stream_interval=0.01, **self.caches())
+                sm.stream_latency = 0.05
+                sm.connect()
+                sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.5, senseRange="a")
+                chunks = []
+                data = sm.measure_until(n_measurements=12, cb=chunks.append)
+                self.assertEqual(len(data), 12)
+                self.assertGreater(len(chunks), 1)
+                self.assertEqual(sum(chunks, []), data)
+                self.assertTrue(all(m[0] == 0.5 and m[1] < 0 for m in data))
+                for earlier, later in zip(data, data[1:]):
+                    self.assertGreaterEqual(later[2] - earlier[2], 0.01)
+                    self.assertLess(later[2] - earlier[2], 0.05)  # paced from one block to the next too
+                self.assertEqual(emu.count, 1)  # put back for single measurements
+
+                chunks.clear()
+                data = sm.measure_until(t_dwell=10, cb=lambda x: (chunks.append(x), sm.killer.set()))
+                self.assertEqual(len(chunks), 1)  # the killer stops it after the block it was set in
+                sm.killer.clear()
+                sm.disconnect()
+
+    def test_k2xxx_shadow(self):
+        """repeating a setup only sends what changed, anything that resets the smu makes us send it all again"""
+        with SmuEmulator(dialect="2400", point_time=self.point_time) as emu:
+            sm = k2xxx(emu.address, timeout=2, **self.caches())
+            sm.connect()
+            sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.5, senseRange="a")
+            misses = sm.shadow.misses
+            sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.6, senseRange="a")
+            self.assertGreater(sm.shadow.hits, 0)
+            self.assertEqual(emu.level["volt"], 0.6)
+            sm.setNPLC(0.5)
+            self.assertEqual(emu.nplc, 0.5)
+            sm.write("*rst")
+            self.assertEqual(sm.shadow.state, {})
+            sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.5, senseRange="a")
+            self.assertGreater(sm.shadow.misses, misses)
+            self.assertEqual(emu.prot["curr"], 0.04)
+            self.assertEqual(sm.measure()[0][0], 0.5)
+            sm.disconnect()
+
+    def test_k2xxx_batch_errors(self):
+        """an error in a 2600 batch gets reported once, later batches find the queue empty and keep the shadow"""
+        with SmuEmulator(dialect="2600", point_time=self.point_time) as emu:
+            sm = k2xxx(emu.address, timeout=2, **self.caches())
+            sm.connect()
+            with self.assertLogs(sm.lg, "WARNING") as logs:
+                with sm.batch():
+                    sm.write("bogus.thing()")
+            self.assertIn("Program syntax", logs.output[0])
+            self.assertEqual(sm.query("print(errorqueue.count)"), "0.00000e+00")
+            sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.5, senseRange="a")
+            hits, misses = sm.shadow.hits, sm.shadow.misses
+            sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.5, senseRange="a")
+            self.assertEqual(sm.shadow.misses, misses)
+            self.assertGreater(sm.shadow.hits, hits)
+            self.assertEqual(emu.errors, [])
+            sm.disconnect()
+
+    def test_amsmu_shadow(self):
+        """repeated setups skip the unchanged writes along with their error checks"""
+        with SmuEmulator(dialect="am", point_time=self.point_time) as emu:
+            sm = AmSmu(emu.address, line_frequency=50)
+            sm.connect()
+            sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.5)
+            n_commands = emu.n_commands
+            sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.5)
+            self.assertLess(emu.n_commands - n_commands, n_commands)
+            self.assertGreater(sm.shadow.hits, 0)
+            self.assertEqual(sm.measure()[0][0], 0.5)
+            sm.disconnect()
+
+    def test_k2xxx_tsp_scripts(self):
+        """2600 sweeps and tracking run from scripts that get uploaded once"""
+        with SmuEmulator(dialect="2600", point_time=self.point_time) as emu:
+            sm = k2xxx(emu.address, timeout=2, **self.caches())
+            sm.stream_latency = 0.05
+            sm.connect()
+            sm.setupSweep(compliance=0.04, nPoints=11, start=0, end=1)
+            data = sm.measure(11)
+            self.assertEqual(len(data), 11)
+            self.assertAlmostEqual(data[-1][0], 1)
+            self.assertLess(data[0][1], 0)
+            n_commands = emu.n_commands
+            sm.measure(11)
+            self.assertEqual(emu.n_commands - n_commands, 1)  # just the call
+
+            sm.setupDC(compliance=0.04, setPoint=0.5, senseRange="a")
+            self.assertEqual(len(sm.measure()), 1)
+            data = sm.track(0.5, 0.02, t_dwell=0.5, v_limits=(0, 2))
+            self.assertGreater(max(m[0] for m in data), 0.85)  # climbed to the max power point
+            self.assertLess(max(m[0] for m in data), 1.0)  # and stays there
+            self.assertEqual(len(emu.tsp_scripts), 2)
+            sm.disconnect()
+
+            sm.connect()  # the scripts are still on the instrument
+            sm.setupSweep(compliance=0.04, nPoints=3, start=0, end=1)
+            self.assertEqual(len(sm.measure(3)), 3)
+            self.assertEqual(len(emu.tsp_scripts), 2)
+            self.assertEqual(emu.errors, [])
+            sm.disconnect()
+
+    def test_k2xxx_fast_reconnect(self):
+        """after a clean disconnect, connecting again skips the resets and self test"""
+        with tempfile.TemporaryDirectory() as tmp, SmuEmulator(dialect="2400", point_time=self.point_time) as emu:
+            sessions = SessionStore(pathlib.Path(tmp) / "sessions.json")
+            sm = k2xxx(emu.address, timeout=2, **self.caches(sessions=sessions))
+            n_commands = emu.n_commands
+            sm.connect()
+            sm.query("*opc?")  # a round trip, so the emulator's handled everything connect() sent before we count
+            n_full = emu.n_commands - n_commands
+            self.assertIsNone(sessions.recall(emu.address, sm.session_settings()))  # a session's open
+            sm.disconnect()
+            self.assertEqual(sessions.recall(emu.address, sm.session_settings())["idn"], sm.idn)
+
+            sm = k2xxx(emu.address, timeout=2, **self.caches(sessions=sessions))
+            n_commands = emu.n_commands
+            sm.connect()
+            sm.query("*opc?")
+            self.assertLess(emu.n_commands - n_commands, n_full)
+            sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.5, senseRange="a")
+            self.assertEqual(len(sm.measure()), 1)
+            sm.ser.close()  # without a clean disconnect
+
+            sm = k2xxx(emu.address, timeout=2, **self.caches(sessions=sessions))
+            n_commands = emu.n_commands
+            sm.connect()
+            sm.query("*opc?")
+            self.assertEqual(emu.n_commands - n_commands, n_full)
+            self.assertEqual(emu.errors, [])
+            sm.disconnect()
+
+    def test_k2xxx_sweep_timing(self):
+        """sweep timeouts tighten up once the driver has seen how long its sweeps take, and that's remembered"""
+        with tempfile.TemporaryDirectory() as tmp, SmuEmulator(dialect="2400", point_time=0.005) as emu:
+            path = pathlib.Path(tmp) / "timing.json"
+            sm = k2xxx(emu.address, timeout=2, fast_reconnect=False, **self.caches(timing=SweepTiming(path)))
+            sm.connect()
+            sm.setupSweep(compliance=0.04, nPoints=21, start=0, end=1)
+            t_modelled = sm.ser.timeout
+            self.assertGreater(t_modelled, 10)  # the manual's numbers and a big transfer allowance
+            t0 = time.perf_counter()
+            sm.measure(21)
+            t_sweep = time.perf_counter() - t0
+            self.assertAlmostEqual(sm.expected_sweep_time(21), t_sweep, delta=t_sweep * 0.5)
+            sm.setupSweep(compliance=0.04, nPoints=21, start=0, end=1)
+            self.assertLess(sm.ser.timeout, 2)
+            self.assertGreater(sm.ser.timeout, t_sweep)
+            self.assertEqual(len(sm.measure(21)), 21)
+            sm.setupSweep(compliance=0.04, nPoints=21, start=0, end=1, stepDelay=0.01)
+            self.assertGreater(sm.ser.timeout, 10)  # a different configuration to learn
+            sm.disconnect()
+
+            sm = k2xxx(emu.address, timeout=2, fast_reconnect=False, **self.caches(timing=SweepTiming(path)))
+            sm.connect()
+            sm.setupSweep(compliance=0.04, nPoints=21, start=0, end=1)
+            self.assertLess(sm.ser.timeout, 2)
+            sm.disconnect()
+
+    def test_k2xxx_transports(self):
+        """LAN instruments get the TCP transport unless asked not to, both give the same readings"""
+        with SmuEmulator(dialect="2600", point_time=self.point_time) as emu:
+            sweeps = []
+            for direct_tcp in (True, False):
+                sm = k2xxx(emu.address, timeout=2, direct_tcp=direct_tcp, fast_reconnect=False, **self.caches())
+                sm.connect()
+                self.assertEqual(isinstance(sm.ser, TcpTransport), direct_tcp)
+                sm.setupSweep(compliance=0.04, nPoints=11, start=0, end=1, senseRange="a")
+                sweeps.append([m[:2] for m in sm.measure(11)])
+                sm.disconnect()
+            self.assertEqual(sweeps[0], sweeps[1])
+            self.assertEqual(emu.errors, [])
+
+    def test_k2xxx_async(self):
+        """one event loop measures with several smus at once, waiting for their readings without a thread each"""
+        dialects = ["2400", "2600", "2400", "2600"]
+        with contextlib.ExitStack() as stack:
+            emus = [stack.enter_context(SmuEmulator(dialect=dialect, point_time=0.01)) for dialect in dialects]
+            sms = [k2xxx(emu.address, timeout=2, **self.caches()) for emu in emus]
+            for sm in sms:
+                sm.connect()
+                stack.callback(sm.disconnect)
+
+            async def run():
+                asms = [AsyncSMU(sm) for sm in sms]
+                self.assertTrue(all(asm.awaitable for asm in asms))
+                await asyncio.gather(*(asm.setupSweep(compliance=0.04, nPoints=31, start=0, end=1, senseRange="a") for asm in asms))
+                t0 = time.monotonic()
+                sweeps = await asyncio.gather(*(asm.measure(31) for asm in asms))
+                elapsed = time.monotonic() - t0
+                await asyncio.gather(*(asm.setupDC(compliance=0.04, setPoint=0.5, senseRange="a") for asm in asms))
+                dwells = await asyncio.gather(*(asm.measure_until(n_measurements=3) for asm in asms))
+                return sweeps, elapsed, dwells
+
+            sweeps, elapsed, dwells = asyncio.run(run())
+            for sweep, dwell in zip(sweeps, dwells):
+                self.assertEqual(len(sweep), 31)
+                self.assertAlmostEqual(sweep[-1][0], 1, places=5)
+                self.assertEqual(len(dwell), 3)
+            self.assertLess(elapsed, 0.31 * len(sms) * 0.75)  # the sweeps overlapped
+            self.assertEqual([sm.measure(1)[0][0] for sm in sms], [dwell[-1][0] for dwell in dwells])  # and the sync API still works after
+
+    def test_k2xxx_channels(self):
+        """a 2636's channels as two smus on one connection, their sweeps made together with one transfer for both"""
+        with SmuEmulator(dialect="2600", point_time=0.01) as emu:
+            sma = k2xxx(emu.address, timeout=2, fast_reconnect=False, **self.caches())
+            smb = k2xxx(emu.address, timeout=2, fast_reconnect=False, channel="b", **self.caches())
+            sma.connect()
+            smb.connect()
+            self.assertIs(smb.ser, sma.ser)
+            self.assertTrue(sma.shared and smb.shared)
+            sma.setupSweep(compliance=0.04, nPoints=31, start=0, end=1, senseRange="a")
+            smb.setupSweep(compliance=0.04, nPoints=31, start=1, end=0, senseRange="a")
+            with concurrent.futures.ThreadPoolExecutor(2) as pool:
+                t0 = time.monotonic()
+                sweep_a, sweep_b = pool.map(lambda sm: sm.measure(31), (sma, smb))
+                elapsed = time.monotonic() - t0
+            self.assertIn("dual", emu.tsp_functions.values())
+            self.assertLess(elapsed, 2 * 31 * 0.01 * 0.75)  # the sweeps overlapped
+            self.assertAlmostEqual(sweep_a[-1][0], 1, places=5)
+            self.assertAlmostEqual(sweep_b[-1][0], 0, places=5)
+            self.assertAlmostEqual(sweep_a[0][2], sweep_b[0][2], places=2)  # measured side by side
+
+            sma.setupDC(compliance=0.04, setPoint=0.5, senseRange="a")
+            smb.setupDC(compliance=0.04, setPoint=0.3, senseRange="a")
+            with concurrent.futures.ThreadPoolExecutor(2) as pool:
+                dwell_a, dwell_b = pool.map(lambda sm: sm.measure_until(n_measurements=10), (sma, smb))
+            self.assertEqual({m[0] for m in dwell_a}, {0.5})
+            self.assertEqual({m[0] for m in dwell_b}, {0.3})
+
+            smb.disconnect()
+            self.assertFalse(sma.shared)
+            self.assertEqual(sma.measure()[0][0], 0.5)  # channel a carries on
+            self.assertEqual(emu.errors, [])
+            sma.disconnect()
+
+    def test_k2xxx_list_sweep(self):
+        """list sweeps go through the levels given, in order"""
+        levels = [0.0, 0.5, 0.8, 0.85, 0.9, 1.0]
+        for dialect in ("2400", "2600"):
+            with self.subTest(dialect=dialect), SmuEmulator(dialect=dialect, point_time=self.point_time) as emu:
+                sm = k2xxx(emu.address, timeout=2, **self.caches())
+                sm.connect()
+                sm.setupSweep(compliance=0.04, senseRange="a", levels=levels)
+                data = sm.measure(len(levels))
+                for m, level in zip(data, levels, strict=True):
+                    self.assertAlmostEqual(m[0], level, places=5)
+                sm.setupSweep(compliance=0.04, senseRange="a", nPoints=3, start=0, end=1)  # back to a linear sweep
+                self.assertAlmostEqual(sm.measure(3)[1][0], 0.5, places=5)
+                with self.assertRaises(ValueError):
+                    sm.setupSweep(levels=[0.0] * (sm.list_max_points + 1))
+                self.assertEqual(emu.errors, [])
+                sm.disconnect()
+
+    def test_k2xxx_filter(self):
+        """a dwell averaged by the instrument's repeat filter, which gets turned back off after"""
+        for dialect in ("2400", "2600"):
+            with self.subTest(dialect=dialect), SmuEmulator(dialect=dialect, point_time=self.point_time) as emu:
+                cfg = {"virtual": False, "address": emu.address, "timeout": 2, "dwell_average": 4, "dwell_stat": "filter"}
+                sm = sourcemeter.factory(cfg)(**cfg, **self.caches())
+                sm.connect()
+                sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.5, senseRange="a")
+                data = sm.measure_until(n_measurements=3, shaped=True)
+                self.assertEqual(len(data), 3)
+                self.assertEqual(emu.filter_count, 4)
+                self.assertEqual(sm.filter_count, 1)
+                self.assertEqual(sm.measure()[0][0], 0.5)  # a round trip, so the filter's off by now
+                self.assertFalse(emu.filter_on)
+                sm.dwell_average = sm.filter_max_count + 1  # more than the filter takes, so they get averaged here
+                emu.filter_count = 10
+                data = sm.measure_until(n_measurements=2, shaped=True)
+                self.assertEqual(len(data), 2)
+                self.assertEqual(emu.filter_count, 10)
+                self.assertEqual(emu.errors, [])
+                sm.disconnect()
+
+    def test_mppt_po(self):
+        """perturb and observe driven from here, for smus that can't do it themselves"""
+        with SmuEmulator(dialect="2400", point_time=self.point_time) as emu:
+            sm = k2xxx(emu.address, timeout=2, **self.caches())
+            sm.connect()
+            self.assertFalse(sm.tracks_onboard)
+            mppt = MPPT(sm)
+            mppt.Voc = 1.1
+            mppt.Vmpp = 0.5
+            data, ssvocs = mppt.launch_tracker(duration=1, extra="po://20:0")
+            self.assertGreater(max(m[0] for m in data), 0.85)
+            self.assertLess(max(m[0] for m in data), 1.0)
+            sm.disconnect()
+
+    def test_mppt_po_limit(self):
+        """perturb and observe started at its voltage limit, heading out of it, turns back"""
+        for dialect in ("2400", "2600"):  # from here, and on the instrument
+            with self.subTest(dialect=dialect), SmuEmulator(dialect=dialect, point_time=self.point_time) as emu:
+                sm = k2xxx(emu.address, timeout=2, **self.caches())
+                sm.connect()
+                if sm.tracks_onboard:
+                    sm.setupDC(compliance=0.04, setPoint=0.0001, senseRange="a")
+                    data = sm.track(0.0001, -0.02, t_dwell=1, v_limits=(0.0001, float("Infinity")))
+                else:
+                    mppt = MPPT(sm)
+                    mppt.Voc = 1.1
+                    mppt.Vmpp = 0.0001  # right at the limit
+                    data, ssvocs = mppt.launch_tracker(duration=1, extra="po://-20:0")
+                self.assertGreaterEqual(min(m[0] for m in data), 0)
+                self.assertGreater(max(m[0] for m in data), 0.85)
+                sm.disconnect()
+
+    def test_amsmu(self):
+        with SmuEmulator(dialect="am", point_time=self.point_time) as emu:
+            sm = AmSmu(emu.address, line_frequency=50)
+            sm.connect()
+            sm.setupDC(sourceVoltage=False, compliance=2, setPoint=0.0)
+            [(v, i, t, status)] = sm.measure()
+            self.assertGreater(v, 0.5)  # open circuit voltage
+            sm.setupSweep(compliance=0.04, nPoints=21, start=1, end=0)
+            data = sm.measure(21)
+            self.assertEqual(len(data), 21)
+            self.assertAlmostEqual(data[-1][0], 0)
+            sm.disconnect()
+
+    def test_amsmu_deferred_errors(self):
+        """one error check for a batch of writes, with the bad command found by bisection"""
+        with SmuEmulator(dialect="am", point_time=self.point_time) as emu:
+            sm = AmSmu(emu.address, line_frequency=50)
+            sm.connect()
+            n_commands = emu.n_commands
+            with sm.deferred():
+                sm.write("sour:func volt")
+                sm.write("sour:volt 0.1")
+                sm.write("sens:curr:prot 0.05")
+            self.assertEqual(emu.n_commands - n_commands, 4)
+            cmds = ["sour:volt 0.1", "sour:volt abc", "sour:volt 0.2", "sens:curr:prot 0.03", "outp 1"]
+            with self.assertRaisesRegex(ValueError, "sour:volt abc"):
+                with sm.deferred():
+                    for cmd in cmds:
+                        sm.write(cmd)
+            self.assertEqual(emu.level["volt"], 0.2)  # what came after the bad command still holds
+            self.assertEqual(emu.prot["curr"], 0.03)
+            sm.lazy_errors = True
+            sm.write("sour:volt xyz")
+            with self.assertRaisesRegex(ValueError, "sour:volt xyz"):
+                sm.measure()
+            self.assertEqual(sm.measure()[0][0], 0.2)
+            sm.disconnect()
+
+    def test_amsmu_deferred_errors_unreproduced(self):
+        """an error that doesn't happen again when the batch is replayed gets blamed on the whole batch, and the output isn't switched again"""
+        path = pathlib.Path(self.tmp.name) / "am.ccap"
+        with SmuEmulator(dialect="am", point_time=self.point_time) as emu, Recorder(emu.address, str(path)) as rec:
+            sm = AmSmu(rec.address, line_frequency=50)
+            sm.connect()
+            cmds = ["sour:volt 0.1", "outp 1", "sour:volt 0.2"]
+            with self.assertRaisesRegex(ValueError, "sour:volt 0.1; outp 1; sour:volt 0.2"):
+                with sm.deferred():
+                    for cmd in cmds:
+                        sm.write(cmd)
+                    emu.error(-221, "Settings conflict")  # down to a state the replays don't recreate
+            sm.disconnect()
+        sent = [line for event in load(str(path))[1] if event.kind == TX for line in event.data.decode().splitlines()]
+        self.assertEqual(sent.count("outp 1"), 1)
+
+    def test_amsmu_restore(self):
+        """the journaled settings go back in after the smu loses them"""
+        with SmuEmulator(dialect="am", point_time=self.point_time) as emu:
+            sm = AmSmu(emu.address, line_frequency=50)
+            sm.connect()
+            sm.setupDC(sourceVoltage=True, compliance=0.03, setPoint=0.4)
+            sm.setNPLC(0.5)
+            self.assertEqual(sm._journal[sm.journal_order.index("source_voltage")], 0.4)
+            emu.reset()  # what a watchdog reset does
+            sm.shadow.invalidate()
+            sm._restore_state()
+            self.assertEqual((emu.src, emu.level["volt"], emu.prot["curr"], emu.nplc, emu.output), ("volt", 0.4, 0.03, 0.5, True))
+            sm.disconnect()
+
+    def test_latency(self):
+        """every reply waits out the configured turnaround"""
+        with SmuEmulator(dialect="2400", latency=0.05) as emu:
+            with socket.create_connection((emu.host, emu.port), timeout=2) as s:
+                s.sendall(b"*IDN?\n")
+                s.settimeout(0.02)
+                with self.assertRaises(socket.timeout):
+                    s.recv(4096)
+                s.settimeout(2)
+                self.assertIn(b"MODEL 2400", s.recv(4096))
+
+    def test_mc(self):
+        """mux selection and motion through the telnet prompt"""
+        with McEmulator(muxes=["A", "B"]) as emu, MC(f"{emu.host}:{emu.port}", timeout=1, expected_muxes=["A", "B"]) as mc:
+            self.assertEqual(mc.detected_muxes, ["A", "B"])
+            self.assertEqual(mc.detected_axes, ["1"])
+            mc.set_mux([("A", 3)])
+            self.assertEqual(emu.selected, [f"A{mc.snaith_mux_pixel_lookup[3]}"])
+            me = Motion("us://mc?el=125&spm=6400", pcb_object=mc)
+            self.assertEqual(me.connect(), 0)
+            me.goto([50.0])
+            self.assertAlmostEqual(me.get_position()["1"], 50.0, places=2)
+
+    def test_mc_faults(self):
+        """the driver retries through lost commands and error replies"""
+        with McEmulator(seed=1) as emu, MC(f"{emu.host}:{emu.port}", timeout=0.2) as mc:
+            emu.p_drop = 0.2  # only after connecting, the probes don't retry
+            emu.p_error = 0.2
+            for pad in range(1, 9):
+                mc.set_mux([("A", pad)])
+            self.assertGreater(emu.n_dropped + emu.n_errors, 0)
+            self.assertEqual(emu.selected[-1], f"A{mc.snaith_mux_pixel_lookup[8]}")
+
+    def test_wavelabs(self):
+        with WavelabsEmulator(recipes=["AM1.5G"]) as emu:
+            wl = Wavelabs(kind="wavelabs-relay", address=f"{emu.host}:{emu.port}", active_recipe="AM1.5G", intensity=50)
+            self.assertEqual(wl.connect(), 0)
+            self.assertEqual(wl.get_intensity(), "50")
+            self.assertEqual(wl.on(), "1")
+            self.assertEqual(wl.get_run_status(), "Running")
+            self.assertEqual(wl.off(), 0)
+            with self.assertRaises(ValueError):
+                wl.activate_recipe("nope")
+            emu.p_error = 1
+            with self.assertRaises(ValueError):
+                wl.get_run_status()
+            wl.disconnect()
+
+    def test_wavelabs_direct(self):
+        """the Wavelabs software connects to us"""
+        emu = WavelabsEmulator()
+        with socket.create_server(("127.0.0.1", 0)) as s:
+            port = s.getsockname()[1]  # a free port
+        wl = Wavelabs(kind="wavelabs", address=f"127.0.0.1:{port}", connection_timeout=5)
+        emu.dial("127.0.0.1", port)
+        self.assertEqual(wl.connect(), 0)
+        self.assertEqual(wl.activate_recipe("AM1.5G"), 0)
+        wl.disconnect()
+
+    def test_i7540d(self):
+        with I7540dEmulator(muxes=["A", "B"]) as emu:
+            mux = Mux481can(emu.host, expected_muxes=["A", "B"])
+            mux.gateway.CAN_PORT = emu.ports["can"]
+            mux.gateway.DEVICE_PORT = emu.ports["device"]
+            mux.enabled = True
+            mux.connect()
+            self.assertEqual(mux.get_board_idn(2), "Ark,MUX481,12345678,1.0.0")
+            mux.set_mux([("B", "5")])
+            self.assertEqual(mux.get_pins(2), [29, 31])
+            self.assertEqual(emu.boards[1].pins, 0)
+            with self.assertRaises(ValueError):
+                mux._query(1, [ord("x")])  # fine on the bus, but the board doesn't know it
+            emu.p_error = 1
+            with self.assertRaises(RuntimeError):  # every try sees bus errors
+                mux.get_pins(2)
+            self.assertEqual(emu.n_errors, mux.MAX_RETRIES)  # one bus error and gateway reboot per try
+            mux.disconnect()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+import numpy
+
+from centralcontrol import readings
+
+
+class ReadingsTestCase(unittest.TestCase):
+    """testing for the smu reading decoder"""
+
+    def test_decode(self):
+        """ASCII responses decode to the tuples the drivers have always returned"""
+        raw = b"+1.000000E-01,-2.000000E-02,+1.500000E+00,+2.150800E+04,+2.000000E-01,-1.000000E-02,+1.600000E+00,+2.150800E+04\x00"
+        rec = readings.decode(raw)
+        self.assertEqual(rec.dtype.names, readings.FIELDS)
+        numpy.testing.assert_array_equal(rec["v"], [0.1, 0.2])
+        self.assertEqual(rec.tolist(), [(0.1, -0.02, 1.5, 21508), (0.2, -0.01, 1.6, 21508)])
+        self.assertIsInstance(rec.tolist()[0][-1], int)
+        self.assertEqual(readings.decode(raw.decode()).tolist(), rec.tolist())
+        self.assertEqual(len(readings.decode(b"")), 0)
+        with self.assertRaises(ValueError):
+            readings.decode(raw + b",1")
+
+    def test_decode_r(self):
+        """5 field readings, sent by the smu or with r derived"""
+        rec = readings.decode([1.0, 0.5, 2.0, 3.0, 0.0], r=True)
+        self.assertEqual(rec.dtype.names, readings.FIELDS_R)
+        self.assertEqual(rec.tolist(), [(1.0, 0.5, 2.0, 3.0, 0)])
+        rec = readings.decode("1,0.5,3000,0,1,0,4000,0", r=True, fields=4, t_div=1000)
+        self.assertEqual(rec["r"][0], 2.0)
+        self.assertEqual(rec["r"][1], numpy.inf)
+        numpy.testing.assert_array_equal(rec["t"], [3.0, 4.0])
+
+    def test_sweep_stats(self):
+        rec = readings.decode([1.0, 0, 0.5, 0, 0.0, 0, 2.5, 0])
+        duration, stats = readings.sweep_stats(rec)
+        self.assertEqual(duration, 2.0)
+        self.assertIn("mean sweep rate=+0.500V/s", stats)
+
+    def test_aggregate(self):
+        """blocks of readings combine into one each, the short last one too, with status flags kept"""
+        rec = readings.decode([1.0, 0.1, 0.0, 0, 3.0, 0.3, 1.0, 2, 5.0, 0.5, 2.0, 0, 7.0, 0.7, 3.0, 1, 9.0, 0.9, 4.0, 0])
+        mean = readings.aggregate(rec, 2)
+        numpy.testing.assert_allclose(mean["v"], [2.0, 6.0, 9.0])
+        numpy.testing.assert_allclose(mean["i"], [0.2, 0.6, 0.9])
+        numpy.testing.assert_allclose(mean["t"], [0.5, 2.5, 4.0])
+        numpy.testing.assert_array_equal(mean["status"], [2, 1, 0])
+        numpy.testing.assert_allclose(readings.aggregate(rec, 2, "std")["v"], [1.0, 1.0, 0.0])
+        self.assertIs(readings.aggregate(rec, 1), rec)
+        with self.assertRaises(ValueError):
+            readings.aggregate(rec, 2, "mode")
+
+    def test_aggregator(self):
+        """readings coming in a few at a time combine the same as all at once"""
+        rec = readings.decode(numpy.arange(28.0))
+        chunks = []
+        agg = readings.Aggregator(3, "max", chunks.append)
+        for k in range(0, len(rec), 2):
+            agg.add(rec[k : k + 2].tolist())
+        self.assertEqual(len(agg.rows), 2)  # 7 readings, the last waits for its block
+        agg.flush()
+        self.assertEqual(agg.rows, readings.aggregate(rec, 3, "max").tolist())
+        self.assertEqual(sum(chunks, []), agg.rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
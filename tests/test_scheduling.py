@@ -0,0 +1,142 @@
+import concurrent.futures
+import threading
+import unittest
+
+from centralcontrol import virt
+from centralcontrol.fabric import Fabric
+from centralcontrol.illumination import ElasticBarrier
+from centralcontrol.illumination import factory as ill_fac
+from centralcontrol.sourcemeter import factory as smu_fac
+
+
+class SchedulingTestCase(unittest.TestCase):
+    """testing for device scheduling"""
+
+    smucfg = {"enabled": True, "virtual": True}
+    sscfg = {"enabled": True, "virtual": True, "intensity": 100}
+
+    def test_elastic_barrier_leave(self):
+        """a party leaving releases the ones already waiting"""
+        trips = []
+        b = ElasticBarrier(3, action=lambda: trips.append(1), timeout=5)
+        waiters = [threading.Thread(target=b.wait) for i in range(2)]
+        for w in waiters:
+            w.start()
+        while b.n_waiting < 2:
+            pass
+        b.leave()
+        for w in waiters:
+            w.join(timeout=5)
+        self.assertEqual(len(trips), 1)
+        self.assertEqual(b.parties, 2)
+        self.assertFalse(b.broken)
+
+    def test_conflicting_light_requests(self):
+        """a thread whose light request lost out at the barrier waits for its own level instead of measuring at the wrong one"""
+        seen = {}
+        with ill_fac(self.sscfg)(**self.sscfg) as ss:
+            ss.n_sync = 2
+
+            def worker(value: int):
+                ss.intensity = value
+                seen[value] = ss.intensity
+                ss.leave_sync()
+
+            with self.assertLogs(ss.lg, "WARNING"):
+                threads = [threading.Thread(target=worker, args=(value,)) for value in (50, 100)]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join(timeout=20)
+        self.assertEqual(seen, {50: 50, 100: 100})
+
+    def test_independent_slots(self):
+        """slot sharing between smus forces lockstep"""
+        shared = [[{"smui": 0, "mux_sel": ("A", 1)}, {"smui": 1, "mux_sel": ("A", 2)}]]
+        separate = [[{"smui": 0, "mux_sel": ("A", 1)}, {"smui": 1, "mux_sel": ("B", 1)}], [{"smui": 0, "mux_sel": ("A", 2)}]]
+        self.assertFalse(Fabric.independent_slots(shared))
+        self.assertTrue(Fabric.independent_slots(separate))
+
+    def test_per_smu_step(self):
+        """every device gets measured exactly once with light changes synchronized across the smus"""
+        group = []
+        for smui, dwells in enumerate([[0.05, 0.05, 0.05], [0.3]]):
+            for pad, dwell in enumerate(dwells):
+                group.append({"smui": smui, "mux_sel": (chr(ord("A") + smui), pad + 1), "dwell": dwell})
+        done = []
+
+        with virt.FakeMC() as mc, ill_fac(self.sscfg)(**self.sscfg) as ss:
+            smus = [smu_fac(self.smucfg)(**self.smucfg) for i in range(2)]
+
+            def job(device_dict: dict) -> list:
+                sm = smus[device_dict["smui"]]
+                ss.lit = False
+                ss.lit = True
+                data = sm.measure_until(t_dwell=device_dict["dwell"])
+                done.append(device_dict)
+                return data
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+                Fabric().per_smu_step(executor, group, smus, mc, ss, job)
+
+        self.assertCountEqual([d["mux_sel"] for d in done], [d["mux_sel"] for d in group])
+
+    def test_per_smu_step_failure(self):
+        """a device whose routine raises doesn't stop its smu's queue"""
+        group = [{"smui": 0, "mux_sel": ("A", pad + 1)} for pad in range(3)]
+        done = []
+
+        with virt.FakeMC() as mc, ill_fac(self.sscfg)(**self.sscfg) as ss:
+            smus = [smu_fac(self.smucfg)(**self.smucfg)]
+
+            def job(device_dict: dict) -> list:
+                if device_dict["mux_sel"] == ("A", 1):
+                    raise RuntimeError("broken device")
+                done.append(device_dict)
+                return smus[0].measure()
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+                with self.assertLogs(level="ERROR"):
+                    Fabric().per_smu_step(executor, group, smus, mc, ss, job)
+
+        self.assertEqual([d["mux_sel"] for d in done], [("A", 2), ("A", 3)])
+
+    def test_plan_phases(self):
+        """dark sweeps get grouped away from the phases that need light"""
+        args = {"i_dwell": 1, "i_dwell_check": True, "suns_voc": 0, "mppt_check": True, "mppt_dwell": 1, "v_dwell_check": True, "v_dwell": 1}
+        sweeps = [{"light_on": False, "first_direction": True}, {"light_on": True, "first_direction": True}]
+
+        default = Fabric.plan_phases(args, sweeps)
+        self.assertEqual([phase for phase, sweep in default], ["voc", "sweep", "sweep", "mppt", "jsc"])
+        self.assertEqual(Fabric.count_light_changes(default, args, lit=False), 3)
+
+        from_dark = Fabric.plan_phases(args, sweeps, lit=False)
+        self.assertEqual(from_dark[0], ("sweep", sweeps[0]))
+        self.assertEqual(Fabric.count_light_changes(from_dark, args, lit=False), 1)
+
+        from_light = Fabric.plan_phases(args, sweeps, lit=True)
+        self.assertEqual(from_light[-1], ("sweep", sweeps[0]))
+        self.assertEqual(Fabric.count_light_changes(from_light, args, lit=True), 1)
+        self.assertCountEqual(from_light, default)
+
+    def test_plan_sequence(self):
+        """devices measured one after the other get planned together, with no light change between them"""
+        args = {"i_dwell": 1, "i_dwell_check": True, "suns_voc": 0, "mppt_check": True, "mppt_dwell": 1, "v_dwell_check": True, "v_dwell": 1}
+        sweeps = [{"light_on": False, "first_direction": True}, {"light_on": True, "first_direction": True}]
+
+        sequence = Fabric.plan_sequence(args, sweeps, 3, lit=False)
+        self.assertEqual(sequence[0][0], ("sweep", sweeps[0]))
+        self.assertEqual(sequence[1][-1], ("sweep", sweeps[0]))
+        self.assertEqual(sequence[2], sequence[0])
+        self.assertEqual(Fabric.count_sequence_changes(sequence, args, lit=False), 3)
+        default = [Fabric.plan_phases(args, sweeps)] * 3
+        self.assertEqual(Fabric.count_sequence_changes(default, args, lit=False), 7)
+
+    def test_estimate_step_time(self):
+        """a step takes its dwells plus the smu's sweeps"""
+        args = {"i_dwell": 1, "i_dwell_check": True, "suns_voc": 0, "mppt_check": True, "mppt_dwell": 2, "v_dwell_check": False, "v_dwell": 4, "iv_steps": 101, "source_delay": 10}
+        sweeps = [{"light_on": False, "first_direction": True}, {"light_on": True, "first_direction": True}]
+        with smu_fac(self.smucfg)(**self.smucfg) as sm:
+            self.assertAlmostEqual(Fabric.estimate_step_time(args, sweeps, sm), 1 + 2 * 101 * 0.01 + 2)
+            sm.expected_sweep_time = lambda n_points, step_delay: 0.5  # what a learned timing would say
+            self.assertAlmostEqual(Fabric.estimate_step_time(args, sweeps, sm), 1 + 2 * 0.5 + 2)
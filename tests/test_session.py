@@ -0,0 +1,40 @@
+import json
+import pathlib
+import tempfile
+import time
+import unittest
+
+from centralcontrol.session import SessionStore
+
+
+class SessionTestCase(unittest.TestCase):
+    """testing for the session fingerprint store"""
+
+    def test_recall(self):
+        """only a recent clean session with the same settings counts"""
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SessionStore(pathlib.Path(tmp) / "sub" / "sessions.json", max_age=60)
+            settings = {"read_term": "\n"}
+            self.assertIsNone(store.recall("socket://a:1", settings))
+            store.closed("socket://a:1", settings, "Keithley Model 2400", clean=True)
+            store.closed("socket://b:1", settings, "Keithley Model 2450", clean=True)
+            self.assertEqual(store.recall("socket://a:1", settings)["idn"], "Keithley Model 2400")
+            self.assertIsNone(store.recall("socket://a:1", {"read_term": "\r"}))
+            store.opened("socket://a:1")
+            self.assertIsNone(store.recall("socket://a:1", settings))
+            self.assertIsNotNone(store.recall("socket://b:1", settings))
+            store.closed("socket://b:1", settings, "Keithley Model 2450", clean=False)
+            self.assertIsNone(store.recall("socket://b:1", settings))
+
+            sessions = {"socket://c:1": {"idn": "x", "settings": settings, "clean": True, "t_disconnect": time.time() - 120}}
+            store.path.write_text(json.dumps(sessions))
+            self.assertIsNone(store.recall("socket://c:1", settings))  # too old
+            store.closed("socket://a:1", settings, "Keithley Model 2400", clean=True)
+            self.assertEqual(list(store.load()), ["socket://a:1"])  # and dropped
+
+            store.path.write_text("{garbage")
+            self.assertIsNone(store.recall("socket://a:1", settings))
+
+
+if __name__ == "__main__":
+    unittest.main()
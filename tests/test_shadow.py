@@ -0,0 +1,34 @@
+import unittest
+
+from centralcontrol.shadow import Shadow
+from centralcontrol.shadow import canonical
+
+
+class ShadowTestCase(unittest.TestCase):
+    """testing for the instrument settings shadow"""
+
+    def test_canonical(self):
+        self.assertEqual(canonical(":SOURce:VOLTage:STARt"), "sour:volt:star")
+        self.assertEqual(canonical("sens1:curr:prot"), "sens:curr:prot")
+        self.assertEqual(canonical("*RST"), "*rst")
+
+    def test_needed(self):
+        """unchanged shadowed settings get skipped, related ones forgotten when something on their path changes"""
+        shadow = Shadow(frozenset({"sens:curr:prot", "sens:curr:prot:rsyn", "smua.measure.nplc"}), frozenset({"*rst"}))
+        self.assertTrue(shadow.needed(":SENSe:CURRent:PROTection 0.1"))
+        self.assertFalse(shadow.needed("sens:curr:prot 0.1"))
+        self.assertTrue(shadow.needed("sens:curr:prot 0.1", force=True))
+        self.assertTrue(shadow.needed("sens:curr:prot 0.2"))
+        self.assertTrue(shadow.needed("sens:curr:prot?"))
+        self.assertTrue(shadow.needed("sens:curr:prot:rsyn on"))
+        self.assertNotIn("sens:curr:prot", shadow.state)  # a sub setting can change its parent
+        self.assertTrue(shadow.needed("smua.measure.nplc = 1"))
+        self.assertFalse(shadow.needed("smua.measure.nplc=1"))
+        self.assertEqual(shadow.hits, 2)
+        self.assertTrue(shadow.needed("*rst"))
+        self.assertEqual(shadow.state, {})
+        self.assertTrue(shadow.needed("smua.measure.nplc = 1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import asyncio
 import unittest
 
 import centralcontrol.sourcemeter as sourcemeter
@@ -32,3 +33,41 @@ class SourcemeterTestCase(unittest.TestCase):
         smuc = sourcemeter.factory(self.cfg)  # use the factory to set up the class
         with smuc(**self.cfg) as sm:
             self.assertIsInstance(sm.idn, str)
+
+    def test_async(self):
+        """the async variants work for smus without watchable comms too (in a worker thread)"""
+        smuc = sourcemeter.factory(self.cfg)
+        with smuc(**self.cfg) as sm:
+
+            async def run():
+                self.assertFalse(sm.aio.awaitable)
+                await sm.asetupSweep(compliance=0.04, nPoints=11, start=0, end=1)
+                sweep = await sm.ameasure(11)
+                await sm.asetupDC(compliance=0.04, setPoint=0.5)
+                dwell = await sm.ameasure_until(n_measurements=2)
+                return sweep, dwell
+
+            sweep, dwell = asyncio.run(run())
+            self.assertEqual(len(sweep), 11)
+            self.assertEqual(len(dwell), 2)
+            with self.assertRaises(AssertionError):
+                asyncio.run(sm.asetupDC(setPoint=sm.voltage_limit * 2))  # the API's limits still apply
+
+    def test_paced_dwell(self):
+        """dwells on a fixed schedule, readings combined a few at a time"""
+        smuc = sourcemeter.factory(self.cfg)
+        with smuc(**self.cfg, dwell_period=0.05, dwell_average=3) as sm:
+            sm.setupDC(compliance=0.04, setPoint=0.5)
+            chunks = []
+            data = sm.measure_until(t_dwell=1.5, cb=chunks.append, shaped=True)
+            self.assertEqual(sum(chunks, []), data)
+            self.assertAlmostEqual(len(data), 10, delta=1)
+            spacing = (data[-2][2] - data[0][2]) / (len(data) - 2)
+            self.assertAlmostEqual(spacing, 0.15, delta=0.03)
+            self.assertEqual(len(sm.measure_until(n_measurements=2, shaped=True)), 2)  # counts combined readings
+            plain = sm.measure_until(t_dwell=0.3)  # only dwells that ask get shaped
+            self.assertGreater(len(plain), 10)
+            with self.assertRaises(ValueError):
+                sm.measure_until(n_measurements=2, shaped=True, interval=0.1)
+        with self.assertRaises(ValueError):
+            smuc(**self.cfg, dwell_stat="mode")
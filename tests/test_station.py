@@ -0,0 +1,59 @@
+import concurrent.futures
+import json
+import queue
+import unittest
+
+from centralcontrol.fabric import Fabric
+from centralcontrol.station import Station
+from centralcontrol.station import StationQueue
+
+
+def killed() -> bool:
+    """reports the kill signal state as seen by a station's worker process"""
+    return Fabric.pkiller.is_set()
+
+
+def publish_status() -> None:
+    """puts a message in the output queue from a station's worker process"""
+    Fabric.outq.put({"topic": "measurement/status", "payload": json.dumps("Busy"), "qos": 2})
+
+
+class StationTestCase(unittest.TestCase):
+    """testing for multi-station support"""
+
+    def test_namespace(self):
+        """the unnamed station keeps the legacy topics"""
+        self.assertEqual(Station().topic("measurement/status"), "measurement/status")
+        self.assertEqual(Station().runs_stream, "runs")
+        self.assertEqual(Station("b").topic("measurement/status"), "station/b/measurement/status")
+        self.assertEqual(Station("b").runs_stream, "station:b:runs")
+
+    def test_station_queue(self):
+        """topics get namespaced, everything else passes straight through"""
+        q = queue.SimpleQueue()
+        sq = StationQueue(q, Station("a").prefix)
+        sq.put({"topic": "progress", "payload": "{}"})
+        sq.put("die")
+        self.assertEqual(q.get()["topic"], "station/a/progress")
+        self.assertEqual(q.get(), "die")
+
+    def test_isolated_kill_signals(self):
+        """killing one station's process leaves the others alone"""
+        f = Fabric(stations=["a", "b"])
+        executors = {name: concurrent.futures.ProcessPoolExecutor(max_workers=1, initializer=Fabric.attach_station, initargs=(st.pkiller, st.bc_response, st.prefix)) for name, st in f.stations.items()}
+        try:
+            f.stations["a"].pkiller.set()
+            self.assertTrue(executors["a"].submit(killed).result(timeout=10))
+            self.assertFalse(executors["b"].submit(killed).result(timeout=10))
+        finally:
+            f.stations["a"].pkiller.clear()
+            for executor in executors.values():
+                executor.shutdown()
+
+    def test_worker_topics(self):
+        """messages sent from a station's worker land in its namespace"""
+        f = Fabric(stations=["b"])
+        st = f.stations["b"]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, initializer=Fabric.attach_station, initargs=(st.pkiller, st.bc_response, st.prefix)) as executor:
+            executor.submit(publish_status).result(timeout=10)
+        self.assertEqual(Fabric.outq.get()["topic"], "station/b/measurement/status")
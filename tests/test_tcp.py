@@ -0,0 +1,59 @@
+import socket
+import time
+import unittest
+
+from centralcontrol.tcp import TcpTransport
+
+
+class TcpTestCase(unittest.TestCase):
+    """testing for the TCP transport"""
+
+    def setUp(self):
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.tcp = TcpTransport(f"socket://127.0.0.1:{self.server.getsockname()[1]}", timeout=0.2, baudrate=9600)
+        self.peer, _ = self.server.accept()
+
+    def tearDown(self):
+        self.tcp.close()
+        self.peer.close()
+        self.server.close()
+
+    def test_read_until(self):
+        """terminated reads across packets, what's left over stays for the next read"""
+        self.peer.sendall(b"1,2,")
+        time.sleep(0.05)
+        self.peer.sendall(b"3\r4,5\r\r#0")
+        self.assertEqual(self.tcp.read_until(b"\r"), b"1,2,3\r")
+        self.assertEqual(self.tcp.read_until(b"\r"), b"4,5\r")
+        self.assertEqual(self.tcp.read_until(b"\r"), b"\r")
+        self.assertEqual(self.tcp.read(2), b"#0")
+        self.assertEqual(self.tcp.read_until(b"\r\n", size=3), b"")  # timed out
+        self.peer.sendall(b"abcdef\r\n")
+        self.assertEqual(self.tcp.read_until(b"\r\n", size=3), b"abc")
+        self.assertEqual(self.tcp.read_until(b"\r\n"), b"def\r\n")
+
+    def test_big(self):
+        """responses bigger than the receive buffer"""
+        payload = bytes(range(11, 256)) * 1000  # no terminators in there
+        self.peer.sendall(payload + b"\n")
+        self.tcp.timeout = 2
+        self.assertEqual(self.tcp.read(10), payload[:10])
+        self.assertEqual(self.tcp.read_until(b"\n"), payload[10:] + b"\n")
+
+    def test_write(self):
+        self.assertEqual(self.tcp.write(b"*IDN?\n"), 6)
+        self.assertEqual(self.peer.recv(16), b"*IDN?\n")
+        self.assertTrue(self.tcp._socket.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+
+    def test_reset_and_close(self):
+        self.peer.sendall(b"stale\n")
+        time.sleep(0.05)
+        self.tcp.reset_input_buffer()
+        self.assertEqual(self.tcp.in_waiting, 0)
+        self.peer.close()
+        with self.assertRaises(ConnectionError):
+            self.tcp.read(1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import pathlib
+import tempfile
+import unittest
+
+from centralcontrol.timing import SweepTiming
+
+
+class TimingTestCase(unittest.TestCase):
+    """testing for the learned sweep timing"""
+
+    def test_learning(self):
+        """the per point period and transfer time follow what the sweeps took"""
+        with tempfile.TemporaryDirectory() as tmp:
+            timing = SweepTiming(pathlib.Path(tmp) / "timing.json", weight=0.5, margin=2, slack=1)
+            timing.load("Keithley Model 2400")
+            key = timing.key(nplc=1.0, delay=-1)
+            self.assertEqual(key, timing.key(delay=-1, nplc=1.0))
+            self.assertIsNone(timing.expected(key, 101))
+            self.assertIsNone(timing.timeout(key, 101))
+
+            timing.observe(key, 101, t_sweep=2.0, t_total=2.52)  # 20ms per point, 0.5s to get it back
+            self.assertAlmostEqual(timing.expected(key, 101), 2.52)
+            self.assertAlmostEqual(timing.timeout(key, 101), 2.52 * 2 + 1)
+            timing.observe(key, 101, t_sweep=4.0, t_total=4.04)  # it got slower
+            self.assertAlmostEqual(timing.models[key]["period"], 0.03)
+            self.assertEqual(timing.models[key]["n"], 2)
+            timing.observe(key, 1, t_sweep=0.0, t_total=0.1)  # not a sweep
+            self.assertEqual(timing.models[key]["n"], 2)
+            self.assertIsNone(timing.expected(timing.key(nplc=10.0, delay=-1), 101))
+
+            timing.save()
+            again = SweepTiming(timing.path)
+            again.load("Keithley Model 2400")
+            self.assertEqual(again.models, timing.models)
+            again.load("Keithley Model 2450")
+            self.assertEqual(again.models, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
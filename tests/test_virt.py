@@ -0,0 +1,184 @@
+import threading
+import unittest
+
+import mpmath
+import numpy
+
+from centralcontrol import clock
+from centralcontrol import virt
+from centralcontrol.mppt import MPPT
+from centralcontrol.population import DevicePopulation
+
+
+class VirtTestCase(unittest.TestCase):
+    """testing for the simulated instruments"""
+
+    rtol = 1e-9
+    atol = 1e-15  # [A] for currents that cancel to ~zero (dark, near 0V), way below any real smu's resolution
+
+    def test_lambertw_exp(self):
+        """float64 W(exp(x)) matches mpmath, also where exp(x) overflows a double"""
+        x = numpy.concatenate([numpy.linspace(-700, 900, 1601), numpy.linspace(-3, 3, 601)])
+        ref = numpy.array([float(mpmath.lambertw(mpmath.exp(mpmath.mpf(v))).real) for v in x])
+        numpy.testing.assert_allclose(virt.lambertw_exp(x), ref, rtol=self.rtol)
+
+    def test_lambertw(self):
+        z = numpy.array([0, 1e-300, 1e-20, 0.1, 1, numpy.e, 10, 1e10, 1e300])
+        ref = numpy.array([float(mpmath.lambertw(v).real) for v in z])
+        numpy.testing.assert_allclose(virt.lambertw(z), ref, rtol=self.rtol)
+
+    def test_i_from_v_array(self):
+        """the vectorized device model matches the mpmath reference for every resistance case"""
+        sm = virt.FakeSMU()
+        V = numpy.linspace(-1, 1.2, 221)
+        I0 = sm.I0d / 1000
+        for Iph in [sm.Iphd / 1000, 0.0]:
+            for Rs, Rsh in [(1.8, 800), (0, 800), (1.8, float("inf")), (0, float("inf"))]:
+                with self.subTest(Iph=Iph, Rs=Rs, Rsh=Rsh):
+                    ref = numpy.array([sm.i_from_v(v, Rs, Rsh, Iph, I0, sm.n) for v in V])
+                    numpy.testing.assert_allclose(sm.i_from_v_array(V, Rs, Rsh, Iph, I0, sm.n), ref, rtol=self.rtol, atol=self.atol)
+
+    def test_sweep(self):
+        """a vectorized sweep gives the same curve and compliance flags as the point by point one"""
+        sm = virt.FakeSMU()
+        sm.use_tables = False
+        sm.connect()
+        sm.setupSweep(compliance=0.02, nPoints=201, start=-0.2, end=1.2)
+        with clock.using(clock.VirtualClock(speed=1000)):
+            fast = sm.measure()
+            sm.vectorized = False
+            ref = sm.measure()
+        self.assertEqual(len(fast), len(ref))
+        numpy.testing.assert_allclose([m[0] for m in fast], [m[0] for m in ref], rtol=self.rtol)
+        numpy.testing.assert_allclose([m[1] for m in fast], [m[1] for m in ref], rtol=self.rtol, atol=self.atol)
+        self.assertEqual([m[3] for m in fast], [m[3] for m in ref])
+        self.assertTrue(any(m[3] for m in fast))  # some points hit compliance
+        sm.disconnect()
+
+    def test_adaptive_sweep(self):
+        """a list sweep planned from the last curve finds the max power point better than a linear one with as many points"""
+        sm = virt.FakeSMU()
+        sm.connect()
+        mppt = MPPT(sm)
+        self.assertIsNone(mppt.plan_sweep(1.2, -0.2, 25))
+        with clock.using(clock.VirtualClock(speed=1000)):
+            sm.setupSweep(compliance=0.04, nPoints=401, start=1.2, end=-0.2)
+            ref = sm.measure()
+            mppt.register_curve(ref[::4])
+            p_max = max(-m[0] * m[1] for m in ref)
+            levels = mppt.plan_sweep(1.2, -0.2, 25)
+            self.assertEqual(len(levels), 25)
+            self.assertEqual((levels[0], levels[-1]), (1.2, -0.2))
+            self.assertTrue(all(a > b for a, b in zip(levels, levels[1:])))
+            sm.setupSweep(compliance=0.04, senseRange="a", levels=levels)
+            planned = sm.measure()
+            sm.setupSweep(compliance=0.04, nPoints=25, start=1.2, end=-0.2)
+            linear = sm.measure()
+        numpy.testing.assert_allclose([m[0] for m in planned if not m[3]], [level for level, m in zip(levels, planned) if not m[3]])  # where compliance didn't step in
+        self.assertLess(p_max - max(-m[0] * m[1] for m in planned), (p_max - max(-m[0] * m[1] for m in linear)) / 2)
+        with self.assertRaises(ValueError):
+            sm.setupSweep(levels=[0.0] * (sm.list_max_points + 1))
+        sm.disconnect()
+
+    def test_iv_table(self):
+        """table lookups track the exact model closely and fall back to it off the table's edges"""
+        sm = virt.FakeSMU()
+        Rs, Rsh, Iph, I0, n = (1.8, 800, sm.Iphd / 1000, sm.I0d / 1000, sm.n)
+        table = sm.iv_table(Rs, Rsh, Iph, I0, n)
+        assert table is not None
+        for V in numpy.linspace(table.V_range[0], table.V_range[1], 37):
+            I = sm.i_from_v(V, Rs, Rsh, Iph, I0, n)
+            self.assertAlmostEqual(sm.solve_i(V, Rs, Rsh, Iph, I0, n), I, delta=1e-7)
+            self.assertAlmostEqual(sm.solve_v(I, Rs, Rsh, Iph, I0, n), V, delta=1e-5)
+        self.assertIsNone(table.i_from_v(table.V_range[1] + 1))
+        V = table.V_range[1] + 1
+        self.assertEqual(sm.solve_i(V, Rs, Rsh, Iph, I0, n), sm.i_from_v(V, Rs, Rsh, Iph, I0, n))
+
+    def test_iv_table_lru(self):
+        """tables get reused per parameter set and the least recently used one gets evicted"""
+        sm = virt.FakeSMU()
+        sm.table_cache_size = 2
+        virt.FakeSMU._tables.clear()
+        params = [(1.8, 800 + i, sm.Iphd / 1000, sm.I0d / 1000, sm.n) for i in range(3)]
+        first = sm.iv_table(*params[0])
+        sm.iv_table(*params[1])
+        self.assertIs(sm.iv_table(*params[0]), first)  # hit, now most recently used
+        hits = virt.FakeSMU.table_hits
+        sm.iv_table(*params[2])  # evicts params[1]
+        self.assertEqual(len(virt.FakeSMU._tables), 2)
+        self.assertIs(sm.iv_table(*params[0]), first)
+        self.assertEqual(virt.FakeSMU.table_hits, hits + 1)
+        misses = virt.FakeSMU.table_misses
+        sm.iv_table(*params[1])
+        self.assertEqual(virt.FakeSMU.table_misses, misses + 1)
+        virt.FakeSMU._tables.clear()
+
+    def test_iv_table_threads(self):
+        """smus in their own threads can share the table cache while it's busy evicting"""
+        virt.FakeSMU._tables.clear()
+        errors = []
+
+        def worker(k: int):
+            sm = virt.FakeSMU()
+            sm.table_cache_size = 2
+            sm.table_points = 101
+            try:
+                for j in range(50):
+                    sm.iv_table(1.8, 800 + (j + k) % 5, sm.Iphd / 1000, sm.I0d / 1000, sm.n)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(k,)) for k in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(virt.FakeSMU._tables), 2)
+        virt.FakeSMU._tables.clear()
+
+    def test_population_reproducible(self):
+        """a device's parameters depend on the seed and its key, not on the order devices turn up in"""
+        keys = [f"{slot}{pad}" for slot in "ABC" for pad in range(1, 7)]
+        a = DevicePopulation(seed=3)
+        b = DevicePopulation(seed=3)
+        ia = a.add(keys, 0)
+        ib = b.add(keys[::-1], 0)[::-1]
+        for name in ["Iphd", "I0d", "n", "Rsa", "Rsha", "hysteresis"]:
+            numpy.testing.assert_array_equal(a.p[name][ia], b.p[name][ib])
+        c = DevicePopulation(seed=4)
+        ic = c.add(keys, 0)
+        self.assertFalse(numpy.array_equal(a.p["Iphd"][ia], c.p["Iphd"][ic]))
+
+    def test_population_faults(self):
+        pop = DevicePopulation(seed=0, p_open=0.1, p_short=0.1)
+        idx = pop.add([str(i) for i in range(1000)], 0)
+        p = pop.parameters(idx, 0)
+        self.assertAlmostEqual(numpy.mean(p["fault"] == DevicePopulation.OPEN), 0.1, delta=0.03)
+        self.assertAlmostEqual(numpy.mean(p["fault"] == DevicePopulation.SHORT), 0.1, delta=0.03)
+
+    def test_population_hysteresis(self):
+        """after holding at forward bias, a reverse sweep beats a forward one"""
+        sm = virt.FakeSMU(population={"seed": 7, "hysteresis": [0.1, 0.1], "p_open": 0, "p_short": 0})
+        sm.connect()
+        sm.pixel = "A1"
+        with clock.using(clock.VirtualClock(speed=1000)):
+            sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=1.2)
+            clock.sleep(30)
+            sm.setupSweep(compliance=0.04, nPoints=101, start=1.2, end=0)
+            reverse = sm.measure()
+            sm.setupSweep(compliance=0.04, nPoints=101, start=0, end=1.2)
+            forward = sm.measure()
+        self.assertGreater(max(-v * i for v, i, t, s in reverse), max(-v * i for v, i, t, s in forward))
+        sm.disconnect()
+
+    def test_population_drift(self):
+        """devices evolve in time, all at once"""
+        pop = DevicePopulation(seed=1, iph_drift=[-0.1, 0], soak_gain=[0, 0], hysteresis=[0, 0])
+        idx = pop.add([str(i) for i in range(500)], 0)
+        pop.step(idx, 3600, numpy.zeros(len(idx)), True)
+        numpy.testing.assert_allclose(pop.parameters(idx, 3600)["Iphd"], pop.p["Iphd"][idx] * 0.9)
+
+
+if __name__ == "__main__":
+    unittest.main()
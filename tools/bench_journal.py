@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+times AmSmu state property setters (with the smu's writes stubbed out): the old inspect based state recording vs the journal
+"""
+
+import argparse
+import inspect
+import timeit
+from collections import OrderedDict
+
+from centralcontrol.amsmu import AmSmu
+
+
+class InspectRecorded(object):
+    """a setter recorded the way AmSmu used to do it"""
+
+    def __init__(self):
+        self.__state = OrderedDict()
+
+    def write(self, cmd: str):
+        pass
+
+    def __update_state(self):
+        frame = inspect.currentframe()
+        caller_frame = frame.f_back
+        method_name = caller_frame.f_code.co_name
+        attr = getattr(self.__class__, method_name, None)
+        if isinstance(attr, property):
+            method = attr.fset
+        elif callable(attr):
+            method = attr
+        else:
+            raise TypeError(f"{method_name!r} is neither a property nor a method.")
+        sig = inspect.signature(method)
+        local_vars = dict(caller_frame.f_locals)
+        bound_args = sig.bind_partial(**local_vars)
+        if method in self.__state:
+            del self.__state[method]
+        self.__state[method] = bound_args
+
+    @property
+    def source_voltage(self) -> float:
+        return 0.0
+
+    @source_voltage.setter
+    def source_voltage(self, voltage: float):
+        self.write(f"sour:volt {voltage:0.8f}")
+
+        self.__update_state()
+
+
+class Unrecorded(InspectRecorded):
+    """the same setter with no recording at all, for the baseline"""
+
+    @property
+    def source_voltage(self) -> float:
+        return 0.0
+
+    @source_voltage.setter
+    def source_voltage(self, voltage: float):
+        self.write(f"sour:volt {voltage:0.8f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=100000)
+    pargs = parser.parse_args()
+
+    sm = AmSmu("socket://localhost:23", line_frequency=50)
+    sm.write = lambda cmd, force=False: None  # no instrument, just the setter's own work
+
+    subjects = {"unrecorded": Unrecorded(), "inspect": InspectRecorded(), "journal": sm}
+    res = {}
+    for name, subject in subjects.items():
+
+        def set_it(subject=subject):
+            subject.source_voltage = 0.5
+
+        res[name] = timeit.timeit(set_it, number=pargs.repeats) / pargs.repeats
+    print(", ".join(f"{name}={t * 1e6:.2f}us" for name, t in res.items()))
+    print(f"recording overhead: inspect={(res['inspect'] - res['unrecorded']) * 1e6:.2f}us, journal={(res['journal'] - res['unrecorded']) * 1e6:.2f}us per set")
+
+
+if __name__ == "__main__":
+    main()
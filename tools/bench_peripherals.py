@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+times the mux, motion and light drivers against local emulators of the control box (MC), the MUX-481-CAN gateway and the Wavelabs software
+reports commands per second on a clean link, and how long the drivers take to get through lost commands and errors
+"""
+
+import argparse
+import time
+
+from centralcontrol.emulator import Emulator
+from centralcontrol.emulator import I7540dEmulator
+from centralcontrol.emulator import McEmulator
+from centralcontrol.emulator import WavelabsEmulator
+from centralcontrol.mc import MC
+from centralcontrol.mux481can import Mux481can
+from centralcontrol.wavelabs import Wavelabs
+
+
+def timed(op, n: int) -> tuple[list[float], int]:
+    """runs op n times, returns the duration of each run and how many of them raised"""
+    durations = []
+    n_failed = 0
+    for i in range(n):
+        t0 = time.perf_counter()
+        try:
+            op(i)
+        except Exception:
+            n_failed += 1
+        durations.append(time.perf_counter() - t0)
+    return (durations, n_failed)
+
+
+def report(name: str, emu: Emulator, durations: list[float], n_failed: int):
+    durations = sorted(durations)
+    median = durations[len(durations) // 2]
+    print(f"{name:>9}: {len(durations) / sum(durations):8.1f} ops/s, median {median * 1000:6.2f}ms, worst {durations[-1] * 1000:8.2f}ms, {n_failed} failed ({emu.n_commands} commands, {emu.n_dropped} dropped, {emu.n_errors} errors)")
+
+
+def faults(emu: Emulator, pargs: argparse.Namespace):
+    """turns on fault injection (after connecting, since the connection sequences don't retry)"""
+    emu.p_drop = pargs.drop
+    emu.p_error = pargs.error
+
+
+def bench_mc(pargs: argparse.Namespace):
+    with McEmulator(latency=pargs.latency, seed=pargs.seed) as emu, MC(f"{emu.host}:{emu.port}", timeout=pargs.timeout) as mc:
+        faults(emu, pargs)
+        report("mc mux", emu, *timed(lambda i: mc.set_mux([("A", i % 8 + 1)]), pargs.n))
+
+
+def bench_can(pargs: argparse.Namespace):
+    with I7540dEmulator(muxes=["A"], latency=pargs.latency, seed=pargs.seed) as emu:
+        mux = Mux481can(emu.host, timeout=pargs.timeout, expected_muxes=["A"])
+        mux.gateway.CAN_PORT = emu.ports["can"]
+        mux.gateway.DEVICE_PORT = emu.ports["device"]
+        mux.enabled = True
+        mux.connect()
+        faults(emu, pargs)
+        report("can mux", emu, *timed(lambda i: mux.set_mux([("A", str(1 << (i % 32)))]), pargs.n))
+        mux.disconnect()
+
+
+def bench_wavelabs(pargs: argparse.Namespace):
+    with WavelabsEmulator(latency=pargs.latency, seed=pargs.seed) as emu:
+        wl = Wavelabs(kind="wavelabs-relay", address=f"{emu.host}:{emu.port}", comms_timeout=pargs.timeout, active_recipe="AM1.5G")
+        wl.connect()
+        faults(emu, pargs)
+        report("wavelabs", emu, *timed(lambda i: wl.set_intensity(50 + i % 50), pargs.n))
+        wl.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=200, help="operations per peripheral")
+    parser.add_argument("--latency", type=float, default=0.0, help="instrument turnaround time per reply [s]")
+    parser.add_argument("--drop", type=float, default=0.0, help="probability of a lost command")
+    parser.add_argument("--error", type=float, default=0.0, help="probability of an error reply")
+    parser.add_argument("--timeout", type=float, default=0.5, help="driver comms timeout [s], sets the cost of a lost command")
+    parser.add_argument("--seed", type=int, default=0)
+    pargs = parser.parse_args()
+
+    bench_mc(pargs)
+    bench_can(pargs)
+    bench_wavelabs(pargs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+times decoding smu readings: the old per-number parse and tuple building vs the shared vectorised decoder
+"""
+
+import argparse
+import timeit
+
+import numpy
+
+from centralcontrol import readings
+
+
+def response(points: int, fields: int) -> bytes:
+    """an ASCII read? response like the smus send"""
+    v = numpy.linspace(-0.2, 1.2, points)
+    i = (v - 1) * 2e-2
+    cols = [v, i, v / i, numpy.arange(points) * 0.01, numpy.full(points, 21508)]
+    if fields == 4:
+        del cols[2]
+    return ",".join(f"{x:+.6E}" for x in numpy.column_stack(cols).ravel()).encode() + b"\x00"
+
+
+def per_element(raw: bytes, fields: int) -> list[tuple]:
+    """the way the drivers used to do it"""
+    red_nums = [float(x.removesuffix("\x00")) for x in raw.decode().split(",")]
+    vals = []
+    for i in range(len(red_nums) // fields):
+        line = []
+        for j in range(fields):
+            line.append(red_nums[i * fields + j])
+        line[-1] = int(line[-1])
+        vals.append(tuple(line))
+    return vals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, nargs="+", default=[1, 101, 1001, 10001], help="readings per response")
+    parser.add_argument("--fields", type=int, default=4, choices=[4, 5])
+    parser.add_argument("--repeats", type=int, default=200)
+    pargs = parser.parse_args()
+
+    r = pargs.fields == 5
+    for points in pargs.points:
+        raw = response(points, pargs.fields)
+        assert per_element(raw, pargs.fields) == readings.decode(raw, r=r).tolist()
+        res = {}
+        res["per_element"] = timeit.timeit(lambda: per_element(raw, pargs.fields), number=pargs.repeats) / pargs.repeats
+        res["decode"] = timeit.timeit(lambda: readings.decode(raw, r=r), number=pargs.repeats) / pargs.repeats
+        res["decode+tolist"] = timeit.timeit(lambda: readings.decode(raw, r=r).tolist(), number=pargs.repeats) / pargs.repeats
+        print(f"{points:>6} points: " + ", ".join(f"{op}={t * 1e6:.1f}us" for op, t in res.items()))
+
+
+if __name__ == "__main__":
+    main()
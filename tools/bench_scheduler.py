@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+compares lockstep and per-smu queue (work stealing) device scheduling using virtual instruments
+every device gets a dark dwell followed by an illuminated dwell of random (seeded) length
+so some smus finish their devices much sooner than others, like a stuck compliance or a long mppt would
+"""
+
+import argparse
+import concurrent.futures
+import random
+import time
+
+from centralcontrol import virt
+from centralcontrol.fabric import Fabric
+from centralcontrol.illumination import factory as ill_fac
+from centralcontrol.sourcemeter import factory as smu_fac
+
+
+def build_run_queue(n_smus: int, n_groups: int, dwell_min: float, dwell_max: float, seed: int) -> list[list[dict]]:
+    """a run queue where each smu owns its own slot (so slots can be selected independently)"""
+    rng = random.Random(seed)
+    run_queue = []
+    for g in range(n_groups):
+        group = []
+        for smui in range(n_smus):
+            device_dict = {}
+            device_dict["smui"] = smui
+            device_dict["slot"] = chr(ord("A") + smui)
+            device_dict["pad"] = g + 1
+            device_dict["mux_sel"] = (device_dict["slot"], device_dict["pad"])
+            device_dict["pos"] = [0.0, 0.0, 0.0]
+            device_dict["dwell"] = rng.uniform(dwell_min, dwell_max)
+            group.append(device_dict)
+        run_queue.append(group)
+    return run_queue
+
+
+def run(work_stealing: bool, run_queue: list[list[dict]], dark_dwell: float) -> tuple[float, int]:
+    """measure everything in the run queue, returns the wall time and the number of light changes"""
+    smucfg = {"enabled": True, "virtual": True}
+    sscfg = {"enabled": True, "virtual": True, "intensity": 100}
+    n_smus = len(run_queue[0])
+    n_changes = 0
+
+    with virt.FakeMC() as mc, ill_fac(sscfg)(**sscfg) as ss:
+        smus = [smu_fac(smucfg)(**smucfg) for i in range(n_smus)]
+        for sm in smus:
+            sm.connect()
+        f = Fabric()
+
+        apply = ss.apply_intensity
+
+        def counting_apply(*args, **kwargs):
+            nonlocal n_changes
+            n_changes += 1
+            return apply(*args, **kwargs)
+
+        ss.apply_intensity = counting_apply
+        ss.n_sync = 1  # rebuild the barrier with the counting action
+
+        def job(device_dict: dict) -> list:
+            sm = smus[device_dict["smui"]]
+            sm.setupDC(sourceVoltage=False, compliance=sm.voltage_limit, setPoint=0.0, senseRange="a")
+            data = []
+            if dark_dwell > 0:
+                ss.lit = False
+                sm.intensity = 0
+                data += sm.measure_until(t_dwell=dark_dwell)
+            ss.lit = True
+            sm.intensity = 1
+            data += sm.measure_until(t_dwell=device_dict["dwell"])
+            sm.outOn(False)
+            return data
+
+        t0 = time.time()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=n_smus, thread_name_prefix="device") as executor:
+            if work_stealing:
+                group = [device_dict for group in run_queue for device_dict in group]
+                f.per_smu_step(executor, group, smus, mc, ss, job)
+            else:
+                for group in run_queue:
+                    ss.n_sync = len(group)
+                    f.lockstep_step(executor, group, smus, mc, job)
+        dt = time.time() - t0
+
+        for sm in smus:
+            sm.disconnect()
+        ss.apply_intensity(0)
+
+    return (dt, n_changes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--smus", type=int, default=4, help="number of virtual smus")
+    parser.add_argument("--groups", type=int, default=4, help="number of device groups")
+    parser.add_argument("--dwell-min", type=float, default=0.2, help="shortest illuminated dwell [s]")
+    parser.add_argument("--dwell-max", type=float, default=2.0, help="longest illuminated dwell [s]")
+    parser.add_argument("--dark", type=float, default=0.0, help="dark dwell before each illuminated one [s]")
+    parser.add_argument("--seed", type=int, default=0)
+    pargs = parser.parse_args()
+
+    run_queue = build_run_queue(pargs.smus, pargs.groups, pargs.dwell_min, pargs.dwell_max, pargs.seed)
+    ideal = max(sum(group[i]["dwell"] for group in run_queue) for i in range(pargs.smus))
+
+    lockstep_t, lockstep_n = run(False, run_queue, pargs.dark)
+    stealing_t, stealing_n = run(True, run_queue, pargs.dark)
+
+    print(f"lockstep:      {lockstep_t:7.2f} s, {lockstep_n} light changes")
+    print(f"work stealing: {stealing_t:7.2f} s, {stealing_n} light changes")
+    print(f"busiest smu's illuminated dwell total: {ideal:.2f} s")
+    print(f"speedup: {lockstep_t/stealing_t:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
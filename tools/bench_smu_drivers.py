@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+times the smu drivers' command/measure paths against local instrument emulators
+the link's latency and bandwidth can be set to look like the real thing (e.g. a serial-ethernet bridge or a 9600 baud line)
+"""
+
+import argparse
+import time
+
+from centralcontrol.amsmu import AmSmu
+from centralcontrol.emulator import SmuEmulator
+from centralcontrol.k2xxx import k2xxx
+
+
+def bench(dialect: str, points: int, repeats: int, latency: float, bandwidth: float | None, point_time: float, binary: bool = True, direct_tcp: bool = True) -> dict[str, float]:
+    """mean wall times [s] of the driver operations we care about"""
+    ret = {}
+    with SmuEmulator(dialect=dialect, latency=latency, bandwidth=bandwidth, point_time=point_time) as emu:
+        if dialect == "am":
+            sm = AmSmu(emu.address, line_frequency=50)
+            sense_range = "f"
+        else:
+            sm = k2xxx(emu.address, timeout=10, binary=binary, direct_tcp=direct_tcp, fast_reconnect=False)
+            sense_range = "a"
+        t0 = time.perf_counter()
+        sm.connect()
+        ret["connect"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for i in range(repeats):
+            sm.setupDC(sourceVoltage=True, compliance=0.04, setPoint=0.5, senseRange=sense_range)
+        ret["setupDC"] = (time.perf_counter() - t0) / repeats
+
+        t0 = time.perf_counter()
+        for i in range(repeats):
+            sm.measure()
+        ret["measure"] = (time.perf_counter() - t0) / repeats
+
+        if dialect != "2600":  # the driver's sweep setup speaks SCPI only
+            t0 = time.perf_counter()
+            for i in range(repeats):
+                sm.setupSweep(compliance=0.04, nPoints=points, start=0, end=1)
+            ret["setupSweep"] = (time.perf_counter() - t0) / repeats
+
+            t0 = time.perf_counter()
+            for i in range(repeats):
+                sm.setupSweep(compliance=0.04, nPoints=points, start=0, end=1)
+                sm.measure(points)
+            ret["sweep"] = (time.perf_counter() - t0) / repeats - ret["setupSweep"] - points * point_time
+
+        sm.disconnect()
+        ret["bytes"] = emu.n_rx + emu.n_tx
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dialects", nargs="+", default=["2400", "2450", "2600", "am"], choices=list(SmuEmulator.IDNS))
+    parser.add_argument("--points", type=int, default=101, help="sweep points")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="instrument turnaround time per reply [s]")
+    parser.add_argument("--bandwidth", type=float, default=None, help="link throughput [bytes/s]")
+    parser.add_argument("--ascii", action="store_true", help="transfer readings as ASCII even where there's a binary format")
+    parser.add_argument("--pyserial", action="store_true", help="have k2xxx use pyserial's socket handler instead of its own TCP transport")
+    parser.add_argument("--point-time", type=float, default=0.001, help="simulated time per measurement [s]")
+    pargs = parser.parse_args()
+
+    for dialect in pargs.dialects:
+        res = bench(dialect, pargs.points, pargs.repeats, pargs.latency, pargs.bandwidth, pargs.point_time, not pargs.ascii, not pargs.pyserial)
+        nbytes = res.pop("bytes")
+        print(f"{dialect:>4}: " + ", ".join(f"{op}={t * 1000:.1f}ms" for op, t in res.items()) + f" ({nbytes:.0f} bytes on the wire)")
+    print("(sweep excludes setup and the simulated measurement time)")
+
+
+if __name__ == "__main__":
+    main()